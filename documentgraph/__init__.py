@@ -1,23 +1,47 @@
 from .main import DocumentAnalysisPipeline
+from .async_pipeline import AsyncDocumentAnalysisPipeline
 from .config import ETLConfig
 from .extraction import DocumentExtractor
 from .transformation import TextProcessor, EmbeddingGenerator, EntityRelationExtractor
-from .loading import KnowledgeGraphLoader
-from .models import Document, TextChunk, Entity, Relationship, ExtractionResult
+from .loading import GraphSink, KnowledgeGraphLoader, AsyncKnowledgeGraphLoader
+from .export import CSVGraphExporter, JSONLGraphSink
+from .sinks import InMemoryGraphSink, create_sink
+from .retrieval import GraphRetriever
+from .workqueue import WorkQueue, QueueCoordinator, QueueWorker
+from .models import (
+    Document,
+    TextChunk,
+    Entity,
+    Relationship,
+    ExtractionResult,
+    ChunkMatch,
+)
 
 __version__ = "0.1.2"
 
 __all__ = [
     "DocumentAnalysisPipeline",
+    "AsyncDocumentAnalysisPipeline",
     "ETLConfig",
     "DocumentExtractor",
     "TextProcessor",
     "EmbeddingGenerator",
     "EntityRelationExtractor",
     "KnowledgeGraphLoader",
+    "AsyncKnowledgeGraphLoader",
+    "GraphSink",
+    "CSVGraphExporter",
+    "JSONLGraphSink",
+    "InMemoryGraphSink",
+    "create_sink",
+    "GraphRetriever",
+    "WorkQueue",
+    "QueueCoordinator",
+    "QueueWorker",
     "Document",
     "TextChunk",
     "Entity",
     "Relationship",
     "ExtractionResult",
+    "ChunkMatch",
 ]
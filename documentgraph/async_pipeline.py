@@ -0,0 +1,265 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from typing import AsyncIterator, Iterator
+
+from documentgraph.columnar import ChunkBatch
+from documentgraph.config import ETLConfig
+from documentgraph.dedup import ChunkDeduplicator
+from documentgraph.extraction import DocumentExtractor
+from documentgraph.main import DocumentPart
+from documentgraph.metrics import MetricsRegistry, record_client_metrics
+from documentgraph.models import Document, TextChunk
+from documentgraph.resolution import EntityResolver
+from documentgraph.sinks import create_async_sink
+from documentgraph.transformation import (
+    TextProcessor,
+    EmbeddingGenerator,
+    EntityRelationExtractor,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _failed(task: asyncio.Task) -> bool:
+    # Task.exception() raises CancelledError for a cancelled task
+    return task.done() and not task.cancelled() and task.exception() is not None
+
+
+async def _cancel(tasks: set[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class AsyncDocumentAnalysisPipeline:
+    """
+    Variante asíncrona de `DocumentAnalysisPipeline` para integrarla en
+    servicios basados en asyncio.
+
+    Procesa hasta `ETLConfig.n_jobs` documentos a la vez y comparte entre todos
+    ellos un límite global de `ETLConfig.max_concurrency` peticiones en curso
+    (embeddings y LLM). Usa `aembed_documents`, `abatch` de la cadena de
+    extracción y, con `ETLConfig.sink = "neo4j"`, el driver asíncrono de Neo4j;
+    los demás destinos de `create_sink` se ejecutan en un hilo. Los documentos
+    `streamed` se trocean por ventanas y avanzan en partes, como en el pipeline
+    síncrono. No soporta el modo incremental ni el diario de ejecución.
+    """
+
+    def __init__(self, etl_config: ETLConfig, graph_loader=None):
+        """
+        Args:
+            etl_config (ETLConfig): Configuración del pipeline.
+            graph_loader (optional): Destino asíncrono de la carga, como los de
+                `create_async_sink`. Por defecto se crea con `create_async_sink`
+                y el pipeline lo cierra al terminar; uno recibido aquí lo
+                cierra quien lo creó.
+        """
+        self.config = etl_config
+        self.extractor = DocumentExtractor(etl_config)
+        self.embedding_generator = EmbeddingGenerator(etl_config)
+        self.preprocessor = TextProcessor(etl_config, self.embedding_generator)
+        self.entity_relation_extractor = EntityRelationExtractor(etl_config)
+        self.entity_resolver = (
+            EntityResolver(etl_config) if etl_config.resolution_config.enabled else None
+        )
+        self.deduplicator = (
+            ChunkDeduplicator(etl_config, self.entity_relation_extractor.prompt_hash)
+            if etl_config.dedup_config.enabled
+            else None
+        )
+        self.owns_graph_loader = graph_loader is None
+        self.graph_loader = (
+            create_async_sink(etl_config) if graph_loader is None else graph_loader
+        )
+        self.metrics = MetricsRegistry()
+
+    async def execute_pipeline(self, input_folder: str) -> dict:
+        """
+        Ejecuta el pipeline ETL completo para análisis de documentos.
+
+        Returns:
+            dict: Informe de la ejecución, como en
+            `DocumentAnalysisPipeline.execute_pipeline`.
+        """
+        logger.info("Iniciando pipeline asíncrono de análisis de documentos")
+        self.metrics.reset()
+        requests = asyncio.Semaphore(self.config.max_concurrency)
+        documents_in_flight = asyncio.Semaphore(self.config.n_jobs)
+        tasks: set[asyncio.Task] = set()
+        try:
+            await self.graph_loader.ensure_schema()
+            documents = self.metrics.timed_iter(
+                "extract", self.extractor.extract(input_folder)
+            )
+            # File reads happen in a worker thread so the event loop keeps running
+            while document := await asyncio.to_thread(next, documents, None):
+                await documents_in_flight.acquire()
+                # Finished documents leave the set; a failed one stops the run
+                tasks = {task for task in tasks if not task.done() or _failed(task)}
+                if any(task.done() for task in tasks):
+                    break
+                task = asyncio.create_task(self.process_document(document, requests))
+                task.add_done_callback(lambda _: documents_in_flight.release())
+                tasks.add(task)
+
+            await self.wait_documents(tasks)
+            with self.metrics.timer("flush"):
+                await self.graph_loader.flush()
+            logger.info("Pipeline de análisis de documentos completado con éxito")
+        except Exception as e:
+            await _cancel(tasks)
+            logger.error(f"Error en el pipeline de análisis: {str(e)}", exc_info=True)
+            raise
+        finally:
+            self.preprocessor.close()
+            if self.owns_graph_loader:
+                await self.graph_loader.close()
+            self.metrics.finish()
+            record_client_metrics(
+                self.metrics,
+                "embedding",
+                self.embedding_generator.rate_limiter,
+                self.embedding_generator.cache,
+            )
+            record_client_metrics(
+                self.metrics,
+                "llm",
+                self.entity_relation_extractor.rate_limiter,
+                self.entity_relation_extractor.cache,
+            )
+        report = self.metrics.report()
+        logger.info(f"Informe de la ejecución: {json.dumps(report)}")
+        if self.config.metrics_config.prometheus_path:
+            self.metrics.write_prometheus(self.config.metrics_config.prometheus_path)
+        return report
+
+    @staticmethod
+    async def wait_documents(tasks: set[asyncio.Task]) -> None:
+        """
+        Espera a los documentos en curso. Si uno falla, cancela los demás,
+        espera a que se detengan para que no sigan escribiendo en el destino y
+        relanza su error.
+        """
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        await _cancel(pending)
+        for task in done:
+            if _failed(task):
+                raise task.exception()
+
+    async def process_document(
+        self, document: Document, requests: asyncio.Semaphore
+    ) -> None:
+        """
+        Ejecuta todas las etapas del pipeline para un documento, parte a parte
+        y en orden.
+        """
+        logger.info(f"Extrayendo documento: {document.filename}")
+        preprocessed_document = self.preprocessor.process(document)
+        async for part in self.iter_parts(preprocessed_document):
+            await self.process_part(part, requests)
+
+    async def iter_parts(self, document: Document) -> AsyncIterator[DocumentPart]:
+        """
+        Divide el documento en chunks como `DocumentAnalysisPipeline.split_document`:
+        una sola parte para un documento normal y, para uno `streamed`, partes
+        de `SourceConfig.stream_batch_chunks` chunks leídas del fichero por
+        ventanas. El chunking se ejecuta en un hilo.
+        """
+        if not document.streamed:
+            start = time.perf_counter()
+            chunks = await asyncio.to_thread(self.preprocessor.create_chunks, document)
+            self.metrics.observe("chunk", time.perf_counter() - start, len(chunks))
+            yield DocumentPart(document, chunks)
+            return
+
+        logger.info(f"Dividiendo por ventanas el documento: {document.filename}")
+        batch_size = self.config.source_config.stream_batch_chunks
+        chunks = self.preprocessor.iter_chunks(document)
+        batch = await self._next_chunks(chunks, batch_size)
+        index, prev_chunk_id = 0, None
+        while True:
+            # Read one batch ahead to know whether this part is the last one
+            following = (
+                await self._next_chunks(chunks, batch_size)
+                if len(batch) == batch_size
+                else []
+            )
+            yield DocumentPart(
+                document,
+                batch,
+                prev_chunk_id=prev_chunk_id,
+                complete=not following,
+                index=index,
+            )
+            if not following:
+                return
+            index, prev_chunk_id, batch = index + 1, batch[-1].id, following
+
+    async def _next_chunks(
+        self, chunks: Iterator[TextChunk], batch_size: int
+    ) -> list[TextChunk]:
+        start = time.perf_counter()
+        batch = await asyncio.to_thread(
+            lambda: list(itertools.islice(chunks, batch_size))
+        )
+        self.metrics.observe("chunk", time.perf_counter() - start, len(batch))
+        return batch
+
+    async def process_part(
+        self, part: DocumentPart, requests: asyncio.Semaphore
+    ) -> None:
+        """
+        Genera los embeddings, extrae las entidades y carga una parte.
+        """
+        text_chunks = part.chunks
+        duplicates = None
+        unique_chunks = text_chunks
+        if self.deduplicator is not None:
+            with self.metrics.timer("dedup", items=len(text_chunks)):
+                duplicates = await asyncio.to_thread(
+                    self.deduplicator.find, text_chunks
+                )
+            self.metrics.inc("duplicate_chunks_total", len(duplicates))
+            unique_chunks = duplicates.select(text_chunks)
+        missing = [chunk for chunk in unique_chunks if chunk.embedding is None]
+        if missing:
+            with self.metrics.timer("embed", items=len(missing)):
+                embeddings = await self.embedding_generator.agenerate_batch(
+                    missing, requests
+                )
+            for chunk, embedding in zip(missing, embeddings):
+                chunk.embedding = embedding
+        if duplicates is not None:
+            duplicates.fill_embeddings(text_chunks)
+        text_chunks = ChunkBatch.from_chunks(text_chunks).to_chunks()
+        unique_chunks = (
+            text_chunks if duplicates is None else duplicates.select(text_chunks)
+        )
+        with self.metrics.timer("llm", items=len(unique_chunks)):
+            extraction_results = await self.entity_relation_extractor.aextract(
+                unique_chunks, requests
+            )
+        if duplicates is not None:
+            extraction_results = duplicates.expand_results(extraction_results)
+            await asyncio.to_thread(
+                self.deduplicator.add, text_chunks, duplicates, extraction_results
+            )
+        errors = sum(1 for result in extraction_results if result.error is not None)
+        if errors:
+            self.metrics.inc("extraction_errors_total", errors)
+        if self.entity_resolver is not None:
+            with self.metrics.timer("resolve", items=len(extraction_results)):
+                extraction_results = self.entity_resolver.resolve(extraction_results)
+        with self.metrics.timer("load", items=len(text_chunks)):
+            await self.graph_loader.add_document(
+                part.document,
+                text_chunks,
+                extraction_results,
+                prev_chunk_id=part.prev_chunk_id,
+                complete=part.complete,
+            )
@@ -0,0 +1,375 @@
+"""
+Benchmark del pipeline sin servicios externos.
+
+Genera un corpus sintético, sustituye los modelos de OpenAI por modelos falsos
+deterministas con latencia configurable y carga en `InMemoryGraphSink`, de modo
+que mide el coste propio del pipeline (lectura, chunking, tokenización,
+planificación, resolución de entidades y carga) y cómo escala con `n_jobs`:
+
+    python -m documentgraph.bench --documents 200 --n-jobs 1,2,4,8
+
+Cada configuración se ejecuta en un proceso nuevo para que la memoria máxima
+medida sea solo la suya.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from documentgraph.config import ETLConfig
+from documentgraph.main import DocumentAnalysisPipeline
+from documentgraph.tokens import set_encoding
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+ENTITY_TYPES = ("Person", "Organization", "Location", "Concept")
+_TEXT = re.compile(r"<text>(.*?)</text>", re.DOTALL)
+_CHUNKS = re.compile(r'<chunk id="(\w+)">(.*?)</chunk>', re.DOTALL)
+_WORDS = re.compile(r"\s*\S+|\s+")
+
+
+class FakeEncoding:
+    """
+    Tokenizador sin ficheros descargados que sustituye al de tiktoken: cada
+    palabra, con los espacios que la preceden, es un token. Los ids se asignan
+    según aparecen los textos, así que solo sirven dentro del mismo proceso.
+    """
+
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+        self._pieces: list[str] = []
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {"_ids": self._ids, "_pieces": self._pieces}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def encode_ordinary(self, text: str) -> list[int]:
+        pieces = _WORDS.findall(text)
+        with self._lock:
+            for piece in pieces:
+                if piece not in self._ids:
+                    self._ids[piece] = len(self._pieces)
+                    self._pieces.append(piece)
+            return [self._ids[piece] for piece in pieces]
+
+    def encode_ordinary_batch(self, texts: list[str]) -> list[list[int]]:
+        return [self.encode_ordinary(text) for text in texts]
+
+    def decode_with_offsets(self, tokens: list[int]) -> tuple[str, list[int]]:
+        offsets, position = [], 0
+        for token in tokens:
+            offsets.append(position)
+            position += len(self._pieces[token])
+        return "".join(self._pieces[token] for token in tokens), offsets
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Modelo de embeddings determinista: el vector de cada texto se deriva de su
+    hash, así que textos iguales tienen el mismo embedding entre ejecuciones.
+    Cada petición espera `latency` segundos, como una llamada a la API.
+    """
+
+    def __init__(self, dimension: int, latency: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency
+
+    def _embed(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.blake2b(text.encode()).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimension)
+        return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+    def embed_documents(self, texts: list[str], **kwargs) -> list[list[float]]:
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str], **kwargs) -> list[list[float]]:
+        await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+
+class FakeExtractionModel(BaseChatModel):
+    """
+    Modelo de chat determinista para la extracción: responde con las entidades
+    conocidas (`entities`, nombre -> tipo) que aparecen en el texto del prompt
+    y una relación entre cada par de entidades consecutivas, en el formato JSON
+    que pide `EXTRACTION_PROMPT` o, por chunk, `PACKED_EXTRACTION_PROMPT`. Cada
+    llamada espera `latency` segundos e informa del uso de tokens.
+    """
+
+    entities: dict[str, str]
+    latency: float = 0.0
+    pattern: Any = None
+
+    def model_post_init(self, __context: Any) -> None:
+        names = sorted(self.entities, key=len, reverse=True)
+        self.pattern = re.compile(r"\b(" + "|".join(map(re.escape, names)) + r")\b")
+
+    @property
+    def _llm_type(self) -> str:
+        return "documentgraph-fake-extraction"
+
+    def _extract(self, text: str) -> dict[str, Any]:
+        names = list(dict.fromkeys(self.pattern.findall(text)))
+        return {
+            "entities": [{"name": name, "type": self.entities[name]} for name in names],
+            "relationships": [
+                {"source_name": source, "target_name": target, "type": "RELATED_TO"}
+                for source, target in zip(names, names[1:])
+            ],
+        }
+
+    def _respond(self, messages) -> ChatResult:
+        prompt = messages[-1].content
+        chunks = _CHUNKS.findall(prompt)
+        if chunks:
+            # Packed prompt: one result per chunk id, as a bare JSON object
+            content = json.dumps(
+                {"chunks": {chunk_id: self._extract(text) for chunk_id, text in chunks}}
+            )
+        else:
+            match = _TEXT.search(prompt)
+            payload = self._extract(match.group(1) if match else "")
+            content = f"```json\n{json.dumps(payload)}\n```"
+        input_tokens, output_tokens = len(prompt) // 4, len(content) // 4
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._respond(messages)
+
+
+def entity_vocabulary(size: int, seed: int = 0) -> dict[str, str]:
+    """
+    Devuelve `size` nombres de entidad inventados con su tipo.
+    """
+    rng = random.Random(seed)
+    syllables = ["al", "ben", "cor", "dra", "el", "fin", "gor", "hal", "is", "jun"]
+    entities = {}
+    while len(entities) < size:
+        name = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        entities[name.capitalize()] = ENTITY_TYPES[len(entities) % len(ENTITY_TYPES)]
+    return entities
+
+
+def generate_corpus(
+    directory: str | Path,
+    documents: int,
+    words_per_document: int,
+    entities: dict[str, str],
+    seed: int = 0,
+) -> list[Path]:
+    """
+    Escribe `documents` ficheros `.txt` de unas `words_per_document` palabras,
+    en frases con entidades de `entities` repartidas por el texto. El mismo
+    `seed` produce siempre el mismo corpus.
+    """
+    rng = random.Random(seed)
+    words = [
+        "".join(
+            rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9))
+        )
+        for _ in range(2000)
+    ]
+    names = list(entities)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for index in range(documents):
+        sentences, count = [], 0
+        while count < words_per_document:
+            sentence = rng.choices(words, k=rng.randint(8, 20))
+            for _ in range(rng.randint(0, 2)):
+                sentence.insert(rng.randrange(len(sentence)), rng.choice(names))
+            count += len(sentence)
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            if rng.random() < 0.15:
+                sentences.append("\n\n")
+        path = directory / f"doc_{index:05d}.txt"
+        path.write_text(" ".join(sentences), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def build_pipeline(
+    config: ETLConfig,
+    entities: dict[str, str],
+    embedding_latency: float = 0.0,
+    llm_latency: float = 0.0,
+) -> DocumentAnalysisPipeline:
+    """
+    Crea un `DocumentAnalysisPipeline` cuyos `EmbeddingGenerator` y
+    `EntityRelationExtractor` usan los modelos falsos, y cuenta los tokens con
+    `FakeEncoding` para no descargar los codificadores de tiktoken.
+    """
+    # The OpenAI clients need a key to be created, even if they are never called
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    encoding = FakeEncoding()
+    set_encoding(config.embedding_config.model, encoding)
+    set_encoding(config.llm_config.model, encoding)
+    pipeline = DocumentAnalysisPipeline(config)
+    pipeline.embedding_generator.model = FakeEmbeddings(
+        config.embedding_config.dimension, embedding_latency
+    )
+    pipeline.entity_relation_extractor.llm = FakeExtractionModel(
+        entities=entities, latency=llm_latency
+    )
+    return pipeline
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if os.uname().sysname == "Darwin" else 1024), 1)
+
+
+def run_benchmark(
+    corpus: str,
+    config: dict[str, Any],
+    entities: dict[str, str],
+    embedding_latency: float,
+    llm_latency: float,
+) -> dict[str, Any]:
+    """
+    Ejecuta el pipeline una vez sobre `corpus` y devuelve su informe de
+    métricas con la memoria máxima del proceso y el rendimiento global.
+    """
+    etl_config = ETLConfig(**config)
+    pipeline = build_pipeline(etl_config, entities, embedding_latency, llm_latency)
+    report = pipeline.execute_pipeline(corpus)
+    elapsed = report["elapsed_seconds"]
+    documents = report["counters"].get("documents_total", 0)
+    chunks = report["stages"].get("load", {}).get("items", 0)
+    report["documents_per_second"] = round(documents / elapsed, 3)
+    report["chunks_per_second"] = round(chunks / elapsed, 3)
+    report["peak_rss_mb"] = _peak_rss_mb()
+    return report
+
+
+def _format_row(n_jobs: int, report: dict[str, Any]) -> str:
+    stages = " ".join(
+        f"{stage}={values['items_per_busy_second']}/s(p95 {values['p95_seconds']}s)"
+        for stage, values in report["stages"].items()
+    )
+    return (
+        f"n_jobs={n_jobs:<3} {report['elapsed_seconds']:>8.2f}s "
+        f"{report['documents_per_second']:>8.2f} docs/s "
+        f"{report['chunks_per_second']:>9.2f} chunks/s "
+        f"rss={report['peak_rss_mb']}MB  {stages}"
+    )
+
+
+def _run_configurations(
+    args: argparse.Namespace, corpus: str, entities: dict[str, str]
+) -> list[dict[str, Any]]:
+    if not any(Path(corpus).glob("*.txt")):
+        generate_corpus(corpus, args.documents, args.words, entities, args.seed)
+
+    reports = []
+    for n_jobs in (int(value) for value in args.n_jobs.split(",")):
+        config = {
+            "n_jobs": n_jobs,
+            "sink": args.sink,
+            "chunk_config": {"strategy": args.chunk_strategy, "size": args.chunk_size},
+            "embedding_config": {"dimension": args.dimension},
+            "llm_config": {"pack_tokens": args.pack_tokens},
+            "export_config": {"path": str(Path(corpus) / f"export-{n_jobs}")},
+        }
+        run_args = (corpus, config, entities, args.embedding_latency, args.llm_latency)
+        if args.in_process:
+            report = run_benchmark(*run_args)
+        else:
+            with multiprocessing.get_context("spawn").Pool(1) as pool:
+                report = pool.apply(run_benchmark, run_args)
+        report["n_jobs"] = n_jobs
+        reports.append(report)
+        print(_format_row(n_jobs, report), flush=True)
+
+    return reports
+
+
+def main(argv: list[str] | None = None) -> list[dict[str, Any]]:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pipeline with fake OpenAI models and an "
+        "in-memory graph"
+    )
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--words", type=int, default=3000, help="Words per document")
+    parser.add_argument("--entities", type=int, default=500, help="Entity vocabulary")
+    parser.add_argument("--n-jobs", default="1,2,4,8", help="Comma-separated n_jobs")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--chunk-strategy", default="recursive")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument(
+        "--pack-tokens", type=int, default=0, help="Pack chunks per LLM call"
+    )
+    parser.add_argument("--sink", default="memory", choices=["memory", "jsonl", "csv"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus", help="Reuse or create the corpus in this folder")
+    parser.add_argument("--output", help="Write the full reports as JSON")
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Run every configuration in this process (peak memory is shared)",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, force=True)
+
+    entities = entity_vocabulary(args.entities, args.seed)
+    if args.corpus:
+        reports = _run_configurations(args, args.corpus, entities)
+    else:
+        # A generated corpus and its exports are removed after the run
+        with tempfile.TemporaryDirectory(prefix="documentgraph-bench-") as corpus:
+            reports = _run_configurations(args, corpus, entities)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(reports, indent=2), encoding="utf-8")
+    return reports
+
+
+if __name__ == "__main__":
+    main()
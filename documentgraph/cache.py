@@ -0,0 +1,284 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from documentgraph.models import ExtractionResult
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(*parts: str) -> str:
+    """
+    Devuelve el SHA-256 hexadecimal de las partes, separadas por un byte nulo.
+    """
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class SQLiteCache:
+    """
+    Base para las cachés persistentes en SQLite.
+
+    Cada hilo usa su propia conexión. La base se abre en modo WAL para que varios
+    procesos puedan leer y escribir el mismo fichero a la vez; las subclases
+    cambian `journal_mode` si el fichero se comparte entre máquinas, donde WAL
+    no funciona.
+
+    Attributes:
+        path (Path): Ruta del fichero SQLite.
+        hits (int): Número de claves encontradas en la caché.
+        misses (int): Número de claves no encontradas.
+    """
+
+    schema: str = ""
+    journal_mode: str = "WAL"
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+        self._local = threading.local()
+        self.connection().executescript(self.schema)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def transaction(self) -> "_Transaction":
+        return _Transaction(self.connection())
+
+    def _count(self, hits: int, misses: int) -> None:
+        with self._counter_lock:
+            self.hits += hits
+            self.misses += misses
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class _Transaction:
+    """
+    Context manager que envuelve una conexión en autocommit en una transacción
+    `BEGIN IMMEDIATE`, de forma que los escritores concurrentes se serializan
+    mediante el bloqueo de SQLite en lugar de fallar a mitad de escritura.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class EmbeddingCache(SQLiteCache):
+    """
+    Caché persistente de embeddings direccionada por contenido.
+
+    La clave es el hash del texto del chunk, el modelo y la dimensión del
+    embedding. Los vectores se guardan como float32. Cuando la caché supera
+    `max_entries` se eliminan las entradas usadas hace más tiempo (LRU).
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS embeddings (
+        key TEXT PRIMARY KEY,
+        vector BLOB NOT NULL,
+        last_access REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access);
+    """
+
+    def __init__(self, path: str | Path, max_entries: int = 1_000_000):
+        super().__init__(path)
+        self.max_entries = max_entries
+        # Approximate entry count, so eviction does not count the table on every
+        # insert; other processes sharing the file are only seen by evict
+        self._size_lock = threading.Lock()
+        (self._size,) = (
+            self.connection().execute("SELECT count(*) FROM embeddings").fetchone()
+        )
+
+    @staticmethod
+    def make_key(text: str, model: str, dimension: int) -> str:
+        return content_hash(model, str(dimension), text)
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        """
+        Devuelve los embeddings encontrados para las claves dadas y actualiza su
+        instante de último acceso.
+        """
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self.transaction() as conn:
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = array("f", vector).tolist()
+            now = time.time()
+            conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+        hits = sum(1 for key in keys if key in found)
+        self._count(hits, len(keys) - hits)
+        return found
+
+    def put_many(self, items: dict[str, list[float]]) -> None:
+        """
+        Guarda los embeddings dados. Solo las claves que no estaban cuentan para
+        el tamaño de la caché.
+        """
+        now = time.time()
+        keys = list(items)
+        existing = 0
+        with self.transaction() as conn:
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                (count,) = conn.execute(
+                    f"SELECT count(*) FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchone()
+                existing += count
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) "
+                "VALUES (?, ?, ?)",
+                [
+                    (key, array("f", vector).tobytes(), now)
+                    for key, vector in items.items()
+                ],
+            )
+        with self._size_lock:
+            self._size += len(keys) - existing
+            full = self._size > self.max_entries
+        if full:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Elimina las entradas menos usadas hasta dejar la caché en el 90% de
+        `max_entries`, para no desalojar en cada inserción.
+        """
+        target = int(self.max_entries * 0.9)
+        with self.transaction() as conn:
+            (size,) = conn.execute("SELECT count(*) FROM embeddings").fetchone()
+            if size > target:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (size - target,),
+                )
+                logger.info(
+                    f"Caché de embeddings: {size - target} entradas desalojadas"
+                )
+            with self._size_lock:
+                self._size = min(size, target)
+
+
+class ExtractionCache(SQLiteCache):
+    """
+    Caché persistente de resultados de extracción de entidades y relaciones.
+
+    La clave es el hash del texto del chunk, el modelo LLM y el hash de la
+    plantilla del prompt, de modo que cambiar el prompt o su versión invalida
+    las entradas anteriores. Es segura para varios procesos escribiendo a la vez.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS extractions (
+        text_hash TEXT NOT NULL,
+        model TEXT NOT NULL,
+        prompt_hash TEXT NOT NULL,
+        result TEXT NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (text_hash, model, prompt_hash)
+    );
+    """
+
+    def get_many(
+        self, text_hashes: list[str], model: str, prompt_hash: str
+    ) -> dict[str, ExtractionResult]:
+        found = {}
+        unique_hashes = list(dict.fromkeys(text_hashes))
+        conn = self.connection()
+        for start in range(0, len(unique_hashes), 500):
+            batch = unique_hashes[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                "SELECT text_hash, result FROM extractions "
+                f"WHERE model = ? AND prompt_hash = ? AND text_hash IN ({placeholders})",
+                [model, prompt_hash, *batch],
+            ).fetchall()
+            for text_hash, result in rows:
+                found[text_hash] = ExtractionResult.model_validate_json(result)
+        hits = sum(1 for text_hash in text_hashes if text_hash in found)
+        self._count(hits, len(text_hashes) - hits)
+        return found
+
+    def put_many(
+        self, results: dict[str, ExtractionResult], model: str, prompt_hash: str
+    ) -> None:
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO extractions "
+                "(text_hash, model, prompt_hash, result, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        text_hash,
+                        model,
+                        prompt_hash,
+                        result.model_dump_json(exclude_none=True),
+                        now,
+                    )
+                    for text_hash, result in results.items()
+                ],
+            )
+
+    def invalidate(self, keep_prompt_hash: str | None = None) -> int:
+        """
+        Elimina las entradas de otras versiones del prompt, o todas si no se indica
+        `keep_prompt_hash`.
+
+        Returns:
+            int: Número de entradas eliminadas.
+        """
+        with self.transaction() as conn:
+            if keep_prompt_hash is None:
+                cursor = conn.execute("DELETE FROM extractions")
+            else:
+                cursor = conn.execute(
+                    "DELETE FROM extractions WHERE prompt_hash != ?",
+                    (keep_prompt_hash,),
+                )
+        logger.info(f"Caché de extracción: {cursor.rowcount} entradas invalidadas")
+        return cursor.rowcount
@@ -1,19 +1,84 @@
 import argparse
 from documentgraph import DocumentAnalysisPipeline, ETLConfig
+from documentgraph.workqueue import QueueCoordinator, run_sharded, run_worker
 
 
 def main():
     parser = argparse.ArgumentParser(description="Document Analysis Pipeline CLI")
-    parser.add_argument("input_folder", help="Path to the input folder containing documents")
-    parser.add_argument("--config", help="Path to the ETL configuration file", default="etl_config.yaml")
+    parser.add_argument(
+        "input_folder", nargs="?", help="Path to the input folder containing documents"
+    )
+    parser.add_argument(
+        "--config", help="Path to the ETL configuration file", default="etl_config.yaml"
+    )
+    queue = parser.add_argument_group(
+        "sharded ingestion",
+        "Process documents from a SQLite work queue shared by several worker "
+        "processes or hosts",
+    )
+    queue.add_argument(
+        "--queue", help="Path to the work queue database (QueueConfig.path)"
+    )
+    queue.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="Only enqueue the documents of input_folder and exit",
+    )
+    queue.add_argument(
+        "--worker",
+        action="store_true",
+        help="Run a worker that processes queued documents until the queue is empty",
+    )
+    queue.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Enqueue input_folder and process it with this many local worker "
+        "processes",
+    )
+    queue.add_argument(
+        "--lease-seconds",
+        type=float,
+        help="Lease duration before a crashed worker's documents are claimed again",
+    )
+    queue.add_argument(
+        "--batch-size", type=int, help="Documents claimed by a worker at a time"
+    )
 
     args = parser.parse_args()
 
     # Load ETL configuration
     etl_config = ETLConfig.from_yaml(args.config)
 
-    # Initialize the pipeline
-    pipeline = DocumentAnalysisPipeline(etl_config)
+    queue_overrides = {
+        "path": args.queue,
+        "lease_seconds": args.lease_seconds,
+        "batch_size": args.batch_size,
+    }
+    etl_config.queue_config = etl_config.queue_config.model_copy(
+        update={
+            key: value for key, value in queue_overrides.items() if value is not None
+        }
+    )
+    sharded = args.enqueue or args.worker or args.workers
+    if sharded and not etl_config.queue_config.path:
+        parser.error(
+            "--enqueue, --worker and --workers require --queue or QueueConfig.path"
+        )
+    if (args.enqueue or args.workers) and not args.input_folder:
+        parser.error("--enqueue and --workers require input_folder")
+    if not sharded and not args.input_folder:
+        parser.error("input_folder is required")
 
-    # Execute the pipeline
-    pipeline.execute_pipeline(args.input_folder)
+    if args.enqueue:
+        QueueCoordinator(etl_config).enqueue(args.input_folder)
+    elif args.worker:
+        run_worker(etl_config)
+    elif args.workers:
+        run_sharded(etl_config, args.input_folder, args.workers)
+    else:
+        # Initialize the pipeline
+        pipeline = DocumentAnalysisPipeline(etl_config)
+
+        # Execute the pipeline
+        pipeline.execute_pipeline(args.input_folder)
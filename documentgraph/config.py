@@ -1,5 +1,7 @@
 import os
+from pathlib import Path
 
+import yaml
 from pydantic import BaseModel
 
 
@@ -7,30 +9,137 @@ class Neo4JConfig(BaseModel):
     uri: str = os.getenv("NEO4J_URI")
     user: str = os.getenv("NEO4J_USER")
     password: str = os.getenv("NEO4J_PASSWORD")
+    vector_index: str = "text_chunk_embeddings"  # Índice vectorial de TextChunk
 
 
 class EmbeddingConfig(BaseModel):
     model: str = "text-embedding-3-small"
     dimension: int = 1536  # Assuming you're using OpenAI's default embedding size
+    similarity: str = "cosine"  # Similitud del índice vectorial: cosine o euclidean
+    batch_size: int = 2048  # Máximo de entradas por petición de embeddings
+    max_tokens_per_request: int = 300_000  # Máximo de tokens por petición
+    cache_path: str | None = None  # Fichero SQLite de la caché de embeddings
+    cache_max_entries: int = 1_000_000
+    # Límites de la cuota; con None se adoptan los de las cabeceras x-ratelimit-*
+    requests_per_minute: int | None = None
+    tokens_per_minute: int | None = None
+    max_retries: int = 6
+
+
+class SourceConfig(BaseModel):
+    include: list[str] = ["*.txt"]  # Patrones glob de los ficheros a procesar
+    exclude: list[str] = []
+    recursive: bool = False
+    # Los ficheros de más de stream_threshold bytes se leen y procesan por
+    # ventanas de window_size caracteres, en lotes de stream_batch_chunks chunks
+    stream_threshold: int = 64 * 1024 * 1024
+    window_size: int = 4 * 1024 * 1024
+    stream_batch_chunks: int = 256
 
 
 class ChunkConfig(BaseModel):
     strategy: str = (
-        "recursive"  # Options: "recursive", "character", "semantic", "tiktoken"
+        "recursive"  # Options: "recursive", "character", "semantic", "token"
     )
-    size: int = 2000
+    size: int = 2000  # Caracteres, o tokens con la estrategia "token"
     overlap: int = 200
+    processes: int = 1  # Procesos para el chunking; con más de 1 usa un pool
+    # Estrategia "semantic": corta donde la distancia entre el contexto de dos
+    # frases consecutivas supera el percentil breakpoint_percentile. Con
+    # chunk_embeddings="pooled" el embedding del chunk es la media de los de sus
+    # frases; con "reembed" se calcula de nuevo en la etapa de embeddings
+    breakpoint_percentile: float = 95.0
+    sentence_buffer: int = 1
+    chunk_embeddings: str = "pooled"
 
 
 class OpenAIConfig(BaseModel):
     api_key: str = os.getenv("OPENAI_API_KEY")
     model: str = "gpt-4o-mini-2024-07-18"
+    prompt_version: str = "1"  # Cambiarlo invalida la caché de extracción
+    cache_path: str | None = None  # Fichero SQLite de la caché de extracción
+    # Límites de la cuota; con None se adoptan los de las cabeceras x-ratelimit-*
+    requests_per_minute: int | None = None
+    tokens_per_minute: int | None = None
+    max_retries: int = 6
+    expected_output_tokens: int = 1000  # Estimación de tokens de respuesta por chunk
+    # Con pack_tokens > 0 se envían varios chunks por petición, hasta pack_tokens
+    # tokens de texto y pack_max_chunks chunks; json_mode pide la respuesta en el
+    # modo JSON de OpenAI
+    pack_tokens: int = 0
+    pack_max_chunks: int = 8
+    json_mode: bool = True
+    # Reintentos de los chunks cuya respuesta falla o no se puede leer; después
+    # quedan sin entidades y con el error en ExtractionResult.error
+    extraction_retries: int = 2
+
+
+class ResolutionConfig(BaseModel):
+    enabled: bool = True  # Une las menciones con el mismo nombre y tipo normalizados
+    index_path: str | None = None  # Fichero SQLite con las entidades canónicas
+
+
+class DedupConfig(BaseModel):
+    enabled: bool = False
+    index_path: str = ".documentgraph/dedup.sqlite"  # Índice LSH entre ejecuciones
+    threshold: float = 0.9  # Similitud de Jaccard estimada para ser duplicado
+    # Firma MinHash de num_perm valores dividida en bands bandas para el LSH;
+    # num_perm debe ser múltiplo de bands
+    num_perm: int = 128
+    bands: int = 16
+    shingle_size: int = 5  # Palabras por shingle
+
+
+class ExportConfig(BaseModel):
+    path: str = "export"  # Carpeta de salida de los destinos "csv" y "jsonl"
+    rows_per_file: int = 1_000_000  # Filas por fichero de datos CSV
+    array_delimiter: str = ";"
+
+
+class MetricsConfig(BaseModel):
+    # Fichero de texto de Prometheus que se escribe al final de cada ejecución
+    prometheus_path: str | None = None
+    port: int | None = None  # Puerto HTTP para exponer /metrics durante la ejecución
+    host: str = "127.0.0.1"  # Interfaz del servidor de /metrics; "0.0.0.0" para todas
+
+
+class QueueConfig(BaseModel):
+    # Cola SQLite compartida por el coordinador y los workers; en un sistema de
+    # ficheros compartido entre máquinas, con la misma ruta en todas
+    path: str | None = None
+    lease_seconds: float = 600.0  # Tras este tiempo sin renovar, otro worker lo toma
+    batch_size: int = 1  # Documentos que reclama un worker de una vez
+    max_attempts: int = 3  # Intentos por documento antes de marcarlo fallido
+    poll_interval: float = 5.0  # Espera entre consultas cuando la cola está vacía
 
 
 class ETLConfig(BaseModel):
-    n_jobs: int = 4
+    n_jobs: int = 4  # Hilos por etapa; con 1 los documentos se procesan en serie
+    queue_size: int = 16  # Capacidad de las colas entre etapas concurrentes
+    max_concurrency: int = 100  # Peticiones al LLM/embeddings en curso a la vez
+    load_batch_size: int = 1000  # Filas por transacción UNWIND al cargar en Neo4j
+    sink: str = "neo4j"  # Destino de la carga: "neo4j", "csv", "jsonl" o "memory"
+    incremental: bool = False  # Omite documentos sin cambios y borra datos obsoletos
+    manifest_path: str = ".documentgraph/manifest.json"
+    journal_path: str | None = None  # Diario SQLite para reanudar ejecuciones
+    max_document_attempts: int = 3  # Intentos por documento con diario
     graph_db_config: Neo4JConfig = Neo4JConfig()
+    source_config: SourceConfig = SourceConfig()
     chunk_config: ChunkConfig = ChunkConfig()
     llm_config: OpenAIConfig = OpenAIConfig()
     embedding_config: EmbeddingConfig = EmbeddingConfig()
+    resolution_config: ResolutionConfig = ResolutionConfig()
+    dedup_config: DedupConfig = DedupConfig()
+    export_config: ExportConfig = ExportConfig()
+    metrics_config: MetricsConfig = MetricsConfig()
+    queue_config: QueueConfig = QueueConfig()
     model_config = {"arbitrary_types_allowed": True}
+
+    @classmethod
+    def from_yaml(cls, path: str | Path) -> "ETLConfig":
+        """
+        Lee la configuración de un fichero YAML con los mismos campos que
+        `ETLConfig`. Un fichero vacío da la configuración por defecto.
+        """
+        with open(path, encoding="utf-8") as file:
+            return cls.model_validate(yaml.safe_load(file) or {})
@@ -0,0 +1,441 @@
+import hashlib
+import logging
+import re
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+from documentgraph.cache import SQLiteCache, content_hash
+from documentgraph.config import ETLConfig
+from documentgraph.models import ExtractionResult, TextChunk
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+
+
+class MinHasher:
+    """
+    Calcula firmas MinHash de textos.
+
+    Cada texto se representa por el conjunto de sus shingles de
+    `shingle_size` palabras consecutivas, en minúsculas y sin puntuación, y la
+    firma guarda el mínimo de `num_perm` permutaciones universales de sus
+    hashes. La fracción de posiciones en que coinciden dos firmas estima la
+    similitud de Jaccard de los dos conjuntos. Las permutaciones dependen solo
+    de `seed`, así que las firmas son comparables entre ejecuciones.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # a, b < 2**32 and 32-bit shingle hashes keep a * h + b below 2**64
+        self.a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """
+        Devuelve los hashes de 32 bits de los shingles del texto. Un texto más
+        corto que `shingle_size` palabras forma un único shingle.
+        """
+        words = _WORD.findall(text.lower())
+        size = self.shingle_size
+        grams = {
+            " ".join(words[start : start + size])
+            for start in range(max(len(words) - size + 1, 1))
+        }
+        return np.fromiter(
+            (zlib.crc32(gram.encode("utf-8")) for gram in grams),
+            dtype=np.uint64,
+            count=len(grams),
+        )
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self.shingles(text)
+        permuted = (np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    @staticmethod
+    def similarity(signature: np.ndarray, others: np.ndarray) -> np.ndarray:
+        """
+        Estima la similitud de Jaccard entre una firma y cada fila de `others`.
+        """
+        return (np.atleast_2d(others) == signature).mean(axis=1)
+
+
+@dataclass
+class StoredChunk:
+    """
+    Chunk canónico del índice, con el embedding y el resultado de extracción
+    que reutilizan sus duplicados.
+    """
+
+    key: str
+    embedding: np.ndarray
+    result: ExtractionResult
+
+
+@dataclass
+class ChunkDuplicates:
+    """
+    Duplicados encontrados entre los chunks de una lista, por posición.
+
+    Attributes:
+        keys (list[str]): Clave de cada chunk en el índice.
+        signatures (np.ndarray): Firmas MinHash, de forma `(n, num_perm)`.
+        canonical (dict[int, int]): Posición de cada duplicado -> posición de
+            su chunk canónico en la misma lista.
+        stored (dict[int, StoredChunk]): Posición de cada duplicado -> su chunk
+            canónico del índice.
+    """
+
+    keys: list[str]
+    signatures: np.ndarray
+    canonical: dict[int, int] = field(default_factory=dict)
+    stored: dict[int, StoredChunk] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.canonical) + len(self.stored)
+
+    def unique(self) -> list[int]:
+        """
+        Posiciones de los chunks que no son duplicados y hay que procesar.
+        """
+        return [
+            position
+            for position in range(len(self.keys))
+            if position not in self.canonical and position not in self.stored
+        ]
+
+    def select(self, items: list) -> list:
+        return [items[position] for position in self.unique()]
+
+    def expand(self, values: list, stored: Callable[[StoredChunk], Any]) -> list:
+        """
+        Devuelve un valor por chunk a partir de los valores de los chunks
+        únicos (en el orden de `unique`): cada duplicado toma el de su chunk
+        canónico, o `stored(chunk)` si el canónico está en el índice.
+        """
+        expanded = [None] * len(self.keys)
+        for position, value in zip(self.unique(), values):
+            expanded[position] = value
+        for position, chunk in self.stored.items():
+            expanded[position] = stored(chunk)
+        for position, canonical in self.canonical.items():
+            expanded[position] = expanded[canonical]
+        return expanded
+
+    def fill_embeddings(self, chunks: list[TextChunk]) -> None:
+        """
+        Asigna a los duplicados el embedding de su chunk canónico. Los chunks
+        únicos deben tener ya el suyo.
+        """
+        embeddings = self.expand(
+            [chunk.embedding for chunk in self.select(chunks)],
+            lambda stored: stored.embedding,
+        )
+        for chunk, embedding in zip(chunks, embeddings):
+            chunk.embedding = embedding
+
+    def expand_results(self, results: list[ExtractionResult]) -> list[ExtractionResult]:
+        return self.expand(results, lambda stored: stored.result)
+
+
+class DedupIndex(SQLiteCache):
+    """
+    Índice LSH persistente de los chunks canónicos.
+
+    Guarda por chunk su firma MinHash, su embedding (float32) y su resultado de
+    extracción, y por cada banda de la firma una fila cubeta -> chunk, de modo
+    que los candidatos a duplicado de un chunk son los que comparten alguna
+    cubeta con él.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS chunks (
+        key TEXT PRIMARY KEY,
+        signature BLOB NOT NULL,
+        embedding BLOB NOT NULL,
+        result TEXT NOT NULL,
+        created REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS buckets (
+        bucket INTEGER NOT NULL,
+        key TEXT NOT NULL,
+        PRIMARY KEY (bucket, key)
+    ) WITHOUT ROWID;
+    """
+
+    def candidates(self, buckets: list[int]) -> dict[int, list[str]]:
+        """
+        Devuelve las claves de los chunks de cada cubeta.
+        """
+        found: dict[int, list[str]] = {}
+        conn = self.connection()
+        for start in range(0, len(buckets), 500):
+            batch = buckets[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT bucket, key FROM buckets WHERE bucket IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for bucket, key in rows:
+                found.setdefault(bucket, []).append(key)
+        return found
+
+    def signatures(self, keys: list[str]) -> dict[str, np.ndarray]:
+        found = {}
+        conn = self.connection()
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, signature FROM chunks WHERE key IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for key, signature in rows:
+                found[key] = np.frombuffer(signature, dtype=np.uint32)
+        return found
+
+    def get_many(self, keys: list[str]) -> dict[str, StoredChunk]:
+        found = {}
+        conn = self.connection()
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                "SELECT key, embedding, result FROM chunks "
+                f"WHERE key IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for key, embedding, result in rows:
+                found[key] = StoredChunk(
+                    key=key,
+                    embedding=np.frombuffer(embedding, dtype=np.float32),
+                    result=ExtractionResult.model_validate_json(result),
+                )
+        self._count(len(found), len(keys) - len(found))
+        return found
+
+    def put_many(
+        self,
+        entries: list[tuple[str, np.ndarray, list[int], Any, ExtractionResult]],
+    ) -> None:
+        """
+        Añade chunks canónicos como tuplas `(clave, firma, cubetas, embedding,
+        resultado)`. Si otro proceso ya registró la clave, se conserva la suya.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO chunks "
+                "(key, signature, embedding, result, created) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        key,
+                        signature.tobytes(),
+                        np.asarray(embedding, dtype=np.float32).tobytes(),
+                        result.model_dump_json(exclude_none=True),
+                        now,
+                    )
+                    for key, signature, _, embedding, result in entries
+                ],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO buckets (bucket, key) VALUES (?, ?)",
+                [
+                    (bucket, key)
+                    for key, _, buckets, _, _ in entries
+                    for bucket in buckets
+                ],
+            )
+
+
+class ChunkDeduplicator:
+    """
+    Detecta chunks duplicados o casi duplicados antes de pagar sus embeddings y
+    su extracción.
+
+    Dos chunks son duplicados si su texto es idéntico o si la similitud de
+    Jaccard estimada con MinHash entre sus shingles alcanza
+    `DedupConfig.threshold`. Los candidatos se buscan con LSH: la firma se
+    divide en `bands` bandas y dos chunks son candidatos si coinciden en alguna,
+    tanto entre los chunks de la misma lista como en el `DedupIndex`
+    persistente, donde se registran los chunks canónicos ya extraídos con su
+    embedding y su resultado.
+
+    Un duplicado reutiliza el embedding y el `ExtractionResult` de su chunk
+    canónico, pero sigue siendo un `TextChunk` propio enlazado a su documento.
+    Las entradas del índice dependen de los modelos, la dimensión y el prompt,
+    así que cambiarlos no reutiliza resultados de otra configuración.
+
+    Attributes:
+        config (ETLConfig): Configuración del pipeline.
+        hasher (MinHasher): Calcula las firmas.
+        index (DedupIndex): Índice persistente de chunks canónicos.
+    """
+
+    def __init__(self, config: ETLConfig, prompt_hash: str = ""):
+        self.config = config
+        dedup_config = config.dedup_config
+        if dedup_config.num_perm % dedup_config.bands:
+            raise ValueError(
+                f"num_perm ({dedup_config.num_perm}) debe ser múltiplo de bands "
+                f"({dedup_config.bands})"
+            )
+        self.hasher = MinHasher(dedup_config.num_perm, dedup_config.shingle_size)
+        self.rows = dedup_config.num_perm // dedup_config.bands
+        self.variant = content_hash(
+            config.embedding_config.model,
+            str(config.embedding_config.dimension),
+            config.llm_config.model,
+            prompt_hash,
+            str(dedup_config.num_perm),
+            str(dedup_config.shingle_size),
+        )
+        self.index = DedupIndex(Path(dedup_config.index_path))
+
+    def buckets(self, signature: np.ndarray) -> list[int]:
+        """
+        Devuelve la cubeta LSH de cada banda de la firma, como entero de 64
+        bits con signo para SQLite.
+        """
+        return [
+            int.from_bytes(
+                hashlib.blake2b(
+                    signature[start : start + self.rows].tobytes(),
+                    digest_size=8,
+                    person=band.to_bytes(4, "little"),
+                    key=self.variant.encode("ascii")[:64],
+                ).digest(),
+                "little",
+                signed=True,
+            )
+            for band, start in enumerate(range(0, len(signature), self.rows))
+        ]
+
+    def find(self, chunks: list[TextChunk]) -> ChunkDuplicates:
+        """
+        Busca los duplicados de los chunks dados, entre ellos y en el índice.
+        El canónico de un duplicado es el candidato más parecido; ante un
+        empate se prefiere el del índice, que ya está pagado.
+        """
+        keys = [content_hash(self.variant, chunk.content) for chunk in chunks]
+        signatures = np.array(
+            [self.hasher.signature(chunk.content) for chunk in chunks],
+            dtype=np.uint32,
+        ).reshape(len(chunks), self.hasher.num_perm)
+        chunk_buckets = [self.buckets(signature) for signature in signatures]
+
+        stored_buckets = self.index.candidates(
+            list({bucket for buckets in chunk_buckets for bucket in buckets})
+        )
+        stored_signatures = self.index.signatures(
+            list(
+                {key for bucket_keys in stored_buckets.values() for key in bucket_keys}
+                | set(keys)
+            )
+        )
+
+        threshold = self.config.dedup_config.threshold
+        duplicates = ChunkDuplicates(keys, signatures)
+        stored_matches: dict[int, str] = {}
+        local_keys: dict[str, int] = {}
+        local_buckets: dict[int, list[int]] = {}
+        for position, (key, signature, buckets) in enumerate(
+            zip(keys, signatures, chunk_buckets)
+        ):
+            if key in stored_signatures:
+                stored_matches[position] = key
+                continue
+            if key in local_keys:
+                duplicates.canonical[position] = local_keys[key]
+                continue
+
+            best, best_similarity = None, threshold
+            stored_keys = [
+                stored_key
+                for stored_key in {
+                    stored_key
+                    for bucket in buckets
+                    for stored_key in stored_buckets.get(bucket, ())
+                }
+                if stored_key in stored_signatures
+            ]
+            if stored_keys:
+                similarities = self.hasher.similarity(
+                    signature,
+                    np.stack(
+                        [stored_signatures[stored_key] for stored_key in stored_keys]
+                    ),
+                )
+                index = int(similarities.argmax())
+                if similarities[index] >= best_similarity:
+                    best, best_similarity = stored_keys[index], similarities[index]
+            local_positions = sorted(
+                {other for bucket in buckets for other in local_buckets.get(bucket, ())}
+            )
+            if local_positions:
+                similarities = self.hasher.similarity(
+                    signature, signatures[local_positions]
+                )
+                index = int(similarities.argmax())
+                if similarities[index] > best_similarity or (
+                    best is None and similarities[index] >= best_similarity
+                ):
+                    best = local_positions[index]
+
+            if isinstance(best, str):
+                stored_matches[position] = best
+            elif best is not None:
+                duplicates.canonical[position] = best
+            else:
+                local_keys[key] = position
+                for bucket in buckets:
+                    local_buckets.setdefault(bucket, []).append(position)
+
+        stored = self.index.get_many(list(set(stored_matches.values())))
+        duplicates.stored = {
+            position: stored[key]
+            for position, key in stored_matches.items()
+            if key in stored
+        }
+        if duplicates:
+            logger.info(
+                f"{len(duplicates)} de {len(chunks)} chunks duplicados: se "
+                "reutilizan el embedding y la extracción de su chunk canónico"
+            )
+        return duplicates
+
+    def add(
+        self,
+        chunks: list[TextChunk],
+        duplicates: ChunkDuplicates,
+        results: list[ExtractionResult],
+    ) -> None:
+        """
+        Registra en el índice los chunks únicos con su embedding y su resultado
+        de extracción. Los que no tienen embedding o cuya extracción falló no
+        se registran.
+        """
+        entries = [
+            (
+                duplicates.keys[position],
+                duplicates.signatures[position],
+                self.buckets(duplicates.signatures[position]),
+                chunks[position].embedding,
+                results[position],
+            )
+            for position in duplicates.unique()
+            if chunks[position].embedding is not None
+            and results[position].error is None
+        ]
+        if entries:
+            self.index.put_many(entries)
@@ -0,0 +1,458 @@
+import csv
+import json
+import hashlib
+import logging
+import shlex
+import textwrap
+from abc import abstractmethod
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from documentgraph.config import ETLConfig
+from documentgraph.loading import (
+    GraphRowBuffer,
+    GraphSink,
+    Neo4JQueryManager,
+    flatten_properties,
+)
+from documentgraph.models import Document, ExtractionResult, TextChunk
+
+logger = logging.getLogger(__name__)
+
+_SCALAR_TYPES = ((bool, "boolean"), (int, "long"), (float, "double"), (str, "string"))
+
+
+def _csv_type(value: Any) -> str:
+    """
+    Devuelve el tipo de columna de `neo4j-admin database import` para un valor
+    ya aplanado con `flatten_properties`.
+    """
+    if isinstance(value, np.ndarray):
+        return "float[]"
+    if isinstance(value, list):
+        element = _csv_type(value[0]) if value else "string"
+        return f"{element}[]"
+    for python_type, csv_type in _SCALAR_TYPES:
+        if isinstance(value, python_type):
+            return csv_type
+    return "string"
+
+
+def _csv_value(value: Any, array_delimiter: str) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, np.ndarray):
+        return array_delimiter.join(np.char.mod("%.9g", value))
+    if isinstance(value, list):
+        return array_delimiter.join(
+            str(_csv_value(item, array_delimiter)) for item in value
+        )
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+class _CSVGroup:
+    """
+    Ficheros de un grupo de nodos o relaciones con la misma cabecera: un
+    fichero de cabecera y ficheros de datos de hasta `rows_per_file` filas.
+    """
+
+    def __init__(
+        self, directory: Path, name: str, header: list[str], rows_per_file: int
+    ):
+        self.directory = directory
+        self.name = name
+        self.rows_per_file = rows_per_file
+        self.header_file = directory / f"{name}.header.csv"
+        self.data_files: list[Path] = []
+        self._file = None
+        self._writer = None
+        self._rows_in_file = 0
+        with self.header_file.open("w", newline="", encoding="utf-8") as file:
+            csv.writer(file).writerow(header)
+
+    def write(self, row: list[Any]) -> None:
+        if self._writer is None or self._rows_in_file >= self.rows_per_file:
+            self._rotate()
+        self._writer.writerow(row)
+        self._rows_in_file += 1
+
+    def _rotate(self) -> None:
+        self.close()
+        path = self.directory / f"{self.name}.{len(self.data_files):05d}.csv"
+        self.data_files.append(path)
+        self._file = path.open("w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._rows_in_file = 0
+
+    def files(self) -> list[Path]:
+        return [self.header_file, *self.data_files]
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+
+class FileGraphSink(GraphRowBuffer, GraphSink):
+    """
+    Base de los destinos que escriben el grafo en ficheros.
+
+    Cada `flush` recorre las filas acumuladas y llama a `_write_node` y
+    `_write_relationship` para cada nodo y relación nuevos, en el orden de
+    `KnowledgeGraphLoader.flush`. Para no repetirlos entre lotes solo se
+    conservan los ids ya escritos, como resúmenes de 16 bytes, así que la
+    memoria apenas crece con el corpus. Si una relación entre entidades aparece
+    en varios lotes, se conservan las propiedades de la primera aparición.
+
+    Attributes:
+        config (ETLConfig): Configuración del pipeline.
+        directory (Path): Carpeta de salida.
+    """
+
+    def __init__(self, config: ETLConfig, directory: str | Path = None):
+        self.config = config
+        self.directory = Path(directory or config.export_config.path)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._seen: set[bytes] = set()
+        self._reset_buffers()
+
+    def _is_new(self, *key: str) -> bool:
+        digest = hashlib.blake2b("\0".join(key).encode(), digest_size=16).digest()
+        if digest in self._seen:
+            return False
+        self._seen.add(digest)
+        return True
+
+    @abstractmethod
+    def _write_node(self, label: str, node_id: str, properties: dict[str, Any]):
+        pass
+
+    @abstractmethod
+    def _write_relationship(
+        self,
+        rel_type: str,
+        start: tuple[str, str],
+        end: tuple[str, str],
+        properties: dict[str, Any] = None,
+    ):
+        pass
+
+    @staticmethod
+    def _chunk_properties(row: dict[str, Any]) -> dict[str, Any]:
+        properties = {"text": row["text"]}
+        if row["embedding"] is not None:
+            properties["embedding"] = np.asarray(row["embedding"], dtype=np.float32)
+        for key in ("start_index", "end_index"):
+            if row[key] is not None:
+                properties[key] = row[key]
+        return properties
+
+    def add_document(
+        self,
+        document: Document,
+        chunks: list[TextChunk],
+        extraction_results: list[ExtractionResult],
+        prev_chunk_id: str = None,
+        complete: bool = True,
+    ) -> list[Document]:
+        """
+        Acumula un documento y escribe los ficheros cuando las filas acumuladas
+        alcanzan `ETLConfig.load_batch_size`. Ver `KnowledgeGraphLoader.add_document`.
+        """
+        if self.buffer_document(
+            document, chunks, extraction_results, prev_chunk_id, complete
+        ):
+            return self.flush()
+        return []
+
+    def flush(self) -> list[Document]:
+        """
+        Escribe en los ficheros todas las filas acumuladas.
+
+        Returns:
+            list[Document]: Los documentos escritos.
+        """
+        if not self._document_rows:
+            return []
+
+        for row in self._document_rows:
+            if self._is_new("Document", row["id"]):
+                self._write_node(
+                    "Document", row["id"], flatten_properties(row["properties"])
+                )
+
+        for row in self._entity_rows.values():
+            if self._is_new("Entity", row["id"]):
+                self._write_node(
+                    "Entity", row["id"], flatten_properties(row["properties"])
+                )
+
+        for rel_type, rows in self._relationship_rows.items():
+            for (source_id, target_id), row in rows.items():
+                if self._is_new(rel_type, source_id, target_id):
+                    self._write_relationship(
+                        rel_type,
+                        ("Entity", source_id),
+                        ("Entity", target_id),
+                        row["properties"],
+                    )
+
+        new_chunks = set()
+        for row in self._chunk_rows:
+            if not self._is_new("TextChunk", row["id"]):
+                continue
+            new_chunks.add(row["id"])
+            self._write_node(
+                "TextChunk",
+                row["id"],
+                self._chunk_properties(row),
+            )
+            self._write_relationship(
+                "HAS_CHUNK", ("Document", row["doc_id"]), ("TextChunk", row["id"])
+            )
+            for entity_id in dict.fromkeys(row["entity_ids"]):
+                self._write_relationship(
+                    "CONTAINS", ("TextChunk", row["id"]), ("Entity", entity_id)
+                )
+
+        for row in self._next_rows:
+            if row["id"] in new_chunks:
+                self._write_relationship(
+                    "NEXT", ("TextChunk", row["prev_id"]), ("TextChunk", row["id"])
+                )
+
+        return self.take_pending()
+
+
+class CSVGraphExporter(FileGraphSink):
+    """
+    Alternativa a `KnowledgeGraphLoader` que, en lugar de escribir en Neo4j,
+    genera los ficheros CSV de `neo4j-admin database import full` para crear
+    una base de datos nueva de una vez, mucho más rápido que con `MERGE`.
+
+    Es un `GraphSink`, así que el pipeline la usa sin cambios con
+    `ETLConfig.sink = "csv"`, escribiendo en `ExportConfig.path`. Cada `flush`
+    añade las filas acumuladas a los ficheros abiertos, sin repetir nodos ni
+    relaciones (ver `FileGraphSink`).
+
+    Los ficheros se agrupan por etiqueta o tipo de relación (`Document`,
+    `TextChunk`, `Entity`, `HAS_CHUNK`, `CONTAINS`, `NEXT` y un grupo por cada
+    tipo de relación entre entidades) y por conjunto de propiedades, ya que
+    cada grupo tiene una cabecera fija. Cada grupo tiene un fichero de
+    cabecera y ficheros de datos de hasta `ExportConfig.rows_per_file` filas.
+    Al cerrar se escriben `import.sh`, con el comando de importación, y
+    `schema.cypher`, con las restricciones e índices que hay que crear después
+    de importar.
+
+    Attributes:
+        config (ETLConfig): Configuración del pipeline.
+        directory (Path): Carpeta de salida.
+    """
+
+    def __init__(self, config: ETLConfig, directory: str | Path = None):
+        super().__init__(config, directory)
+        self._groups: dict[tuple, _CSVGroup] = {}
+
+    def _group(
+        self, kind: str, label: str, id_columns: list[str], properties: dict[str, Any]
+    ) -> _CSVGroup:
+        columns = tuple((key, _csv_type(value)) for key, value in properties.items())
+        group_key = (kind, label, columns)
+        group = self._groups.get(group_key)
+        if group is None:
+            variant = sum(1 for key in self._groups if key[:2] == (kind, label))
+            header = id_columns + [
+                key if csv_type == "string" else f"{key}:{csv_type}"
+                for key, csv_type in columns
+            ]
+            group = _CSVGroup(
+                self.directory,
+                f"{kind}.{label}.{variant}",
+                header,
+                self.config.export_config.rows_per_file,
+            )
+            self._groups[group_key] = group
+        return group
+
+    def _write_node(self, label: str, node_id: str, properties: dict[str, Any]):
+        properties = {key: value for key, value in properties.items() if key != "id"}
+        group = self._group("nodes", label, [f"id:ID({label})"], properties)
+        delimiter = self.config.export_config.array_delimiter
+        group.write(
+            [node_id, *(_csv_value(value, delimiter) for value in properties.values())]
+        )
+
+    def _write_relationship(
+        self,
+        rel_type: str,
+        start: tuple[str, str],
+        end: tuple[str, str],
+        properties: dict[str, Any] = None,
+    ):
+        properties = properties or {}
+        group = self._group(
+            "relationships",
+            rel_type,
+            [f":START_ID({start[0]})", f":END_ID({end[0]})"],
+            properties,
+        )
+        delimiter = self.config.export_config.array_delimiter
+        group.write(
+            [
+                start[1],
+                end[1],
+                *(_csv_value(value, delimiter) for value in properties.values()),
+            ]
+        )
+
+    def ensure_schema(self, recreate_vector_index: bool = False) -> None:
+        """
+        No escribe nada: `neo4j-admin` importa en una base de datos nueva y el
+        esquema se crea después con `schema.cypher`.
+        """
+        logger.info(f"Exportando el grafo a CSV en {self.directory}")
+
+    def delete_document_chunks(self, doc_ids: list[str]) -> None:
+        raise NotImplementedError(
+            "La exportación a CSV no admite el modo incremental: los ficheros "
+            "solo sirven para crear una base de datos nueva"
+        )
+
+    def delete_documents(self, doc_ids: list[str]) -> None:
+        self.delete_document_chunks(doc_ids)
+
+    def import_command(self, database: str = "neo4j") -> list[str]:
+        """
+        Devuelve el comando `neo4j-admin database import full` para importar
+        los ficheros generados, con rutas relativas a la carpeta de salida.
+        """
+        command = [
+            "neo4j-admin",
+            "database",
+            "import",
+            "full",
+            database,
+            "--multiline-fields=true",
+            f"--array-delimiter={self.config.export_config.array_delimiter}",
+        ]
+        for (kind, label, _), group in self._groups.items():
+            files = ",".join(path.name for path in group.files())
+            command.append(f"--{kind}={label}={files}")
+        return command
+
+    def _write_scripts(self) -> None:
+        command = [shlex.quote(part) for part in self.import_command()]
+        # One option per line after "neo4j-admin database import full <db>"
+        script = " \\\n  ".join([" ".join(command[:5]), *command[5:]])
+        with (self.directory / "import.sh").open("w", encoding="utf-8") as file:
+            file.write(f'#!/bin/sh\ncd "$(dirname "$0")"\n{script}\n')
+
+        embedding_config = self.config.embedding_config
+        queries = [
+            *Neo4JQueryManager.create_schema(),
+            Neo4JQueryManager.create_vector_index(
+                self.config.graph_db_config.vector_index
+            ),
+        ]
+        # cypher-shell script; the vector index query takes its options as params
+        statements = [
+            f":param {{dimension: {embedding_config.dimension}, "
+            f"similarity: '{embedding_config.similarity}'}}",
+            *(textwrap.dedent(query).strip() + ";" for query in queries),
+        ]
+        with (self.directory / "schema.cypher").open("w", encoding="utf-8") as file:
+            file.write("\n\n".join(statements) + "\n")
+
+    def close(self) -> None:
+        """
+        Escribe las filas pendientes, cierra los ficheros y genera `import.sh` y
+        `schema.cypher`.
+        """
+        self.flush()
+        for group in self._groups.values():
+            group.close()
+        self._write_scripts()
+        logger.info(
+            f"Exportación CSV completada en {self.directory}; importa con import.sh"
+        )
+
+
+class JSONLGraphSink(FileGraphSink):
+    """
+    Destino que escribe el grafo en `nodes.jsonl` y `relationships.jsonl`, una
+    línea JSON por nodo o relación con el formato de `apoc.export.json`, para
+    ejecutar el pipeline sin base de datos y cargar o inspeccionar el resultado
+    después. Se usa con `ETLConfig.sink = "jsonl"`.
+
+    Los ficheros se abren en el primer `flush`: la primera vez que los abre un
+    destino los vacía, así que ejecutar de nuevo sobre la misma carpeta no
+    duplica líneas. Si el mismo destino se reutiliza tras `close`, los vuelve a
+    abrir para añadir solo los nodos y relaciones que aún no escribió.
+    """
+
+    def __init__(self, config: ETLConfig, directory: str | Path = None):
+        super().__init__(config, directory)
+        self._nodes = None
+        self._relationships = None
+        self._mode = "w"
+
+    def _open(self) -> None:
+        if self._nodes is None:
+            self._nodes = (self.directory / "nodes.jsonl").open(
+                self._mode, encoding="utf-8"
+            )
+            self._relationships = (self.directory / "relationships.jsonl").open(
+                self._mode, encoding="utf-8"
+            )
+            self._mode = "a"
+
+    def flush(self) -> list[Document]:
+        self._open()
+        return super().flush()
+
+    @staticmethod
+    def _json_value(value: Any) -> Any:
+        return value.tolist() if isinstance(value, np.ndarray) else value
+
+    def _write_node(self, label: str, node_id: str, properties: dict[str, Any]):
+        line = {
+            "type": "node",
+            "id": node_id,
+            "labels": [label],
+            "properties": {
+                "id": node_id,
+                **{key: self._json_value(value) for key, value in properties.items()},
+            },
+        }
+        self._nodes.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    def _write_relationship(
+        self,
+        rel_type: str,
+        start: tuple[str, str],
+        end: tuple[str, str],
+        properties: dict[str, Any] = None,
+    ):
+        line = {
+            "type": "relationship",
+            "label": rel_type,
+            "start": {"id": start[1], "labels": [start[0]]},
+            "end": {"id": end[1], "labels": [end[0]]},
+            "properties": properties or {},
+        }
+        self._relationships.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        """
+        Escribe las filas pendientes y cierra los ficheros.
+        """
+        self.flush()
+        self._nodes.close()
+        self._relationships.close()
+        self._nodes = None
+        self._relationships = None
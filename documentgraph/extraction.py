@@ -1,9 +1,13 @@
+import fnmatch
+import hashlib
 import logging
+import os
 from abc import ABC, abstractmethod
 from pathlib import Path
+from typing import Iterator
 
 from documentgraph.config import ETLConfig
-from documentgraph.models import Document
+from documentgraph.models import Document, stable_id
 
 
 class DataExtractor(ABC):
@@ -15,28 +19,113 @@ class DataExtractor(ABC):
         pass
 
 
+def file_hash(file_path: Path, block_size: int = 1 << 20) -> str:
+    """
+    Calcula el SHA-256 del contenido de un fichero leyéndolo por bloques.
+    """
+    digest = hashlib.sha256()
+    with file_path.open("rb") as file:
+        while block := file.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_text_windows(file_path: Path, window_size: int) -> Iterator[str]:
+    """
+    Lee un fichero de texto UTF-8 en ventanas de `window_size` caracteres, sin
+    cargarlo entero en memoria. El decodificador incremental del modo texto se
+    encarga de los caracteres multibyte que caen en el borde de una ventana.
+    """
+    with file_path.open("r", encoding="utf-8") as file:
+        while window := file.read(window_size):
+            yield window
+
+
 class DocumentExtractor(DataExtractor):
-    def extract(self, input_folder) -> Document:
+    @staticmethod
+    def resolve_input(input_folder) -> Path:
         """
-        Extracts documents from the configured input folder and yields them as Document objects.
+        Resuelve la ruta de entrada: absoluta, relativa al directorio actual o,
+        por compatibilidad, relativa a la raíz del proyecto.
+        """
+        input_path = Path(input_folder).expanduser()
+        if input_path.is_absolute() or input_path.exists():
+            return input_path.resolve()
+        project_root = Path(__file__).resolve().parent.parent
+        return (project_root / input_path).resolve()
 
-        This method iterates through the files in the input folder, and for each file with a .txt extension, it reads the file content and yields a Document object with the file's ID, filename, and content.
-        If no files are found, it logs a message and exits the program.
+    def iter_files(self, input_path: Path) -> Iterator[Path]:
         """
+        Recorre la ruta de entrada y devuelve, en orden, los ficheros que cumplen
+        los patrones `include` y no cumplen los `exclude` de `SourceConfig`.
+        Los patrones se comparan con el nombre y con la ruta relativa a la
+        entrada. Si la entrada es un fichero se devuelve tal cual.
+        """
+        if input_path.is_file():
+            yield input_path
+            return
 
-        project_root = Path(__file__).resolve().parent.parent
-        input_path = project_root / input_folder
-        files = list(input_path.glob("*.txt"))
+        source_config = self.config.source_config
 
-        if not files:
-            import sys
+        def matches(relative: str, patterns: list[str]) -> bool:
+            name = relative.rsplit("/", 1)[-1]
+            return any(
+                fnmatch.fnmatch(relative, pattern) or fnmatch.fnmatch(name, pattern)
+                for pattern in patterns
+            )
+
+        for directory, dirnames, filenames in os.walk(input_path):
+            base = Path(directory).relative_to(input_path)
+            if source_config.recursive:
+                dirnames[:] = sorted(
+                    d
+                    for d in dirnames
+                    if not matches((base / d).as_posix(), source_config.exclude)
+                )
+            else:
+                dirnames.clear()
+            for filename in sorted(filenames):
+                relative = (base / filename).as_posix()
+                if matches(relative, source_config.include) and not matches(
+                    relative, source_config.exclude
+                ):
+                    yield Path(directory) / filename
+
+    def extract(self, input_folder) -> Document:
+        """
+        Extracts documents from the input folder and yields them as Document objects.
 
-            logging.warning(
-                f"No archivos .txt encontrados {input_path}. Salir del programa."
+        The input may be an absolute path, a path relative to the current directory or a single file. Directories are walked (recursively if configured) and files are filtered with the include/exclude patterns of SourceConfig.
+        Files larger than SourceConfig.stream_threshold are not read here: they are yielded as streamed documents with empty content, and TextProcessor reads them in windows while chunking.
+        In incremental mode the document ID is derived from the file path, so re-running over the same folder yields the same IDs.
+        Raises FileNotFoundError if the input path does not exist; if no files match, it logs a warning and yields nothing.
+        """
+
+        input_path = self.resolve_input(input_folder)
+        if not input_path.exists():
+            raise FileNotFoundError(f"No existe la ruta de entrada: {input_path}")
+
+        found = False
+        for file_path in self.iter_files(input_path):
+            found = True
+            streamed = (
+                file_path.stat().st_size > self.config.source_config.stream_threshold
+            )
+            if streamed:
+                content = ""
+            else:
+                with file_path.open("r", encoding="utf-8") as file:
+                    content = file.read()
+            document = Document(
+                filename=file_path.name,
+                content=content,
+                path=str(file_path),
+                content_hash=file_hash(file_path),
+                streamed=streamed,
             )
-            sys.exit(1)
+            if self.config.incremental:
+                document.id = stable_id(document.path)
+            yield document
 
-        for file_path in files:
-            with file_path.open("r", encoding="utf-8") as file:
-                content = file.read()
-                yield Document(filename=file_path.name, content=content)
+        if not found:
+            logging.warning(f"No se encontraron documentos en {input_path}")
@@ -0,0 +1,257 @@
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+
+from documentgraph.cache import SQLiteCache
+from documentgraph.models import Document, ExtractionResult, TextChunk
+
+logger = logging.getLogger(__name__)
+
+
+class RunJournal(SQLiteCache):
+    """
+    Diario local de las ejecuciones del pipeline, para poder reanudarlas.
+
+    Por cada documento, identificado por su ruta, guarda el id con el que se
+    procesa, el hash de su contenido, su estado (`running`, `failed` o `done`),
+    la última etapa alcanzada, el último error y el número de intentos. Por
+    cada parte del documento guarda también los artefactos intermedios: los
+    chunks con sus embeddings tras la etapa `embed` y los resultados de
+    extracción tras `extract`.
+
+    Al reanudar, los documentos `done` se omiten, los demás se procesan de
+    nuevo con el mismo id y las etapas con artefacto guardado no se repiten, de
+    modo que no se vuelve a pagar por embeddings ni llamadas al LLM. Los
+    artefactos de un documento se eliminan cuando queda cargado en el grafo.
+
+    Attributes:
+        max_attempts (int): Intentos por documento antes de dejar de reintentarlo.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS documents (
+        path TEXT PRIMARY KEY,
+        doc_id TEXT NOT NULL,
+        content_hash TEXT,
+        status TEXT NOT NULL,
+        stage TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        updated REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS artifacts (
+        path TEXT NOT NULL,
+        part INTEGER NOT NULL,
+        stage TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        vectors BLOB,
+        PRIMARY KEY (path, part, stage)
+    );
+    """
+
+    def __init__(self, path: str | Path, max_attempts: int = 3):
+        super().__init__(path)
+        self.max_attempts = max_attempts
+
+    def begin(self, document: Document) -> bool:
+        """
+        Registra el inicio del procesamiento de un documento.
+
+        Si el diario ya tiene el documento con el mismo contenido, le asigna el
+        id registrado para que los artefactos y lo ya cargado sigan siendo
+        válidos. Si el contenido cambió, descarta sus artefactos anteriores.
+
+        Returns:
+            bool: False si el documento ya está cargado o agotó sus intentos.
+        """
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT doc_id, content_hash, status, attempts FROM documents "
+                "WHERE path = ?",
+                (document.path,),
+            ).fetchone()
+            if row is not None and row[1] == document.content_hash:
+                doc_id, _, status, attempts = row
+                if status == "done":
+                    logger.info(f"Documento ya cargado, se omite: {document.filename}")
+                    return False
+                if status == "failed" and attempts >= self.max_attempts:
+                    logger.warning(
+                        f"Documento con {attempts} intentos fallidos, se omite: "
+                        f"{document.filename}"
+                    )
+                    return False
+                document.id = doc_id
+                conn.execute(
+                    "UPDATE documents SET status = 'running', attempts = attempts + 1, "
+                    "updated = ? WHERE path = ?",
+                    (time.time(), document.path),
+                )
+                return True
+
+            conn.execute("DELETE FROM artifacts WHERE path = ?", (document.path,))
+            conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(path, doc_id, content_hash, status, attempts, updated) "
+                "VALUES (?, ?, ?, 'running', 1, ?)",
+                (document.path, document.id, document.content_hash, time.time()),
+            )
+        return True
+
+    def _set_stage(self, conn, document: Document, stage: str) -> None:
+        conn.execute(
+            "UPDATE documents SET stage = ?, updated = ? WHERE path = ?",
+            (stage, time.time(), document.path),
+        )
+
+    def save_chunks(
+        self, document: Document, part: int, chunks: list[TextChunk]
+    ) -> None:
+        """
+        Guarda los chunks de una parte con sus embeddings, como float32.
+        """
+        payload = json.dumps(
+            [
+                chunk.model_dump(exclude={"embedding"}, exclude_none=True)
+                for chunk in chunks
+            ]
+        )
+        vectors = (
+            np.asarray(
+                [chunk.embedding for chunk in chunks], dtype=np.float32
+            ).tobytes()
+            if chunks
+            else None
+        )
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts (path, part, stage, payload, vectors) "
+                "VALUES (?, ?, 'embed', ?, ?)",
+                (document.path, part, payload, vectors),
+            )
+            self._set_stage(conn, document, "embed")
+
+    def load_chunks(self, document: Document, part: int) -> list[TextChunk] | None:
+        row = (
+            self.connection()
+            .execute(
+                "SELECT payload, vectors FROM artifacts "
+                "WHERE path = ? AND part = ? AND stage = 'embed'",
+                (document.path, part),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        chunks = [TextChunk(**data) for data in json.loads(row[0])]
+        if chunks:
+            vectors = np.frombuffer(row[1], dtype=np.float32).reshape(len(chunks), -1)
+            for chunk, vector in zip(chunks, vectors):
+                chunk.embedding = vector
+        return chunks
+
+    def save_results(
+        self, document: Document, part: int, results: list[ExtractionResult]
+    ) -> None:
+        payload = json.dumps(
+            [result.model_dump(mode="json", exclude_none=True) for result in results]
+        )
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts (path, part, stage, payload) "
+                "VALUES (?, ?, 'extract', ?)",
+                (document.path, part, payload),
+            )
+            self._set_stage(conn, document, "extract")
+
+    def load_results(
+        self, document: Document, part: int
+    ) -> list[ExtractionResult] | None:
+        row = (
+            self.connection()
+            .execute(
+                "SELECT payload FROM artifacts "
+                "WHERE path = ? AND part = ? AND stage = 'extract'",
+                (document.path, part),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return [ExtractionResult(**data) for data in json.loads(row[0])]
+
+    def status(self, document: Document) -> str | None:
+        """
+        Devuelve el estado registrado del documento, o None si no está.
+        """
+        row = (
+            self.connection()
+            .execute("SELECT status FROM documents WHERE path = ?", (document.path,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def fail(self, document: Document, stage: str, error: Exception) -> None:
+        """
+        Marca el documento como fallido en la etapa dada. Sus artefactos se
+        conservan para el siguiente intento.
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE documents SET status = 'failed', stage = ?, error = ?, "
+                "updated = ? WHERE path = ?",
+                (stage, f"{type(error).__name__}: {error}", time.time(), document.path),
+            )
+
+    def complete(self, documents: list[Document]) -> list[Document]:
+        """
+        Marca como cargados los documentos que no fallaron en esta ejecución y
+        elimina sus artefactos. El pipeline solo los pasa cuando han cargado
+        todas sus partes; uno con alguna parte fallida sigue `failed`, aunque
+        otras partes se cargaran, y aparece en `failed_documents`.
+
+        Returns:
+            list[Document]: Los documentos marcados como cargados.
+        """
+        completed = []
+        with self.transaction() as conn:
+            for document in documents:
+                cursor = conn.execute(
+                    "UPDATE documents SET status = 'done', stage = 'load', "
+                    "error = NULL, updated = ? WHERE path = ? AND status = 'running'",
+                    (time.time(), document.path),
+                )
+                if cursor.rowcount:
+                    conn.execute(
+                        "DELETE FROM artifacts WHERE path = ?", (document.path,)
+                    )
+                    completed.append(document)
+        return completed
+
+    def failed_documents(self) -> list[dict]:
+        """
+        Devuelve los documentos fallidos con su etapa, error e intentos.
+        """
+        rows = (
+            self.connection()
+            .execute(
+                "SELECT path, doc_id, stage, error, attempts FROM documents "
+                "WHERE status = 'failed' ORDER BY path"
+            )
+            .fetchall()
+        )
+        return [
+            dict(zip(("path", "doc_id", "stage", "error", "attempts"), row))
+            for row in rows
+        ]
+
+    def clear(self) -> None:
+        """
+        Vacía el diario para empezar una ejecución desde cero.
+        """
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM artifacts")
+            conn.execute("DELETE FROM documents")
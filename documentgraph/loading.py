@@ -1,55 +1,545 @@
+import asyncio
+import json
 import logging
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Iterator
 
 from documentgraph.config import ETLConfig
-from documentgraph.models import Entity, Relationship, TextChunk, Document
-from neo4j import GraphDatabase
+from documentgraph.models import (
+    Entity,
+    Relationship,
+    TextChunk,
+    Document,
+    ExtractionResult,
+)
+from neo4j import AsyncGraphDatabase, GraphDatabase
 
 logger = logging.getLogger(__name__)
 
 
+def _batched(rows: list[dict[str, Any]], size: int) -> Iterator[list[dict[str, Any]]]:
+    for start in range(0, len(rows), max(size, 1)):
+        yield rows[start : start + size]
+
+
+def sanitize_relationship_type(relationship_type: str) -> str:
+    """
+    Convierte un tipo de relación extraído por el LLM en un tipo válido de
+    Neo4j en estilo UPPER_SNAKE_CASE ("works for" -> "WORKS_FOR"), para poder
+    escribirlo literalmente en la consulta.
+    """
+    sanitized = re.sub(r"\W+", "_", relationship_type.upper()).strip("_")
+    if not sanitized:
+        return "RELATED_TO"
+    if sanitized[0].isdigit():
+        return f"R_{sanitized}"
+    return sanitized
+
+
+def flatten_properties(properties: dict[str, Any], prefix: str = "") -> dict[str, Any]:
+    """
+    Aplana un diccionario de propiedades en claves `a.b`, ya que Neo4j solo
+    admite valores primitivos o listas de primitivos. Los demás valores se
+    guardan como JSON.
+    """
+    flat = {}
+    for key, value in properties.items():
+        key = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_properties(value, f"{key}."))
+        elif value is None or isinstance(value, (str, int, float, bool)):
+            if value is not None:
+                flat[key] = value
+        elif isinstance(value, list) and all(
+            isinstance(item, (str, int, float, bool)) for item in value
+        ):
+            flat[key] = value
+        else:
+            flat[key] = json.dumps(value, ensure_ascii=False, default=str)
+    return flat
+
+
 class Neo4JQueryManager:
     @staticmethod
-    def create_document():
+    def merge_documents():
         return """
-        MERGE (d:Document {id: $id})
-        SET d += $properties
+        UNWIND $rows AS row
+        MERGE (d:Document {id: row.id})
+        SET d += row.properties
         """
 
     @staticmethod
-    def create_entity():
+    def merge_entities():
         return """
-        MERGE (e:Entity {id: $id})
-        SET e += $properties
+        UNWIND $rows AS row
+        MERGE (e:Entity {id: row.id})
+        SET e += row.properties
         """
 
     @staticmethod
-    def create_relationship():
-        return """
-        MATCH (s:Entity {id: $source_id})
-        MATCH (t:Entity {id: $target_id})
-        CALL apoc.create.relationship(s, $rel_type, {}, t) YIELD rel
-        RETURN rel
+    def merge_relationships(relationship_type: str):
+        # Relationship types cannot be passed as parameters; the type must come
+        # from sanitize_relationship_type
+        return f"""
+        UNWIND $rows AS row
+        MATCH (s:Entity {{id: row.source_id}})
+        MATCH (t:Entity {{id: row.target_id}})
+        MERGE (s)-[r:`{relationship_type}`]->(t)
+        SET r += row.properties,
+            r.sources = coalesce(r.sources, []) + [
+                source IN row.sources WHERE NOT source IN coalesce(r.sources, [])
+            ]
         """
 
     @staticmethod
-    def create_chunks_and_relationships():
+    def merge_chunks():
         return """
-        CREATE (c:TextChunk {id: $chunk.id, text: $chunk.text, embedding: $chunk.embedding})
-        WITH c, $chunk AS chunk
-        MATCH (d:Document {id: $doc_id})
-        CREATE (d)-[:HAS_CHUNK]->(c)
-        WITH c, chunk
-        UNWIND chunk.entity_ids AS entity_id
+        UNWIND $rows AS row
+        MATCH (d:Document {id: row.doc_id})
+        MERGE (c:TextChunk {id: row.id})
+        SET c.text = row.text, c.embedding = row.embedding,
+            c.start_index = row.start_index, c.end_index = row.end_index,
+            c.document_hash = row.document_hash
+        MERGE (d)-[:HAS_CHUNK]->(c)
+        WITH c, row
+        UNWIND row.entity_ids AS entity_id
         MATCH (e:Entity {id: entity_id})
-        CREATE (c)-[:CONTAINS]->(e)
-        WITH c, chunk
-        MATCH (prev:TextChunk {id: chunk.prev_chunk_id})
-        WHERE chunk.prev_chunk_id IS NOT NULL
-        CREATE (prev)-[:NEXT]->(c)
+        MERGE (c)-[:CONTAINS]->(e)
+        """
+
+    @staticmethod
+    def merge_next_links():
+        # A missing endpoint (e.g. a previous chunk already deleted) skips the
+        # link instead of creating an empty TextChunk
+        return """
+        UNWIND $rows AS row
+        MATCH (prev:TextChunk {id: row.prev_id})
+        MATCH (c:TextChunk {id: row.id})
+        MERGE (prev)-[:NEXT]->(c)
+        """
+
+    @staticmethod
+    def create_schema():
+        # Every MERGE/MATCH by id is an index seek instead of a label scan
+        return [
+            """
+            CREATE CONSTRAINT document_id IF NOT EXISTS
+            FOR (d:Document) REQUIRE d.id IS UNIQUE
+            """,
+            """
+            CREATE CONSTRAINT text_chunk_id IF NOT EXISTS
+            FOR (c:TextChunk) REQUIRE c.id IS UNIQUE
+            """,
+            """
+            CREATE CONSTRAINT entity_id IF NOT EXISTS
+            FOR (e:Entity) REQUIRE e.id IS UNIQUE
+            """,
+            """
+            CREATE CONSTRAINT entity_key IF NOT EXISTS
+            FOR (e:Entity) REQUIRE e.key IS UNIQUE
+            """,
+            """
+            CREATE INDEX entity_name_type IF NOT EXISTS
+            FOR (e:Entity) ON (e.name, e.type)
+            """,
+        ]
+
+    @staticmethod
+    def show_constraints():
+        return """
+        SHOW CONSTRAINTS YIELD name, type, labelsOrTypes, properties
+        RETURN name, type, labelsOrTypes AS labels, properties
+        """
+
+    @staticmethod
+    def show_indexes():
+        return """
+        SHOW INDEXES
+        YIELD name, type, state, labelsOrTypes, properties, owningConstraint
+        RETURN name, type, state, labelsOrTypes AS labels, properties,
+               owningConstraint
+        """
+
+    @staticmethod
+    def create_vector_index(index_name: str):
+        # Index names cannot be passed as parameters
+        return f"""
+        CREATE VECTOR INDEX `{index_name}` IF NOT EXISTS
+        FOR (c:TextChunk) ON (c.embedding)
+        OPTIONS {{indexConfig: {{
+            `vector.dimensions`: $dimension,
+            `vector.similarity_function`: $similarity
+        }}}}
+        """
+
+    @staticmethod
+    def drop_index(index_name: str):
+        return f"DROP INDEX `{index_name}` IF EXISTS"
+
+    @staticmethod
+    def show_index():
+        return """
+        SHOW INDEXES YIELD name, type, state, options
+        WHERE name = $index_name
+        RETURN type, state, options
+        """
+
+    @staticmethod
+    def vector_search():
+        return """
+        CALL db.index.vector.queryNodes($index_name, $top_k, $embedding)
+        YIELD node AS chunk, score
+        OPTIONAL MATCH (d:Document)-[:HAS_CHUNK]->(chunk)
+        CALL {
+            WITH chunk
+            MATCH (chunk)-[:CONTAINS]->(e:Entity)
+            WITH e LIMIT $max_entities
+            OPTIONAL MATCH (e)-[r]-(n:Entity)
+            WITH e, collect(
+                CASE WHEN n IS NULL THEN NULL ELSE {
+                    id: n.id,
+                    name: n.name,
+                    type: n.type,
+                    relationship: type(r),
+                    outgoing: startNode(r) = e
+                } END
+            )[..$max_neighbors] AS neighbors
+            RETURN collect({
+                id: e.id, name: e.name, type: e.type, neighbors: neighbors
+            }) AS entities
+        }
+        RETURN chunk.id AS chunk_id, chunk.text AS text, score,
+               d.id AS document_id, d.filename AS filename, entities
+        ORDER BY score DESC
+        """
+
+    @staticmethod
+    def remove_relationship_sources():
+        # Entity relationships are found through the entities of the document's
+        # chunks, which contain both ends of every relationship they produced
+        return """
+        UNWIND $rows AS row
+        MATCH (:Document {id: row.doc_id})-[:HAS_CHUNK]->(:TextChunk)
+              -[:CONTAINS]->(e:Entity)
+        WITH DISTINCT row, e
+        MATCH (e)-[r]->(:Entity)
+        WHERE any(
+            source IN r.sources
+            WHERE source STARTS WITH row.doc_id + ':'
+                  AND source <> coalesce(row.keep, '')
+        )
+        SET r.sources = [
+            source IN r.sources
+            WHERE NOT source STARTS WITH row.doc_id + ':'
+                  OR source = coalesce(row.keep, '')
+        ]
+        WITH r WHERE size(r.sources) = 0
+        DELETE r
+        """
+
+    @staticmethod
+    def delete_document_chunks():
+        # With a document_hash only the chunks of other versions are deleted
+        return """
+        UNWIND $rows AS row
+        MATCH (d:Document {id: row.doc_id})-[:HAS_CHUNK]->(c:TextChunk)
+        WHERE row.document_hash IS NULL
+              OR c.document_hash IS NULL
+              OR c.document_hash <> row.document_hash
+        OPTIONAL MATCH (c)-[:CONTAINS]->(e:Entity)
+        WITH collect(DISTINCT c) AS chunks, collect(DISTINCT e) AS entities
+        FOREACH (c IN chunks | DETACH DELETE c)
+        WITH entities
+        UNWIND entities AS e
+        WITH e WHERE NOT EXISTS { MATCH (:TextChunk)-[:CONTAINS]->(e) }
+        DETACH DELETE e
+        """
+
+    @staticmethod
+    def delete_documents():
+        return """
+        UNWIND $doc_ids AS doc_id
+        MATCH (d:Document {id: doc_id})
+        DETACH DELETE d
+        """
+
+
+class GraphSink(ABC):
+    """
+    Destino de la etapa de carga del pipeline.
+
+    `add_document` recibe un documento (o una parte de él) con sus fragmentos y
+    sus resultados de extracción, y `flush` escribe lo pendiente; ambos
+    devuelven los documentos completos ya escritos, que el pipeline registra en
+    el diario y el manifiesto. Los destinos que no pueden borrar datos no
+    admiten el modo incremental.
+    """
+
+    def ensure_schema(self, recreate_vector_index: bool = False) -> None:
+        """
+        Prepara el destino antes de cargar. Por defecto no hace nada.
+        """
+
+    @abstractmethod
+    def add_document(
+        self,
+        document: Document,
+        chunks: list[TextChunk],
+        extraction_results: list[ExtractionResult],
+        prev_chunk_id: str = None,
+        complete: bool = True,
+    ) -> list[Document]:
+        pass
+
+    @abstractmethod
+    def flush(self) -> list[Document]:
+        pass
+
+    def delete_document_chunks(self, doc_ids: list[str]) -> None:
+        raise NotImplementedError(
+            f"{type(self).__name__} no admite el modo incremental: no puede "
+            "eliminar datos ya escritos"
+        )
+
+    def delete_stale_chunks(self, documents: list[Document]) -> None:
+        """
+        Elimina los datos de las versiones anteriores de documentos ya cargados
+        de nuevo: sus fragmentos de otro `content_hash` y las relaciones entre
+        entidades que solo aportaban esas versiones.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} no admite el modo incremental: no puede "
+            "eliminar datos ya escritos"
+        )
+
+    def delete_documents(self, doc_ids: list[str]) -> None:
+        self.delete_document_chunks(doc_ids)
+
+    def close(self) -> None:
+        pass
+
+
+class GraphRowBuffer:
+    """
+    Acumula las filas de documentos, entidades, relaciones y fragmentos que se
+    escriben en Neo4j con consultas `UNWIND $rows`.
+
+    Es la base común de los cargadores síncrono y asíncrono: ellos deciden cómo
+    ejecutar los pasos devueltos por `flush_steps`.
+    """
+
+    def _reset_buffers(self) -> None:
+        self._pending_documents: list[Document] = []
+        self._document_rows: list[dict[str, Any]] = []
+        self._entity_rows: dict[str, dict[str, Any]] = {}
+        # Relationship type -> (source_id, target_id) -> row
+        self._relationship_rows: dict[str, dict[tuple[str, str], dict[str, Any]]] = {}
+        self._relationship_count = 0
+        self._chunk_rows: list[dict[str, Any]] = []
+        self._next_rows: list[dict[str, Any]] = []
+
+    @staticmethod
+    def _document_row(document: Document) -> dict[str, Any]:
+        properties = document.model_dump(exclude_none=True)
+        del properties["content"]
+        if "metadata" in properties and not properties["metadata"]:
+            del properties["metadata"]
+        return {"id": document.id, "properties": properties}
+
+    @staticmethod
+    def _entity_row(entity: Entity) -> dict[str, Any]:
+        properties = entity.model_dump(exclude_none=True)
+        properties.pop("properties", None)
+        return {"id": entity.id, "properties": properties}
+
+    @staticmethod
+    def relationship_source(document: Document) -> str:
+        """
+        Devuelve la procedencia que se registra en `sources` de las relaciones
+        entre entidades aportadas por esta versión del documento.
+        """
+        return f"{document.id}:{document.content_hash or ''}"
+
+    @staticmethod
+    def _relationship_row(
+        relationship: Relationship, source: str | None = None
+    ) -> dict[str, Any] | None:
+        if not relationship.source_id or not relationship.target_id:
+            return None
+        return {
+            "source_id": relationship.source_id,
+            "target_id": relationship.target_id,
+            "type": sanitize_relationship_type(relationship.type),
+            "properties": flatten_properties(relationship.properties),
+            "sources": [source] if source else [],
+        }
+
+    @staticmethod
+    def _group_relationships(
+        groups: dict[str, dict[tuple[str, str], dict[str, Any]]],
+        relationships: list[Relationship],
+        source: str | None = None,
+    ) -> int:
+        """
+        Añade las relaciones a `groups` agrupadas por tipo. Las aristas repetidas
+        (mismo origen, tipo y destino) se unen en una fila y sus propiedades y
+        procedencias se combinan.
+
+        Returns:
+            int: Número de filas nuevas.
+        """
+        added = 0
+        for relationship in relationships:
+            row = GraphRowBuffer._relationship_row(relationship, source)
+            if row is None:
+                continue
+            rows = groups.setdefault(row.pop("type"), {})
+            edge = (row["source_id"], row["target_id"])
+            if edge in rows:
+                rows[edge]["properties"].update(row["properties"])
+                if source and source not in rows[edge]["sources"]:
+                    rows[edge]["sources"].append(source)
+            else:
+                rows[edge] = row
+                added += 1
+        return added
+
+    @staticmethod
+    def _relationship_steps(
+        groups: dict[str, dict[tuple[str, str], dict[str, Any]]],
+    ) -> list[tuple[str, list[dict[str, Any]]]]:
+        return [
+            (Neo4JQueryManager.merge_relationships(rel_type), list(rows.values()))
+            for rel_type, rows in groups.items()
+        ]
+
+    @staticmethod
+    def _chunk_row(
+        chunk: TextChunk, document: Document, entities: list[Entity]
+    ) -> dict[str, Any]:
+        return {
+            "id": chunk.id,
+            "doc_id": document.id,
+            "text": chunk.content,
+            "embedding": chunk.embedding,
+            "start_index": chunk.start_index,
+            "end_index": chunk.end_index,
+            "document_hash": document.content_hash,
+            "entity_ids": [entity.id for entity in entities],
+        }
+
+    def buffer_document(
+        self,
+        document: Document,
+        chunks: list[TextChunk],
+        extraction_results: list[ExtractionResult],
+        prev_chunk_id: str = None,
+        complete: bool = True,
+    ) -> bool:
+        """
+        Acumula las filas de un documento.
+
+        Un documento largo puede acumularse en varias partes: `prev_chunk_id`
+        enlaza el primer fragmento de la parte con el último de la anterior, y
+        solo la última parte (`complete`) cuenta como documento cargado.
+
+        Returns:
+            bool: True si las filas acumuladas alcanzan `ETLConfig.load_batch_size`.
+        """
+        self._document_rows.append(self._document_row(document))
+        source = self.relationship_source(document)
+
+        for chunk, result in zip(chunks, extraction_results):
+            for entity in result.entities:
+                self._entity_rows[entity.id] = self._entity_row(entity)
+            self._relationship_count += self._group_relationships(
+                self._relationship_rows, result.relationships, source
+            )
+            self._chunk_rows.append(self._chunk_row(chunk, document, result.entities))
+            if prev_chunk_id is not None:
+                self._next_rows.append({"prev_id": prev_chunk_id, "id": chunk.id})
+            prev_chunk_id = chunk.id
+
+        if complete:
+            self._pending_documents.append(document)
+
+        buffered = (
+            len(self._document_rows)
+            + len(self._entity_rows)
+            + self._relationship_count
+            + len(self._chunk_rows)
+            + len(self._next_rows)
+        )
+        return buffered >= self.config.load_batch_size
+
+    def vector_index_steps(
+        self, existing: dict[str, Any] | None, recreate: bool
+    ) -> list[tuple[str, dict[str, Any]]]:
+        """
+        Decide las consultas para dejar el índice vectorial de `TextChunk` de
+        acuerdo con `EmbeddingConfig`, a partir del índice que ya existe.
+
+        Raises:
+            ValueError: Si el índice existe con otra configuración y no se pidió
+                `recreate`.
+        """
+        index_name = self.config.graph_db_config.vector_index
+        embedding_config = self.config.embedding_config
+        parameters = {
+            "dimension": embedding_config.dimension,
+            "similarity": embedding_config.similarity,
+        }
+        steps = [(Neo4JQueryManager.create_vector_index(index_name), parameters)]
+        if existing is None:
+            return steps
+
+        index_config = (existing.get("options") or {}).get("indexConfig", {})
+        current = (
+            index_config.get("vector.dimensions"),
+            str(index_config.get("vector.similarity_function", "")).lower(),
+        )
+        if existing.get("type") == "VECTOR" and current == (
+            parameters["dimension"],
+            parameters["similarity"].lower(),
+        ):
+            return []
+        if not recreate:
+            raise ValueError(
+                f"El índice {index_name} ya existe con otra configuración "
+                f"({existing.get('type')}, {current}); usa recreate=True para "
+                "reconstruirlo"
+            )
+        logger.warning(f"Reconstruyendo el índice vectorial {index_name}")
+        return [(Neo4JQueryManager.drop_index(index_name), {})] + steps
+
+    def flush_steps(self) -> list[tuple[str, list[dict[str, Any]]]]:
+        """
+        Devuelve las consultas y filas acumuladas, en el orden en que deben
+        escribirse para que cada relación encuentre sus nodos.
+        """
+        return [
+            (Neo4JQueryManager.merge_documents(), self._document_rows),
+            (Neo4JQueryManager.merge_entities(), list(self._entity_rows.values())),
+            *self._relationship_steps(self._relationship_rows),
+            (Neo4JQueryManager.merge_chunks(), self._chunk_rows),
+            (Neo4JQueryManager.merge_next_links(), self._next_rows),
+        ]
+
+    def take_pending(self) -> list[Document]:
+        """
+        Vacía los buffers tras una escritura correcta y devuelve sus documentos.
         """
+        documents = self._pending_documents
+        logger.info(
+            f"Carga masiva completada: {len(documents)} documentos, "
+            f"{len(self._chunk_rows)} chunks, {len(self._entity_rows)} entidades"
+        )
+        self._reset_buffers()
+        return documents
 
 
-class KnowledgeGraphLoader:
+class KnowledgeGraphLoader(GraphRowBuffer, GraphSink):
     """
     Clase para cargar datos en un grafo de conocimiento Neo4j.
 
@@ -57,9 +547,15 @@ class KnowledgeGraphLoader:
     fragmentos de texto en una base de datos Neo4j, facilitando la construcción
     de un grafo de conocimiento.
 
+    Además de los métodos de carga individuales, ofrece un modo de carga masiva:
+    `add_document` acumula las filas de uno o varios documentos y `flush` las
+    escribe con consultas `UNWIND $rows`, una transacción de escritura por lote
+    de `ETLConfig.load_batch_size` filas.
+
     Attributes:
         config (ETLConfig): Configuración para la conexión a la base de datos.
-        driver (neo4j.Driver): Driver para la conexión a Neo4j.
+        driver (neo4j.Driver): Driver para la conexión a Neo4j, creado en el
+            primer uso.
     """
 
     def __init__(self, config: ETLConfig):
@@ -70,10 +566,28 @@ class KnowledgeGraphLoader:
             config (ETLConfig): Configuración para la conexión a la base de datos Neo4j.
         """
         self.config = config
-        self.driver = GraphDatabase.driver(
-            config.graph_db_config.uri,
-            auth=(config.graph_db_config.user, config.graph_db_config.password),
-        )
+        self._driver = None
+        self._reset_buffers()
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            self._driver = GraphDatabase.driver(
+                self.config.graph_db_config.uri,
+                auth=(
+                    self.config.graph_db_config.user,
+                    self.config.graph_db_config.password,
+                ),
+            )
+        return self._driver
+
+    @staticmethod
+    def _run_batch(tx, query: str, rows: list[dict[str, Any]]) -> None:
+        tx.run(query, rows=rows).consume()
+
+    def _write(self, session, query: str, rows: list[dict[str, Any]]) -> None:
+        for batch in _batched(rows, self.config.load_batch_size):
+            session.execute_write(self._run_batch, query, batch)
 
     def load_document(self, document: Document) -> None:
         """
@@ -85,17 +599,12 @@ class KnowledgeGraphLoader:
         Raises:
             Exception: Sí ocurre un error durante la carga del documento.
         """
-        properties = document.dict(exclude_none=True)
-        del properties["content"]
-        if "metadata" in properties and not properties["metadata"]:
-            del properties["metadata"]
-
         try:
             with self.driver.session() as session:
-                session.run(
-                    Neo4JQueryManager.create_document(),
-                    id=document.id,
-                    properties=properties,
+                self._write(
+                    session,
+                    Neo4JQueryManager.merge_documents(),
+                    [self._document_row(document)],
                 )
             logger.info(f"Documento cargado exitosamente: {document.id}")
         except Exception as e:
@@ -104,29 +613,18 @@ class KnowledgeGraphLoader:
 
     def load_entities(self, entities: list[Entity]) -> None:
         with self.driver.session() as session:
-            for entity in entities:
-                entity_dict = entity.dict(exclude_none=True)
-                if "properties" in entity_dict:
-                    del entity_dict["properties"]
-
-                session.run(
-                    Neo4JQueryManager.create_entity(),
-                    id=entity.id,
-                    properties=entity_dict,
-                )
+            self._write(
+                session,
+                Neo4JQueryManager.merge_entities(),
+                [self._entity_row(entity) for entity in entities],
+            )
 
     def load_relationships(self, relationships: list[Relationship]) -> None:
+        groups = {}
+        self._group_relationships(groups, relationships)
         with self.driver.session() as session:
-            for rel in relationships:
-                rel = rel.dict(exclude_none=True)
-                if "properties" in rel and not rel["properties"]:
-                    del rel["properties"]
-                session.run(
-                    Neo4JQueryManager.create_relationship(),
-                    source_id=rel["source_id"],
-                    target_id=rel["target_id"],
-                    rel_type=rel["type"],
-                )
+            for query, rows in self._relationship_steps(groups):
+                self._write(session, query, rows)
 
     def load_chunk(
         self,
@@ -147,27 +645,310 @@ class KnowledgeGraphLoader:
         """
         try:
             with self.driver.session() as session:
-                chunk_data = {
-                    "id": chunk.id,
-                    "text": chunk.content,
-                    "embedding": chunk.embedding,
-                    "entity_ids": [entity.id for entity in entities],
-                    "prev_chunk_id": prev_chunk_id,
-                }
-
-                session.run(
-                    Neo4JQueryManager.create_chunks_and_relationships(),
-                    chunk=chunk_data,
-                    doc_id=document.id,
+                self._write(
+                    session,
+                    Neo4JQueryManager.merge_chunks(),
+                    [self._chunk_row(chunk, document, entities)],
                 )
+                if prev_chunk_id is not None:
+                    self._write(
+                        session,
+                        Neo4JQueryManager.merge_next_links(),
+                        [{"prev_id": prev_chunk_id, "id": chunk.id}],
+                    )
 
             logger.info(f"Cargado chunk {chunk.id} fragmentos exitosamente")
         except Exception as e:
             logger.error(f"Error al cargar fragmentos: {str(e)}")
             raise
 
+    def add_document(
+        self,
+        document: Document,
+        chunks: list[TextChunk],
+        extraction_results: list[ExtractionResult],
+        prev_chunk_id: str = None,
+        complete: bool = True,
+    ) -> list[Document]:
+        """
+        Acumula un documento, sus fragmentos y sus resultados de extracción para
+        la carga masiva.
+
+        Cuando el número de filas acumuladas alcanza `ETLConfig.load_batch_size`
+        se ejecuta `flush` automáticamente.
+
+        Args:
+            document (Document): El documento a cargar.
+            chunks (list[TextChunk]): Los fragmentos del documento, en orden.
+            extraction_results (list[ExtractionResult]): Un resultado por fragmento.
+            prev_chunk_id (str, optional): El ID del fragmento previo, si el
+                documento se carga en varias partes.
+            complete (bool): False si quedan partes del documento por cargar.
+
+        Returns:
+            list[Document]: Los documentos completos escritos si hubo `flush`, si
+            no una lista vacía.
+        """
+        if self.buffer_document(
+            document, chunks, extraction_results, prev_chunk_id, complete
+        ):
+            return self.flush()
+        return []
+
+    def flush(self) -> list[Document]:
+        """
+        Escribe en Neo4j todas las filas acumuladas por `add_document`.
+
+        Los nodos se escriben antes que las relaciones que los referencian:
+        documentos, entidades, relaciones entre entidades, fragmentos y por
+        último los enlaces NEXT entre fragmentos.
+
+        Returns:
+            list[Document]: Los documentos escritos.
+
+        Raises:
+            Exception: Sí ocurre un error durante la escritura de algún lote.
+        """
+        if not self._document_rows:
+            return []
+
+        try:
+            with self.driver.session() as session:
+                for query, rows in self.flush_steps():
+                    self._write(session, query, rows)
+        except Exception as e:
+            logger.error(f"Error en la carga masiva: {str(e)}")
+            raise
+        return self.take_pending()
+
+    def ensure_schema(self, recreate_vector_index: bool = False) -> None:
+        """
+        Crea, si no existen, las restricciones de unicidad sobre `id` de
+        `Document`, `TextChunk` y `Entity` y sobre la clave natural `Entity.key`
+        de `EntityResolver`, el índice de `Entity(name, type)` y el índice
+        vectorial de los fragmentos. Es idempotente y se ejecuta antes de
+        cargar.
+
+        Args:
+            recreate_vector_index (bool): Ver `ensure_vector_index`.
+
+        Raises:
+            Exception: Si no se puede crear alguna restricción, por ejemplo
+                porque ya hay nodos con el mismo id.
+        """
+        try:
+            for query in Neo4JQueryManager.create_schema():
+                self.driver.execute_query(query)
+        except Exception as e:
+            logger.error(f"Error al crear el esquema del grafo: {str(e)}")
+            raise
+        self.ensure_vector_index(recreate=recreate_vector_index)
+
+    def describe_schema(self) -> dict[str, list[dict[str, Any]]]:
+        """
+        Devuelve las restricciones y los índices existentes en la base de datos.
+
+        Returns:
+            dict[str, list[dict[str, Any]]]: Claves `constraints` e `indexes`.
+        """
+        constraints, _, _ = self.driver.execute_query(
+            Neo4JQueryManager.show_constraints()
+        )
+        indexes, _, _ = self.driver.execute_query(Neo4JQueryManager.show_indexes())
+        return {
+            "constraints": [record.data() for record in constraints],
+            "indexes": [record.data() for record in indexes],
+        }
+
+    def ensure_vector_index(self, recreate: bool = False) -> None:
+        """
+        Crea, si no existe, el índice vectorial de `TextChunk.embedding` con la
+        dimensión y la función de similitud de `EmbeddingConfig`.
+
+        Args:
+            recreate (bool): Reconstruye el índice si existe con otra
+                configuración, en lugar de lanzar un error.
+
+        Raises:
+            ValueError: Si el índice existe con otra configuración.
+        """
+        index_name = self.config.graph_db_config.vector_index
+        records, _, _ = self.driver.execute_query(
+            Neo4JQueryManager.show_index(), index_name=index_name
+        )
+        existing = records[0].data() if records else None
+        for query, parameters in self.vector_index_steps(existing, recreate):
+            self.driver.execute_query(query, parameters)
+        logger.info(f"Índice vectorial {index_name} listo")
+
+    @staticmethod
+    def _delete_chunks(tx, rows: list[dict[str, Any]]) -> None:
+        tx.run(Neo4JQueryManager.remove_relationship_sources(), rows=rows).consume()
+        tx.run(Neo4JQueryManager.delete_document_chunks(), rows=rows).consume()
+
+    def delete_document_chunks(self, doc_ids: list[str]) -> None:
+        """
+        Elimina los fragmentos de los documentos dados, sus relaciones CONTAINS y
+        NEXT, las relaciones entre entidades que solo aportaban esos documentos
+        y las entidades que dejan de estar contenidas en algún fragmento.
+
+        Args:
+            doc_ids (list[str]): IDs de los documentos.
+        """
+        rows = [
+            {"doc_id": doc_id, "keep": None, "document_hash": None}
+            for doc_id in doc_ids
+        ]
+        with self.driver.session() as session:
+            session.execute_write(self._delete_chunks, rows)
+        logger.info(f"Eliminados los chunks de {len(doc_ids)} documentos")
+
+    def delete_stale_chunks(self, documents: list[Document]) -> None:
+        """
+        Elimina los fragmentos de versiones anteriores de los documentos dados,
+        que ya se cargaron con su contenido actual, y las relaciones entre
+        entidades que solo aportaban esas versiones. Ver
+        `GraphSink.delete_stale_chunks`.
+
+        Args:
+            documents (list[Document]): Documentos cargados de nuevo.
+        """
+        rows = [
+            {
+                "doc_id": document.id,
+                "keep": self.relationship_source(document),
+                "document_hash": document.content_hash,
+            }
+            for document in documents
+        ]
+        with self.driver.session() as session:
+            session.execute_write(self._delete_chunks, rows)
+        logger.info(f"Eliminadas versiones anteriores de {len(documents)} documentos")
+
+    def delete_documents(self, doc_ids: list[str]) -> None:
+        """
+        Elimina los documentos dados junto con sus fragmentos y las entidades que
+        quedan huérfanas.
+
+        Args:
+            doc_ids (list[str]): IDs de los documentos.
+        """
+        self.delete_document_chunks(doc_ids)
+        with self.driver.session() as session:
+            session.execute_write(
+                lambda tx: tx.run(
+                    Neo4JQueryManager.delete_documents(), doc_ids=doc_ids
+                ).consume()
+            )
+        logger.info(f"Eliminados {len(doc_ids)} documentos")
+
     def close(self):
+        """
+        Cierra la conexión con la base de datos Neo4j, si se llegó a abrir.
+        """
+        if self._driver is not None:
+            self._driver.close()
+            self._driver = None
+
+
+class AsyncKnowledgeGraphLoader(GraphRowBuffer):
+    """
+    Variante asíncrona de la carga masiva de `KnowledgeGraphLoader`, basada en
+    `neo4j.AsyncGraphDatabase`.
+
+    Attributes:
+        config (ETLConfig): Configuración para la conexión a la base de datos.
+        driver (neo4j.AsyncDriver): Driver asíncrono para la conexión a Neo4j.
+    """
+
+    def __init__(self, config: ETLConfig):
+        self.config = config
+        self.driver = AsyncGraphDatabase.driver(
+            config.graph_db_config.uri,
+            auth=(config.graph_db_config.user, config.graph_db_config.password),
+        )
+        self._reset_buffers()
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    async def _run_batch(tx, query: str, rows: list[dict[str, Any]]) -> None:
+        result = await tx.run(query, rows=rows)
+        await result.consume()
+
+    async def ensure_schema(self, recreate_vector_index: bool = False) -> None:
+        """
+        Versión asíncrona de `KnowledgeGraphLoader.ensure_schema`.
+        """
+        try:
+            for query in Neo4JQueryManager.create_schema():
+                await self.driver.execute_query(query)
+        except Exception as e:
+            logger.error(f"Error al crear el esquema del grafo: {str(e)}")
+            raise
+        await self.ensure_vector_index(recreate=recreate_vector_index)
+
+    async def ensure_vector_index(self, recreate: bool = False) -> None:
+        """
+        Versión asíncrona de `KnowledgeGraphLoader.ensure_vector_index`.
+        """
+        index_name = self.config.graph_db_config.vector_index
+        records, _, _ = await self.driver.execute_query(
+            Neo4JQueryManager.show_index(), index_name=index_name
+        )
+        existing = records[0].data() if records else None
+        for query, parameters in self.vector_index_steps(existing, recreate):
+            await self.driver.execute_query(query, parameters)
+        logger.info(f"Índice vectorial {index_name} listo")
+
+    async def add_document(
+        self,
+        document: Document,
+        chunks: list[TextChunk],
+        extraction_results: list[ExtractionResult],
+        prev_chunk_id: str = None,
+        complete: bool = True,
+    ) -> list[Document]:
+        """
+        Acumula un documento para la carga masiva y escribe los buffers cuando
+        alcanzan `ETLConfig.load_batch_size` filas.
+
+        Returns:
+            list[Document]: Los documentos completos escritos si hubo `flush`, si
+            no una lista vacía.
+        """
+        async with self._lock:
+            if self.buffer_document(
+                document, chunks, extraction_results, prev_chunk_id, complete
+            ):
+                return await self._flush()
+            return []
+
+    async def flush(self) -> list[Document]:
+        """
+        Escribe en Neo4j todas las filas acumuladas por `add_document`.
+
+        Returns:
+            list[Document]: Los documentos escritos.
+        """
+        async with self._lock:
+            return await self._flush()
+
+    async def _flush(self) -> list[Document]:
+        if not self._document_rows:
+            return []
+
+        try:
+            async with self.driver.session() as session:
+                for query, rows in self.flush_steps():
+                    for batch in _batched(rows, self.config.load_batch_size):
+                        await session.execute_write(self._run_batch, query, batch)
+        except Exception as e:
+            logger.error(f"Error en la carga masiva: {str(e)}")
+            raise
+        return self.take_pending()
+
+    async def close(self) -> None:
         """
         Cierra la conexión con la base de datos Neo4j.
         """
-        self.driver.close()
+        await self.driver.close()
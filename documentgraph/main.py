@@ -1,4 +1,11 @@
+import json
 import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+
+from documentgraph.columnar import ChunkBatch
+from documentgraph.dedup import ChunkDeduplicator, ChunkDuplicates
 from documentgraph.extraction import DocumentExtractor
 from documentgraph.models import Document, TextChunk, ExtractionResult
 from documentgraph.transformation import (
@@ -6,42 +13,496 @@ from documentgraph.transformation import (
     EmbeddingGenerator,
     EntityRelationExtractor,
 )
-from documentgraph.loading import KnowledgeGraphLoader
+from documentgraph.journal import RunJournal
+from documentgraph.manifest import Manifest
+from documentgraph.metrics import MetricsRegistry, record_client_metrics
+from documentgraph.resolution import EntityResolver
+from documentgraph.scheduler import PipelineScheduler
+from documentgraph.loading import GraphSink
+from documentgraph.sinks import create_sink
 from documentgraph.config import ETLConfig
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class DocumentPart:
+    """
+    Chunks de un documento que avanzan juntos por las etapas del pipeline.
+    """
+
+    document: Document
+    chunks: list[TextChunk]
+    prev_chunk_id: str | None = None
+    complete: bool = True
+    index: int = 0
+    extraction_results: list[ExtractionResult] | None = None
+    duplicates: ChunkDuplicates | None = None
+
+
+@dataclass
+class DocumentProgress:
+    """
+    Partes de un documento que llegaron a la etapa de carga. Con varios hilos
+    las partes pueden llegar en cualquier orden, así que el documento solo
+    está completo cuando han llegado todas.
+    """
+
+    loaded: int = 0
+    total: int | None = None  # Se conoce cuando llega la última parte
+    failed: bool = False  # Alguna parte falló y no llegará a la carga
+
+
 class DocumentAnalysisPipeline:
-    def __init__(self, etl_config: ETLConfig):
+    def __init__(self, etl_config: ETLConfig, graph_loader: GraphSink | None = None):
+        """
+        Args:
+            etl_config (ETLConfig): Configuración del pipeline.
+            graph_loader (GraphSink, optional): Destino de la carga. Por defecto
+                se crea con `create_sink` y el pipeline lo cierra al terminar
+                cada ejecución; uno recibido aquí lo cierra quien lo creó.
+        """
         self.config = etl_config
         self.extractor = DocumentExtractor(etl_config)
-        self.preprocessor = TextProcessor(etl_config)
         self.embedding_generator = EmbeddingGenerator(etl_config)
+        self.preprocessor = TextProcessor(etl_config, self.embedding_generator)
         self.entity_relation_extractor = EntityRelationExtractor(etl_config)
-        self.graph_loader = KnowledgeGraphLoader(etl_config)
+        self.entity_resolver = (
+            EntityResolver(etl_config) if etl_config.resolution_config.enabled else None
+        )
+        self.deduplicator = (
+            ChunkDeduplicator(etl_config, self.entity_relation_extractor.prompt_hash)
+            if etl_config.dedup_config.enabled
+            else None
+        )
+        self.owns_graph_loader = graph_loader is None
+        self.graph_loader = (
+            create_sink(etl_config) if graph_loader is None else graph_loader
+        )
+        self.manifest = (
+            Manifest(etl_config.manifest_path) if etl_config.incremental else None
+        )
+        self.journal = (
+            RunJournal(
+                etl_config.journal_path, max_attempts=etl_config.max_document_attempts
+            )
+            if etl_config.journal_path
+            else None
+        )
+        self.seen_paths: set[str] = set()
+        # Changed documents whose previous version is deleted once they load
+        self.replaced_paths: set[str] = set()
+        self.loaded_documents: list[Document] = []
+        self.progress: dict[str, DocumentProgress] = {}
+        self._progress_lock = threading.Lock()
+        self.metrics = MetricsRegistry()
+        self.metrics_server = None
+        self.last_report: dict | None = None
 
-    def execute_pipeline(self, input_folder: str) -> None:
+    def execute_pipeline(self, input_folder: str, resume: bool = True) -> dict:
         """
         Ejecuta el pipeline ETL completo para análisis de documentos.
+
+        En modo incremental (`ETLConfig.incremental`) se omiten los documentos
+        cuyo contenido no cambió desde la última carga, se reemplazan los
+        fragmentos de los que cambiaron y se eliminan del grafo los documentos
+        que ya no existen en la carpeta. Los datos de la versión anterior de un
+        documento solo se eliminan cuando la nueva queda cargada, así que si
+        esta falla el grafo conserva la anterior.
+
+        Con diario (`ETLConfig.journal_path`) la ejecución se puede reanudar: se
+        omiten los documentos ya cargados, se reutilizan los chunks, embeddings
+        y extracciones guardados, y un documento que falla se registra como
+        fallido sin detener al resto, para reintentarlo en la siguiente
+        ejecución. Con `resume=False` se vacía el diario antes de empezar.
+
+        Returns:
+            dict: Informe de la ejecución de `MetricsRegistry.report`, con la
+            latencia y el rendimiento de cada etapa, los tokens y reintentos de
+            las llamadas a OpenAI y la tasa de aciertos de las cachés.
         """
         logger.info("Iniciando pipeline de análisis de documentos")
+        self.seen_paths = set()
+        self.replaced_paths = set()
+        self.metrics.reset()
+        if self.journal is not None and not resume:
+            self.journal.clear()
         try:
-            for document in self.extract_documents(input_folder):
-                logger.info(f"Extrayendo documento: {document.filename}")
-                preprocessed_document = self.preprocess_documents(document)
-                text_chunks = self.chunk_documents(preprocessed_document)
-                embedded_chunks = self.generate_embeddings(text_chunks)
-                extraction_results = self.extract_entities_and_relationships(
-                    embedded_chunks
+            self.serve_metrics()
+            self.graph_loader.ensure_schema()
+            self.process_documents(self.pending_documents(input_folder))
+            if self.manifest is not None:
+                self.remove_stale_documents(input_folder)
+            if self.journal is not None and (failed := self.journal.failed_documents()):
+                logger.warning(
+                    f"{len(failed)} documentos fallidos; se reintentarán en la "
+                    "próxima ejecución"
                 )
-                self.load_knowledge_graph(extraction_results, embedded_chunks, document)
-
             logger.info("Pipeline de análisis de documentos completado con éxito")
         except Exception as e:
             logger.error(f"Error en el pipeline de análisis: {str(e)}", exc_info=True)
             raise
+        finally:
+            self.close()
+            self.last_report = self.finish_metrics()
+        return self.last_report
+
+    def serve_metrics(self) -> None:
+        """
+        Expone las métricas en `MetricsConfig.port`, si está configurado, hasta
+        que se llama a `close`.
+        """
+        metrics_config = self.config.metrics_config
+        if metrics_config.port is not None and self.metrics_server is None:
+            self.metrics_server = self.metrics.serve(
+                metrics_config.port, metrics_config.host
+            )
+
+    def close(self) -> None:
+        """
+        Detiene el pool de chunking y el servidor de métricas, y cierra el
+        destino de la carga si lo creó el pipeline.
+        """
+        self.preprocessor.close()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+            self.metrics_server = None
+        if self.owns_graph_loader:
+            self.graph_loader.close()
+
+    def finish_metrics(self) -> dict:
+        """
+        Completa las métricas de la ejecución con los contadores de los clientes
+        de OpenAI y de las cachés, registra el informe y, si está configurado,
+        escribe el fichero de Prometheus.
+        """
+        self.metrics.finish()
+        record_client_metrics(
+            self.metrics,
+            "embedding",
+            self.embedding_generator.rate_limiter,
+            self.embedding_generator.cache,
+        )
+        record_client_metrics(
+            self.metrics,
+            "llm",
+            self.entity_relation_extractor.rate_limiter,
+            self.entity_relation_extractor.cache,
+        )
+        if self.entity_resolver is not None and self.entity_resolver.index is not None:
+            self.metrics.gauge(
+                "entity_index_hit_rate", self.entity_resolver.index.hit_rate
+            )
+        report = self.metrics.report()
+        logger.info(f"Informe de la ejecución: {json.dumps(report)}")
+        if self.config.metrics_config.prometheus_path:
+            self.metrics.write_prometheus(self.config.metrics_config.prometheus_path)
+        return report
+
+    def pending_documents(self, input_folder: str) -> Iterator[Document]:
+        """
+        Extrae los documentos de la carpeta, omitiendo en modo incremental los
+        que no cambiaron.
+        """
+        for document in self.metrics.timed_iter(
+            "extract", self.extract_documents(input_folder)
+        ):
+            self.metrics.inc("documents_total")
+            logger.info(f"Extrayendo documento: {document.filename}")
+            if self.manifest is not None and self.skip_unchanged(document):
+                continue
+            if self.journal is not None and not self.journal.begin(document):
+                continue
+            yield document
+
+    def process_documents(self, documents: Iterable[Document]) -> list[Document]:
+        """
+        Procesa los documentos, en paralelo si `ETLConfig.n_jobs` es mayor que
+        uno, y escribe en el grafo todo lo que quede acumulado.
+
+        Returns:
+            list[Document]: Los documentos cargados completos en el grafo; los
+            que fallaron en alguna etapa no se incluyen.
+        """
+        self.loaded_documents = []
+        self.progress = {}
+        if self.config.n_jobs > 1:
+            self.process_documents_concurrently(documents)
+        else:
+            for document in documents:
+                self.process_document(document)
+        with self.metrics.timer("flush"):
+            self.record_loaded(self.graph_loader.flush())
+        return self.loaded_documents
+
+    def process_document(self, document: Document) -> None:
+        """
+        Ejecuta todas las etapas del pipeline para un documento.
+        """
+        for part in self.iter_parts(document):
+            part = self.run_stage("embed", self.embed_part, part)
+            if part is not None:
+                part = self.run_stage("extract", self.extract_part, part)
+            if part is None:
+                return
+            self.load_part(part)
+
+    def iter_parts(self, document: Document) -> Iterator[DocumentPart]:
+        try:
+            yield from self.metrics.timed_iter(
+                "chunk",
+                self.split_document(self.preprocess_documents(document)),
+                items=lambda part: len(part.chunks),
+            )
+        except Exception as e:
+            if self.journal is None:
+                raise
+            self.record_failure(document, "chunk", e)
+
+    def run_stage(
+        self, stage: str, func: Callable[[DocumentPart], DocumentPart], part
+    ) -> DocumentPart | None:
+        """
+        Ejecuta una etapa sobre una parte. Con diario, un error marca el
+        documento como fallido y descarta la parte en lugar de detener el
+        pipeline.
+        """
+        try:
+            return func(part)
+        except Exception as e:
+            if self.journal is None:
+                raise
+            self.record_failure(part.document, stage, e)
+            return None
+
+    def record_failure(self, document: Document, stage: str, error: Exception) -> None:
+        self.metrics.inc("failed_parts_total")
+        logger.error(
+            f"Error en la etapa {stage} del documento {document.filename}: "
+            f"{str(error)}"
+        )
+        with self._progress_lock:
+            self.progress.setdefault(document.id, DocumentProgress()).failed = True
+        self.journal.fail(document, stage, error)
+
+    def embed_part(self, part: DocumentPart) -> DocumentPart:
+        stored = (
+            self.journal.load_chunks(part.document, part.index)
+            if self.journal is not None
+            else None
+        )
+        if stored is not None:
+            part.chunks = stored
+            return part
+        if self.deduplicator is None:
+            part.chunks = self.generate_embeddings(part.chunks)
+        else:
+            duplicates = self.find_duplicates(part)
+            unique = duplicates.select(part.chunks)
+            if unique:
+                self.generate_embeddings(unique)
+            duplicates.fill_embeddings(part.chunks)
+            part.chunks = ChunkBatch.from_chunks(part.chunks).to_chunks()
+        if self.journal is not None:
+            self.journal.save_chunks(part.document, part.index, part.chunks)
+        return part
+
+    def extract_part(self, part: DocumentPart) -> DocumentPart:
+        stored = (
+            self.journal.load_results(part.document, part.index)
+            if self.journal is not None
+            else None
+        )
+        if stored is not None:
+            part.extraction_results = stored
+            return part
+        if self.deduplicator is None:
+            results = self.extract_entities_and_relationships(part.chunks)
+        else:
+            duplicates = self.find_duplicates(part)
+            results = duplicates.expand_results(
+                self.extract_entities_and_relationships(duplicates.select(part.chunks))
+            )
+            self.deduplicator.add(part.chunks, duplicates, results)
+        part.extraction_results = self.resolve_entities(results)
+        # Failed chunks are extracted again if the part has to be resumed
+        if self.journal is not None and not any(
+            result.error for result in part.extraction_results
+        ):
+            self.journal.save_results(
+                part.document, part.index, part.extraction_results
+            )
+        return part
+
+    def find_duplicates(self, part: DocumentPart) -> ChunkDuplicates:
+        """
+        Busca los chunks duplicados de la parte, una sola vez por parte. Sus
+        embeddings y extracciones se copian de su chunk canónico en lugar de
+        pedirse a OpenAI.
+        """
+        if part.duplicates is None:
+            with self.metrics.timer("dedup", items=len(part.chunks)):
+                part.duplicates = self.deduplicator.find(part.chunks)
+            self.metrics.inc("duplicate_chunks_total", len(part.duplicates))
+        return part.duplicates
+
+    def split_document(self, document: Document) -> Iterator[DocumentPart]:
+        """
+        Divide el documento en chunks. Un documento normal forma una única parte;
+        uno `streamed` se trocea mientras se lee del fichero y se entrega en
+        partes de `SourceConfig.stream_batch_chunks` chunks, para que su tamaño
+        en memoria no dependa del tamaño del fichero. Solo la última parte se
+        marca `complete`; `track_part` cuenta el documento como cargado cuando
+        han llegado a la carga todas sus partes.
+        """
+        if not document.streamed:
+            yield DocumentPart(document, self.chunk_documents(document))
+            return
+
+        logger.info(f"Dividiendo por ventanas el documento: {document.filename}")
+        batch_size = self.config.source_config.stream_batch_chunks
+        part = DocumentPart(document, [], complete=False)
+        for chunk in self.preprocessor.iter_chunks(document):
+            if len(part.chunks) == batch_size:
+                yield part
+                part = DocumentPart(
+                    document,
+                    [],
+                    prev_chunk_id=part.chunks[-1].id,
+                    complete=False,
+                    index=part.index + 1,
+                )
+            part.chunks.append(chunk)
+        part.complete = True
+        yield part
+
+    def load_part(self, part: DocumentPart) -> None:
+        self.load_knowledge_graph(
+            part.extraction_results,
+            part.chunks,
+            part.document,
+            prev_chunk_id=part.prev_chunk_id,
+            complete=self.track_part(part),
+        )
+
+    def track_part(self, part: DocumentPart) -> bool:
+        """
+        Registra que la parte llegó a la carga.
+
+        Returns:
+            bool: True si con ella han llegado todas las partes del documento, en
+            cualquier orden, y ninguna falló; solo entonces el destino lo cuenta
+            como cargado.
+        """
+        with self._progress_lock:
+            progress = self.progress.setdefault(part.document.id, DocumentProgress())
+            progress.loaded += 1
+            if part.complete:
+                progress.total = part.index + 1
+            if progress.failed or progress.loaded != progress.total:
+                return False
+            del self.progress[part.document.id]
+            return True
+
+    def has_failed(self, document: Document) -> bool:
+        with self._progress_lock:
+            progress = self.progress.get(document.id)
+            return progress is not None and progress.failed
+
+    def process_documents_concurrently(self, documents: Iterable[Document]) -> None:
+        """
+        Procesa varios documentos a la vez con un `PipelineScheduler`: chunking,
+        embeddings y extracción usan `ETLConfig.n_jobs` hilos cada una, de modo
+        que las llamadas de red de un documento se solapan con la carga de otro.
+        """
+
+        def embed(part: DocumentPart) -> DocumentPart | None:
+            return self.run_stage("embed", self.embed_part, part)
+
+        def extract(part: DocumentPart) -> DocumentPart | None:
+            return self.run_stage("extract", self.extract_part, part)
+
+        n_jobs = self.config.n_jobs
+        scheduler = PipelineScheduler(
+            [
+                ("chunk", self.iter_parts, n_jobs),
+                ("embed", embed, n_jobs),
+                ("extract", extract, n_jobs),
+                # The loader buffers rows across documents, so writes stay on a
+                # single thread and are batched by load_batch_size
+                ("load", self.load_part, 1),
+            ],
+            queue_size=self.config.queue_size,
+        )
+        scheduler.run(documents)
+
+    def skip_unchanged(self, document: Document) -> bool:
+        """
+        Indica si el documento no cambió desde la última carga. Si cambió, sus
+        fragmentos anteriores se eliminan cuando la nueva versión quede cargada
+        (ver `record_loaded`).
+        """
+        self.seen_paths.add(document.path)
+        if self.manifest.is_unchanged(document):
+            logger.info(f"Documento sin cambios, se omite: {document.filename}")
+            return True
+
+        if self.manifest.get(document.path) is not None:
+            logger.info(f"Documento modificado: {document.filename}")
+            self.replaced_paths.add(document.path)
+        return False
+
+    def record_loaded(self, documents: list[Document]) -> None:
+        """
+        Registra en el diario y en el manifiesto los documentos ya escritos en
+        el grafo con todas sus partes. Los que fallaron en alguna parte no se
+        registran: siguen fallidos en el diario y, sin entrada en el manifiesto,
+        se procesan de nuevo en la siguiente ejecución.
+
+        De los documentos que reemplazan a una versión anterior se eliminan
+        antes los fragmentos y las relaciones que solo aportaba esa versión.
+        """
+        documents = [
+            document for document in documents if not self.has_failed(document)
+        ]
+        replaced = [
+            document for document in documents if document.path in self.replaced_paths
+        ]
+        if replaced:
+            with self.metrics.timer("delete", items=len(replaced)):
+                self.graph_loader.delete_stale_chunks(replaced)
+            self.replaced_paths.difference_update(
+                document.path for document in replaced
+            )
+        if self.journal is not None and documents:
+            documents = self.journal.complete(documents)
+        self.loaded_documents.extend(documents)
+        if self.manifest is None or not documents:
+            return
+        for document in documents:
+            self.manifest.record(document)
+        self.manifest.save()
+
+    def remove_stale_documents(self, input_folder: str) -> None:
+        """
+        Elimina del grafo y del manifiesto los documentos registrados bajo la
+        carpeta de entrada que ya no existen.
+        """
+        root = self.extractor.resolve_input(input_folder)
+        stale_paths = self.manifest.stale_paths(root, self.seen_paths)
+        if not stale_paths:
+            return
+
+        logger.info(f"Eliminando {len(stale_paths)} documentos borrados")
+        with self.metrics.timer("delete", items=len(stale_paths)):
+            self.graph_loader.delete_documents(
+                [self.manifest.get(path)["id"] for path in stale_paths]
+            )
+        for path in stale_paths:
+            self.manifest.remove(path)
+        self.manifest.save()
 
     def extract_documents(self, input_folder: str) -> Document:
         """
@@ -69,12 +530,15 @@ class DocumentAnalysisPipeline:
         Genera embeddings para los chunks de texto.
         """
         logger.info("Generando embeddings para los chunks")
-        return [
-            chunk.model_copy(
-                update={"embedding": self.embedding_generator.generate(chunk)}
-            )
-            for chunk in text_chunks
-        ]
+        # Semantic chunking may already have pooled the chunk embeddings
+        missing = [chunk for chunk in text_chunks if chunk.embedding is None]
+        if missing:
+            with self.metrics.timer("embed", items=len(missing)):
+                embeddings = self.embedding_generator.generate_batch(missing)
+            for chunk, embedding in zip(missing, embeddings):
+                chunk.embedding = embedding
+        # Keep the vectors in one float32 array instead of lists of Python floats
+        return ChunkBatch.from_chunks(text_chunks).to_chunks()
 
     def extract_entities_and_relationships(
         self, embedded_chunks: list[TextChunk]
@@ -83,40 +547,56 @@ class DocumentAnalysisPipeline:
         Extrae entidades y relaciones de los chunks con embeddings.
         """
         logger.info("Extrayendo entidades y relaciones")
-        return self.entity_relation_extractor.extract(embedded_chunks)
+        with self.metrics.timer("llm", items=len(embedded_chunks)):
+            results = self.entity_relation_extractor.extract(embedded_chunks)
+        self.count_extraction_errors(results)
+        return results
+
+    def count_extraction_errors(self, results: list[ExtractionResult]) -> None:
+        """
+        Cuenta en las métricas los chunks cuya extracción falló.
+        """
+        errors = sum(1 for result in results if result.error is not None)
+        if errors:
+            self.metrics.inc("extraction_errors_total", errors)
+
+    def resolve_entities(
+        self, extraction_results: list[ExtractionResult]
+    ) -> list[ExtractionResult]:
+        """
+        Une las entidades repetidas entre chunks y documentos y les asigna ids
+        estables.
+        """
+        if self.entity_resolver is None:
+            return extraction_results
+        logger.info("Resolviendo entidades")
+        with self.metrics.timer("resolve", items=len(extraction_results)):
+            return self.entity_resolver.resolve(extraction_results)
 
     def load_knowledge_graph(
         self,
         extraction_results: list[ExtractionResult],
         embedded_chunks: list[TextChunk],
         document: Document,
+        prev_chunk_id: str = None,
+        complete: bool = True,
     ) -> None:
         """
         Carga los datos extraídos en el grafo de conocimiento.
         """
         logger.info("Cargando datos en el grafo de conocimiento")
         try:
-            # Load document first
-            self.graph_loader.load_document(document)
-
-            prev_chunk_id = None
-            for chunk, result in zip(embedded_chunks, extraction_results):
-                # Load entities for this chunk
-                self.graph_loader.load_entities(result.entities)
-
-                # Load relationships for this chunk
-                self.graph_loader.load_relationships(result.relationships)
-
-                # Load the chunk with its entities and maintain NEXT relationship
-                self.graph_loader.load_chunk(
-                    chunk, document, result.entities, prev_chunk_id
+            # Rows are buffered and written in UNWIND batches; the remainder is
+            # flushed at the end of execute_pipeline
+            with self.metrics.timer("load", items=len(embedded_chunks)):
+                loaded = self.graph_loader.add_document(
+                    document,
+                    embedded_chunks,
+                    extraction_results,
+                    prev_chunk_id=prev_chunk_id,
+                    complete=complete,
                 )
-
-                # Update prev_chunk_id for the next iteration
-                prev_chunk_id = chunk.id
-
-            logger.info("Datos cargados exitosamente en el grafo de conocimiento")
+            self.record_loaded(loaded)
         except Exception as e:
             logger.error(f"Error al cargar datos en el grafo: {str(e)}", exc_info=True)
-        finally:
-            self.graph_loader.close()
+            raise
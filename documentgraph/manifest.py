@@ -0,0 +1,66 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+from documentgraph.models import Document
+
+logger = logging.getLogger(__name__)
+
+
+class Manifest:
+    """
+    Registro local de los documentos cargados en el grafo, usado por el modo
+    incremental del pipeline.
+
+    Cada entrada, indexada por la ruta absoluta del fichero, guarda el id del
+    documento y el hash de su contenido en el momento de la carga.
+
+    Attributes:
+        path (Path): Ruta del fichero JSON del manifiesto.
+        entries (dict[str, dict]): Entradas por ruta de fichero.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as file:
+                self.entries: dict[str, dict] = json.load(file)
+        else:
+            self.entries = {}
+
+    def get(self, path: str) -> dict | None:
+        return self.entries.get(path)
+
+    def is_unchanged(self, document: Document) -> bool:
+        entry = self.entries.get(document.path)
+        return entry is not None and entry["content_hash"] == document.content_hash
+
+    def record(self, document: Document) -> None:
+        self.entries[document.path] = {
+            "id": document.id,
+            "content_hash": document.content_hash,
+        }
+
+    def remove(self, path: str) -> None:
+        self.entries.pop(path, None)
+
+    def stale_paths(self, root: Path, seen: set[str]) -> list[str]:
+        """
+        Devuelve las rutas registradas bajo `root` que ya no se encontraron.
+        """
+        return [
+            path
+            for path in self.entries
+            if path not in seen and Path(path).is_relative_to(root)
+        ]
+
+    def save(self) -> None:
+        """
+        Escribe el manifiesto de forma atómica (fichero temporal y `os.replace`).
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as file:
+            json.dump(self.entries, file, indent=2)
+        os.replace(tmp_path, self.path)
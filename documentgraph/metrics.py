@@ -0,0 +1,278 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from a cached lookup to a slow LLM batch
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+
+class Histogram:
+    """
+    Histograma de latencias con cubos fijos, como los de Prometheus. Guarda el
+    número de observaciones por cubo en lugar de las muestras, así que su
+    tamaño no depende de la duración de la ejecución.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estima el cuantil `q` interpolando dentro del cubo que lo contiene.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+class MetricsRegistry:
+    """
+    Métricas de una ejecución del pipeline, seguras entre hilos.
+
+    Cada etapa (`extract`, `chunk`, `embed`, `llm`, `load`, `flush`...) tiene
+    un histograma de latencias por llamada, el tiempo total ocupado y los
+    elementos procesados; además hay contadores libres y valores instantáneos
+    (`gauge`) como los tokens consumidos o la tasa de aciertos de las cachés.
+    `report` los resume en un diccionario y `to_prometheus` los exporta en el
+    formato de texto de Prometheus.
+
+    Attributes:
+        namespace (str): Prefijo de los nombres de las métricas de Prometheus.
+    """
+
+    def __init__(self, namespace: str = "documentgraph"):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._histograms: dict[str, Histogram] = {}
+        self._items: dict[str, int] = {}
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, float] = {}
+        self._started = time.monotonic()
+        self._finished = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._items.clear()
+            self._counters.clear()
+            self._gauges.clear()
+            self._started = time.monotonic()
+            self._finished = None
+
+    def finish(self) -> None:
+        """
+        Fija el final de la ejecución para calcular el rendimiento global.
+        """
+        self._finished = time.monotonic()
+
+    def observe(self, stage: str, seconds: float, items: int = 1) -> None:
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+            self._items[stage] = self._items.get(stage, 0) + items
+
+    @contextmanager
+    def timer(self, stage: str, items: int = 1) -> Iterator[None]:
+        """
+        Mide la duración del bloque como una llamada de la etapa que procesa
+        `items` elementos. Las llamadas que fallan también cuentan.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, items)
+
+    def timed_iter(self, stage: str, iterable: Iterable, items=None) -> Iterator:
+        """
+        Recorre `iterable` midiendo el tiempo de obtener cada elemento. `items`
+        devuelve cuántos elementos cuenta cada uno; por defecto, uno.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(
+                stage,
+                time.perf_counter() - start,
+                1 if items is None else items(item),
+            )
+            yield item
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def report(self) -> dict[str, Any]:
+        """
+        Resume la ejecución: duración total y, por etapa, llamadas, elementos,
+        tiempo ocupado, latencias (media, p50, p95, p99, máxima) y elementos por
+        segundo, tanto por segundo ocupado de la etapa como por segundo de la
+        ejecución completa.
+        """
+        with self._lock:
+            elapsed = (self._finished or time.monotonic()) - self._started
+            stages = {}
+            for stage, histogram in self._histograms.items():
+                items = self._items[stage]
+                stages[stage] = {
+                    "calls": histogram.count,
+                    "items": items,
+                    "busy_seconds": round(histogram.sum, 6),
+                    "mean_seconds": round(histogram.sum / histogram.count, 6),
+                    "p50_seconds": round(histogram.quantile(0.5), 6),
+                    "p95_seconds": round(histogram.quantile(0.95), 6),
+                    "p99_seconds": round(histogram.quantile(0.99), 6),
+                    "max_seconds": round(histogram.max, 6),
+                    "items_per_busy_second": (
+                        round(items / histogram.sum, 3) if histogram.sum else None
+                    ),
+                    "items_per_second": round(items / elapsed, 3) if elapsed else None,
+                }
+            return {
+                "elapsed_seconds": round(elapsed, 6),
+                "stages": stages,
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Devuelve las métricas en el formato de texto de Prometheus.
+        """
+        ns = self.namespace
+        lines = [
+            f"# TYPE {ns}_stage_seconds histogram",
+        ]
+        with self._lock:
+            for stage, histogram in self._histograms.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f'{ns}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} '
+                        f"{cumulative}"
+                    )
+                lines.append(
+                    f'{ns}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} '
+                    f"{histogram.count}"
+                )
+                lines.append(
+                    f'{ns}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}'
+                )
+                lines.append(
+                    f'{ns}_stage_seconds_count{{stage="{stage}"}} {histogram.count}'
+                )
+            lines.append(f"# TYPE {ns}_stage_items_total counter")
+            for stage, items in self._items.items():
+                lines.append(f'{ns}_stage_items_total{{stage="{stage}"}} {items}')
+            for name, value in sorted(self._counters.items()):
+                lines.append(f"# TYPE {ns}_{name} counter")
+                lines.append(f"{ns}_{name} {value}")
+            for name, value in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {ns}_{name} gauge")
+                lines.append(f"{ns}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str | Path) -> None:
+        """
+        Escribe las métricas en un fichero para el textfile collector de
+        node_exporter. Se escribe en un fichero temporal y se renombra para que
+        el colector nunca lea un fichero a medias.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(self.to_prometheus(), encoding="utf-8")
+        tmp_path.replace(path)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Expone las métricas en `http://host:port/metrics` desde un hilo en
+        segundo plano. Devuelve el servidor para poder pararlo con `shutdown`.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info(f"Métricas de Prometheus en http://{host}:{port}/metrics")
+        return server
+
+
+def record_client_metrics(
+    registry: MetricsRegistry, prefix: str, rate_limiter, cache=None
+) -> None:
+    """
+    Copia a `registry` los contadores de un cliente de OpenAI (peticiones,
+    tokens, reintentos, respuestas 429 y tiempo de espera de su `RateLimiter`)
+    y la tasa de aciertos de su caché, si la tiene.
+    """
+    counters = rate_limiter.metrics()
+    for name in ("requests", "tokens", "retries", "rate_limited", "throttled_seconds"):
+        registry.gauge(f"{prefix}_{name}", counters[name])
+    if cache is not None:
+        registry.gauge(f"{prefix}_cache_hits", cache.hits)
+        registry.gauge(f"{prefix}_cache_misses", cache.misses)
+        registry.gauge(f"{prefix}_cache_hit_rate", cache.hit_rate)
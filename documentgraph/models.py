@@ -2,11 +2,26 @@ import uuid
 from typing import Any
 from pydantic import BaseModel, Field
 
+NAMESPACE = uuid.uuid5(
+    uuid.NAMESPACE_URL, "https://github.com/complexluise/documentgraph"
+)
+
+
+def stable_id(*parts: str) -> str:
+    """
+    Devuelve un UUID determinista (uuid5) derivado de las partes dadas.
+    """
+    return str(uuid.uuid5(NAMESPACE, "\0".join(parts)))
+
 
 class Document(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     filename: str
     content: str
+    path: str | None = None
+    content_hash: str | None = None
+    # Large files are read in windows while chunking instead of into `content`
+    streamed: bool = Field(default=False, exclude=True)
     metadata: dict[str, Any] = Field(default_factory=dict)
 
 
@@ -14,23 +29,27 @@ class TextChunk(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     content: str
     document_id: str
-    next_chunk_id: str = None
-    embedding: list[float] = None
+    next_chunk_id: str | None = None
+    embedding: list[float] | None = None
+    # Posición del chunk en el documento, en caracteres
+    start_index: int | None = None
+    end_index: int | None = None
 
 
 class Entity(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     type: str
+    key: str | None = None  # Clave natural tipo:nombre, asignada por EntityResolver
     properties: dict[str, Any] = Field(default_factory=dict)
 
 
 class Relationship(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    source_name: str = None
-    source_id: str = None
-    target_name: str = None
-    target_id: str = None
+    source_name: str | None = None
+    source_id: str | None = None
+    target_name: str | None = None
+    target_id: str | None = None
     type: str
     properties: dict[str, Any] = Field(default_factory=dict)
 
@@ -40,3 +59,35 @@ class ExtractionResult(BaseModel):
     relationships: list[Relationship] = Field(
         description="Lista de relaciones extraídas"
     )
+    # Error de la extracción del chunk, que queda sin entidades ni relaciones
+    error: str | None = None
+
+    @classmethod
+    def from_error(cls, error: Exception) -> "ExtractionResult":
+        return cls(
+            entities=[], relationships=[], error=f"{type(error).__name__}: {error}"
+        )
+
+
+class RelatedEntity(BaseModel):
+    id: str
+    name: str | None = None
+    type: str | None = None
+    relationship: str
+    outgoing: bool = Field(description="True si la relación sale de la entidad")
+
+
+class EntityContext(BaseModel):
+    id: str
+    name: str | None = None
+    type: str | None = None
+    neighbors: list[RelatedEntity] = Field(default_factory=list)
+
+
+class ChunkMatch(BaseModel):
+    chunk_id: str
+    text: str
+    score: float
+    document_id: str | None = None
+    filename: str | None = None
+    entities: list[EntityContext] = Field(default_factory=list)
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class _TokenBucket:
+    """
+    Cubo de tokens con reservas: el nivel puede quedar en negativo y quien reserva
+    espera el tiempo necesario para que se recupere.
+    """
+
+    def __init__(self, per_minute: float | None):
+        self.limit = per_minute
+        self.rate = per_minute
+        self.level = per_minute or 0.0
+        self.updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rate)
+
+    def refill(self, now: float) -> None:
+        if self.enabled:
+            self.level = min(
+                self.rate, self.level + (now - self.updated) * self.rate / 60
+            )
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        if not self.enabled:
+            return 0.0
+        self.level -= amount
+        return max(0.0, -self.level * 60 / self.rate)
+
+
+class RateLimiter:
+    """
+    Limitador de peticiones y tokens por minuto para las llamadas a OpenAI,
+    compartido por todos los hilos y tareas que usan el mismo modelo.
+
+    Antes de cada llamada reserva una petición y el coste estimado en tokens, y
+    espera si el presupuesto del minuto está agotado. Reintenta los errores
+    transitorios con espera exponencial y jitter, y se adapta a la cuota real:
+    reduce el ritmo tras un 429, lo recupera poco a poco con cada éxito y ajusta
+    el presupuesto con las cabeceras `x-ratelimit-*` de las respuestas.
+
+    Attributes:
+        max_retries (int): Reintentos por llamada antes de propagar el error.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int | None = None,
+        tokens_per_minute: int | None = None,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._requests = _TokenBucket(requests_per_minute)
+        self._tokens = _TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._counters = {
+            "requests": 0,
+            "tokens": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "throttled_seconds": 0.0,
+        }
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            wait = max(self._requests.reserve(1), self._tokens.reserve(tokens))
+            self._counters["requests"] += 1
+            self._counters["tokens"] += tokens
+            self._counters["throttled_seconds"] += wait
+            return wait
+
+    def acquire(self, tokens: int = 0) -> None:
+        time.sleep(self._reserve(tokens))
+
+    async def aacquire(self, tokens: int = 0) -> None:
+        await asyncio.sleep(self._reserve(tokens))
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """
+        Corrige el presupuesto de tokens con el consumo real de una llamada.
+        """
+        with self._lock:
+            self._tokens.level += estimated - actual
+            self._counters["tokens"] += actual - estimated
+
+    def update_from_headers(self, headers: dict[str, str]) -> None:
+        """
+        Ajusta los cubos con las cabeceras `x-ratelimit-*` de OpenAI. Si no se
+        configuraron límites, adopta los que informa la API.
+        """
+        headers = {key.lower(): value for key, value in headers.items()}
+        with self._lock:
+            for bucket, name in (
+                (self._requests, "requests"),
+                (self._tokens, "tokens"),
+            ):
+                limit = headers.get(f"x-ratelimit-limit-{name}")
+                if limit and bucket.limit is None:
+                    bucket.limit = bucket.rate = float(limit)
+                    bucket.level = float(limit)
+                remaining = headers.get(f"x-ratelimit-remaining-{name}")
+                if remaining and bucket.enabled:
+                    bucket.level = min(bucket.level, float(remaining))
+
+    def _on_success(self) -> None:
+        with self._lock:
+            for bucket in (self._requests, self._tokens):
+                if bucket.enabled and bucket.rate < bucket.limit:
+                    bucket.rate = min(bucket.limit, bucket.rate + bucket.limit * 0.01)
+
+    def _on_rate_limited(self) -> None:
+        with self._lock:
+            self._counters["rate_limited"] += 1
+            for bucket in (self._requests, self._tokens):
+                if bucket.enabled:
+                    bucket.rate = max(bucket.limit * 0.1, bucket.rate * 0.75)
+                    bucket.level = min(bucket.level, 0.0)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        with self._lock:
+            self._counters["retries"] += 1
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after-ms")
+            if retry_after:
+                return float(retry_after) / 1000
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                return float(retry_after)
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if isinstance(error, openai.RateLimitError):
+            self._on_rate_limited()
+        if attempt >= self.max_retries:
+            return False
+        logger.warning(
+            f"Llamada a OpenAI fallida ({type(error).__name__}), "
+            f"reintento {attempt + 1}/{self.max_retries}"
+        )
+        return True
+
+    def call(self, func: Callable[..., Any], *args, tokens: int = 0, **kwargs) -> Any:
+        """
+        Ejecuta `func` respetando los límites y reintentando los errores
+        transitorios de OpenAI.
+
+        Args:
+            func (Callable): Función que hace la llamada a la API.
+            tokens (int): Coste estimado de la llamada en tokens.
+        """
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            try:
+                result = func(*args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+                continue
+            self._on_success()
+            return result
+
+    async def acall(
+        self, func: Callable[..., Any], *args, tokens: int = 0, **kwargs
+    ) -> Any:
+        """
+        Versión asíncrona de `call` para corrutinas.
+        """
+        attempt = 0
+        while True:
+            await self.aacquire(tokens)
+            try:
+                result = await func(*args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+                continue
+            self._on_success()
+            return result
+
+    def metrics(self) -> dict[str, float]:
+        """
+        Devuelve los contadores acumulados y el rendimiento medio por minuto.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            counters["requests_per_minute_limit"] = self._requests.rate
+            counters["tokens_per_minute_limit"] = self._tokens.rate
+        minutes = max(time.monotonic() - self._started, 1e-9) / 60
+        counters["requests_per_minute"] = counters["requests"] / minutes
+        counters["tokens_per_minute"] = counters["tokens"] / minutes
+        return counters
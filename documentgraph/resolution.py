@@ -0,0 +1,184 @@
+import logging
+import re
+import string
+import threading
+import unicodedata
+from pathlib import Path
+
+from documentgraph.cache import SQLiteCache
+from documentgraph.config import ETLConfig
+from documentgraph.models import Entity, ExtractionResult, stable_id
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normaliza un nombre de entidad para compararlo: forma Unicode NFKC, sin
+    distinguir mayúsculas, sin puntuación en los extremos y con los espacios
+    colapsados ("  ACME Corp. " -> "acme corp").
+    """
+    name = unicodedata.normalize("NFKC", name or "").casefold()
+    name = _WHITESPACE.sub(" ", name)
+    return name.strip(string.punctuation + " ")
+
+
+def entity_key(name: str, entity_type: str) -> str:
+    """
+    Devuelve la clave natural de una entidad, `tipo:nombre` normalizados.
+    """
+    return f"{normalize_name(entity_type).replace(' ', '_')}:{normalize_name(name)}"
+
+
+class EntityIndex(SQLiteCache):
+    """
+    Tabla persistente clave natural -> entidad canónica (id, nombre y tipo con
+    los que se cargó por primera vez), compartida entre ejecuciones.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS entities (
+        key TEXT PRIMARY KEY,
+        id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        type TEXT NOT NULL
+    );
+    """
+
+    def get_many(self, keys: list[str]) -> dict[str, Entity]:
+        found = {}
+        conn = self.connection()
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, id, name, type FROM entities WHERE key IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for key, entity_id, name, entity_type in rows:
+                found[key] = Entity(id=entity_id, name=name, type=entity_type, key=key)
+        self._count(len(found), len(keys) - len(found))
+        return found
+
+    def put_many(self, entities: list[Entity]) -> None:
+        with self.transaction() as conn:
+            # Another process may have registered the key first: keep its entity
+            conn.executemany(
+                "INSERT OR IGNORE INTO entities (key, id, name, type) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (entity.key, entity.id, entity.name, entity.type)
+                    for entity in entities
+                ],
+            )
+
+
+class EntityResolver:
+    """
+    Resuelve las entidades extraídas de cada chunk a entidades canónicas.
+
+    Dos menciones son la misma entidad si coinciden su nombre y su tipo
+    normalizados (`entity_key`). El id de la entidad canónica se deriva de esa
+    clave, así que es el mismo en todos los chunks, documentos y ejecuciones, y
+    `MERGE` en el grafo las une en un solo nodo. El nombre y el tipo canónicos
+    son los de la primera mención; se guardan en un índice en memoria y, si
+    `ResolutionConfig.index_path` está configurado, en un `EntityIndex` para
+    que las siguientes ejecuciones no los sobrescriban.
+
+    Es seguro usarlo desde varios hilos.
+
+    Attributes:
+        config (ETLConfig): Configuración del pipeline.
+        index (EntityIndex | None): Tabla persistente de entidades canónicas.
+    """
+
+    def __init__(self, config: ETLConfig):
+        self.config = config
+        index_path = config.resolution_config.index_path
+        self.index = EntityIndex(Path(index_path)) if index_path else None
+        self._entities: dict[str, Entity] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, results: list[ExtractionResult]) -> list[ExtractionResult]:
+        """
+        Sustituye las entidades de cada resultado por sus entidades canónicas,
+        sin duplicados, y enlaza las relaciones con los ids canónicos.
+
+        Returns:
+            list[ExtractionResult]: Resultados nuevos, uno por resultado de entrada.
+        """
+        canonical = self._canonical_entities(
+            entity for result in results for entity in result.entities
+        )
+        return [self._resolve_result(result, canonical) for result in results]
+
+    def _canonical_entities(self, mentions) -> dict[str, Entity]:
+        first_mentions: dict[str, Entity] = {}
+        for entity in mentions:
+            first_mentions.setdefault(entity_key(entity.name, entity.type), entity)
+
+        with self._lock:
+            canonical = {
+                key: self._entities[key]
+                for key in first_mentions
+                if key in self._entities
+            }
+            unknown = [key for key in first_mentions if key not in canonical]
+            if unknown and self.index is not None:
+                stored = self.index.get_many(unknown)
+                canonical.update(stored)
+                unknown = [key for key in unknown if key not in stored]
+
+            new_entities = [
+                Entity(
+                    id=stable_id("entity", key),
+                    name=first_mentions[key].name.strip(),
+                    type=first_mentions[key].type.strip(),
+                    key=key,
+                )
+                for key in unknown
+            ]
+            if new_entities and self.index is not None:
+                self.index.put_many(new_entities)
+            canonical.update((entity.key, entity) for entity in new_entities)
+            self._entities.update(canonical)
+        return canonical
+
+    @staticmethod
+    def _resolve_result(
+        result: ExtractionResult, canonical: dict[str, Entity]
+    ) -> ExtractionResult:
+        entities: dict[str, Entity] = {}
+        ids: dict[str, str] = {}
+        names: dict[str, str] = {}
+        for entity in result.entities:
+            resolved = canonical[entity_key(entity.name, entity.type)]
+            entities.setdefault(resolved.id, resolved)
+            ids[entity.id] = resolved.id
+            names.setdefault(normalize_name(entity.name), resolved.id)
+
+        relationships, edges = [], set()
+        for relationship in result.relationships:
+            source_id = ids.get(relationship.source_id) or names.get(
+                normalize_name(relationship.source_name)
+            )
+            target_id = ids.get(relationship.target_id) or names.get(
+                normalize_name(relationship.target_name)
+            )
+            if source_id and target_id:
+                edge = (source_id, relationship.type, target_id)
+                if edge in edges:
+                    continue
+                edges.add(edge)
+            relationships.append(
+                relationship.model_copy(
+                    update={"source_id": source_id, "target_id": target_id}
+                )
+            )
+        return ExtractionResult(
+            entities=list(entities.values()),
+            relationships=relationships,
+            error=result.error,
+        )
@@ -0,0 +1,125 @@
+import logging
+from typing import Any
+
+from neo4j import AsyncGraphDatabase, GraphDatabase, RoutingControl
+
+from documentgraph.config import ETLConfig
+from documentgraph.loading import Neo4JQueryManager
+from documentgraph.models import ChunkMatch
+from documentgraph.transformation import EmbeddingGenerator
+
+logger = logging.getLogger(__name__)
+
+
+class GraphRetriever:
+    """
+    Consulta el grafo de conocimiento cargado por el pipeline.
+
+    `search` busca los `top_k` fragmentos más parecidos a la consulta en el
+    índice vectorial de `TextChunk.embedding` y, en la misma consulta Cypher,
+    expande cada fragmento a sus entidades (CONTAINS) y a las entidades
+    vecinas de estas. La búsqueda usa el índice (ANN), así que su coste no
+    crece con el número total de fragmentos.
+
+    Attributes:
+        config (ETLConfig): Configuración de Neo4j y de los embeddings.
+        embedding_generator (EmbeddingGenerator): Genera el embedding de las
+            consultas de texto con el mismo modelo que los fragmentos.
+        driver (neo4j.Driver): Driver para la conexión a Neo4j.
+    """
+
+    def __init__(
+        self, config: ETLConfig, embedding_generator: EmbeddingGenerator = None
+    ):
+        self.config = config
+        self.embedding_generator = embedding_generator or EmbeddingGenerator(config)
+        self.driver = GraphDatabase.driver(
+            config.graph_db_config.uri,
+            auth=(config.graph_db_config.user, config.graph_db_config.password),
+        )
+        self._async_driver = None
+
+    def _parameters(
+        self,
+        embedding: list[float],
+        top_k: int,
+        max_entities: int,
+        max_neighbors: int,
+    ) -> dict[str, Any]:
+        return {
+            "index_name": self.config.graph_db_config.vector_index,
+            "embedding": embedding,
+            "top_k": top_k,
+            "max_entities": max_entities,
+            "max_neighbors": max_neighbors,
+        }
+
+    def search(
+        self,
+        query: str | list[float],
+        top_k: int = 5,
+        max_entities: int = 10,
+        max_neighbors: int = 10,
+    ) -> list[ChunkMatch]:
+        """
+        Busca los fragmentos más similares a la consulta y su contexto en el
+        grafo.
+
+        Args:
+            query (str | list[float]): Texto de la consulta o su embedding.
+            top_k (int): Número de fragmentos a devolver.
+            max_entities (int): Máximo de entidades por fragmento.
+            max_neighbors (int): Máximo de entidades vecinas por entidad.
+
+        Returns:
+            list[ChunkMatch]: Los fragmentos ordenados de mayor a menor similitud.
+        """
+        if isinstance(query, str):
+            query = self.embedding_generator.embed_texts([query])[0]
+        records, _, _ = self.driver.execute_query(
+            Neo4JQueryManager.vector_search(),
+            self._parameters(query, top_k, max_entities, max_neighbors),
+            routing_=RoutingControl.READ,
+        )
+        return [ChunkMatch(**record.data()) for record in records]
+
+    async def asearch(
+        self,
+        query: str | list[float],
+        top_k: int = 5,
+        max_entities: int = 10,
+        max_neighbors: int = 10,
+    ) -> list[ChunkMatch]:
+        """
+        Versión asíncrona de `search`, con el driver asíncrono de Neo4j.
+        """
+        if isinstance(query, str):
+            query = (await self.embedding_generator.aembed_texts([query]))[0]
+        if self._async_driver is None:
+            self._async_driver = AsyncGraphDatabase.driver(
+                self.config.graph_db_config.uri,
+                auth=(
+                    self.config.graph_db_config.user,
+                    self.config.graph_db_config.password,
+                ),
+            )
+        records, _, _ = await self._async_driver.execute_query(
+            Neo4JQueryManager.vector_search(),
+            self._parameters(query, top_k, max_entities, max_neighbors),
+            routing_=RoutingControl.READ,
+        )
+        return [ChunkMatch(**record.data()) for record in records]
+
+    def close(self) -> None:
+        """
+        Cierra la conexión con la base de datos Neo4j.
+        """
+        self.driver.close()
+
+    async def aclose(self) -> None:
+        """
+        Cierra también el driver asíncrono, si se llegó a abrir.
+        """
+        self.driver.close()
+        if self._async_driver is not None:
+            await self._async_driver.close()
@@ -0,0 +1,139 @@
+import logging
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class _StageWorkers:
+    """
+    Estado compartido por los hilos de una etapa: cuántos siguen activos, para
+    que el último en terminar avise a la etapa siguiente.
+    """
+
+    def __init__(self, n_workers: int):
+        self.remaining = n_workers
+        self.lock = threading.Lock()
+
+    def finish(self) -> bool:
+        with self.lock:
+            self.remaining -= 1
+            return self.remaining == 0
+
+
+class PipelineScheduler:
+    """
+    Ejecuta una secuencia de etapas en paralelo, conectadas por colas acotadas.
+
+    Cada etapa es una tupla `(nombre, función, hilos)`. La función recibe el
+    elemento producido por la etapa anterior y devuelve el elemento para la
+    siguiente, un iterador de elementos, o `None` para descartarlo. Como las
+    colas están acotadas, una etapa lenta frena a las anteriores en lugar de
+    acumular memoria.
+
+    Si alguna etapa lanza una excepción, se dejan de procesar elementos nuevos,
+    se vacían las colas y `run` relanza la primera excepción.
+
+    Attributes:
+        stages (list[tuple[str, Callable, int]]): Etapas en orden.
+        queue_size (int): Capacidad de cada cola entre etapas.
+    """
+
+    def __init__(
+        self,
+        stages: list[tuple[str, Callable[[Any], Any], int]],
+        queue_size: int = 16,
+    ):
+        self.stages = stages
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._errors: list[BaseException] = []
+        self._errors_lock = threading.Lock()
+
+    def _fail(self, stage: str, error: BaseException) -> None:
+        logger.error(f"Error en la etapa {stage}: {str(error)}")
+        with self._errors_lock:
+            self._errors.append(error)
+        self._stop.set()
+
+    def _work(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        inbox: queue.Queue,
+        outbox: queue.Queue | None,
+        workers: _StageWorkers,
+        next_workers: int,
+    ) -> None:
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            # After a failure keep draining the inbox so upstream never blocks
+            if self._stop.is_set():
+                continue
+            try:
+                result = func(item)
+            except Exception as e:
+                self._fail(name, e)
+                continue
+            if outbox is None or result is None:
+                continue
+            try:
+                if isinstance(result, Iterator):
+                    for output in result:
+                        outbox.put(output)
+                else:
+                    outbox.put(result)
+            except Exception as e:
+                self._fail(name, e)
+
+        if workers.finish() and outbox is not None:
+            for _ in range(next_workers):
+                outbox.put(_DONE)
+
+    def run(self, items: Iterable[Any]) -> None:
+        """
+        Procesa todos los elementos a través de las etapas y espera a que
+        terminen.
+
+        Raises:
+            Exception: La primera excepción lanzada por una etapa o por `items`.
+        """
+        self._stop.clear()
+        self._errors = []
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = []
+        for index, (name, func, n_workers) in enumerate(self.stages):
+            last = index + 1 == len(self.stages)
+            outbox = None if last else queues[index + 1]
+            next_workers = 0 if last else self.stages[index + 1][2]
+            workers = _StageWorkers(n_workers)
+            for worker_index in range(n_workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(name, func, queues[index], outbox, workers, next_workers),
+                    name=f"{name}-{worker_index}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for item in items:
+                if self._stop.is_set():
+                    break
+                queues[0].put(item)
+        except Exception as e:
+            self._fail("input", e)
+        finally:
+            for _ in range(self.stages[0][2]):
+                queues[0].put(_DONE)
+            for thread in threads:
+                thread.join()
+
+        if self._errors:
+            raise self._errors[0]
@@ -0,0 +1,330 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any
+
+import numpy as np
+
+from documentgraph.config import ETLConfig
+from documentgraph.export import CSVGraphExporter, JSONLGraphSink
+from documentgraph.loading import (
+    AsyncKnowledgeGraphLoader,
+    GraphRowBuffer,
+    GraphSink,
+    KnowledgeGraphLoader,
+    flatten_properties,
+)
+from documentgraph.models import Document, ExtractionResult, TextChunk
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryGraphSink(GraphRowBuffer, GraphSink):
+    """
+    Destino que guarda el grafo en memoria, para ejecutar el pipeline sin base
+    de datos (pruebas, benchmarks, perfilado de las etapas de transformación).
+
+    Los nodos se indexan por id en un diccionario por etiqueta y las relaciones
+    por `(tipo, origen, destino)`, con listas de adyacencia de salida y de
+    entrada por nodo. Escribir un nodo o relación que ya existe combina sus
+    propiedades, como `MERGE ... SET +=` en Neo4j, y las relaciones entre
+    entidades acumulan en `sources` los documentos que las aportan, así que
+    admite el modo incremental.
+
+    Attributes:
+        config (ETLConfig): Configuración del pipeline.
+        nodes (dict[str, dict[str, dict[str, Any]]]): Etiqueta -> id -> propiedades.
+        relationships (dict[tuple[str, str, str], dict[str, Any]]): Propiedades
+            de cada relación por `(tipo, origen, destino)`.
+    """
+
+    def __init__(self, config: ETLConfig):
+        self.config = config
+        self.nodes: dict[str, dict[str, dict[str, Any]]] = defaultdict(dict)
+        self.relationships: dict[tuple[str, str, str], dict[str, Any]] = {}
+        self._outgoing: dict[str, set[tuple[str, str]]] = defaultdict(set)
+        self._incoming: dict[str, set[tuple[str, str]]] = defaultdict(set)
+        self._reset_buffers()
+
+    def _merge_node(self, label: str, node_id: str, properties: dict[str, Any]):
+        self.nodes[label].setdefault(node_id, {"id": node_id}).update(properties)
+
+    def _merge_relationship(
+        self,
+        rel_type: str,
+        source_id: str,
+        target_id: str,
+        properties: dict[str, Any] = None,
+        sources: list[str] = None,
+    ):
+        edge = (rel_type, source_id, target_id)
+        merged = self.relationships.setdefault(edge, {})
+        merged.update(properties or {})
+        if sources:
+            known = merged.setdefault("sources", [])
+            known.extend(source for source in sources if source not in known)
+        self._outgoing[source_id].add((rel_type, target_id))
+        self._incoming[target_id].add((rel_type, source_id))
+
+    def _remove_relationship(self, rel_type: str, source_id: str, target_id: str):
+        self.relationships.pop((rel_type, source_id, target_id), None)
+        self._outgoing[source_id].discard((rel_type, target_id))
+        self._incoming[target_id].discard((rel_type, source_id))
+
+    def add_document(
+        self,
+        document: Document,
+        chunks: list[TextChunk],
+        extraction_results: list[ExtractionResult],
+        prev_chunk_id: str = None,
+        complete: bool = True,
+    ) -> list[Document]:
+        """
+        Acumula un documento y lo escribe cuando las filas acumuladas alcanzan
+        `ETLConfig.load_batch_size`. Ver `KnowledgeGraphLoader.add_document`.
+        """
+        if self.buffer_document(
+            document, chunks, extraction_results, prev_chunk_id, complete
+        ):
+            return self.flush()
+        return []
+
+    def flush(self) -> list[Document]:
+        """
+        Escribe en memoria todas las filas acumuladas.
+
+        Returns:
+            list[Document]: Los documentos escritos.
+        """
+        if not self._document_rows:
+            return []
+
+        for row in self._document_rows:
+            self._merge_node(
+                "Document", row["id"], flatten_properties(row["properties"])
+            )
+        for row in self._entity_rows.values():
+            self._merge_node("Entity", row["id"], flatten_properties(row["properties"]))
+        for rel_type, rows in self._relationship_rows.items():
+            for (source_id, target_id), row in rows.items():
+                self._merge_relationship(
+                    rel_type, source_id, target_id, row["properties"], row["sources"]
+                )
+        for row in self._chunk_rows:
+            embedding = row["embedding"]
+            self._merge_node(
+                "TextChunk",
+                row["id"],
+                {
+                    "text": row["text"],
+                    "embedding": (
+                        None
+                        if embedding is None
+                        else np.asarray(embedding, dtype=np.float32)
+                    ),
+                    "start_index": row["start_index"],
+                    "end_index": row["end_index"],
+                    "document_hash": row["document_hash"],
+                },
+            )
+            self._merge_relationship("HAS_CHUNK", row["doc_id"], row["id"])
+            for entity_id in row["entity_ids"]:
+                self._merge_relationship("CONTAINS", row["id"], entity_id)
+        chunks = self.nodes["TextChunk"]
+        for row in self._next_rows:
+            if row["prev_id"] in chunks and row["id"] in chunks:
+                self._merge_relationship("NEXT", row["prev_id"], row["id"])
+
+        return self.take_pending()
+
+    def neighbors(
+        self, node_id: str, rel_type: str = None, direction: str = "out"
+    ) -> list[str]:
+        """
+        Devuelve los ids de los nodos enlazados con `node_id`.
+
+        Args:
+            node_id (str): Id del nodo.
+            rel_type (str, optional): Solo relaciones de este tipo.
+            direction (str): "out" para las relaciones salientes, "in" para las
+                entrantes.
+        """
+        edges = self._outgoing if direction == "out" else self._incoming
+        return [
+            other
+            for edge_type, other in edges.get(node_id, ())
+            if rel_type is None or edge_type == rel_type
+        ]
+
+    def counts(self) -> dict[str, int]:
+        """
+        Devuelve el número de nodos por etiqueta y de relaciones por tipo.
+        """
+        counts = {label: len(nodes) for label, nodes in self.nodes.items()}
+        for rel_type, _, _ in self.relationships:
+            counts[rel_type] = counts.get(rel_type, 0) + 1
+        return counts
+
+    def _remove_node(self, label: str, node_id: str) -> None:
+        self.nodes[label].pop(node_id, None)
+        for rel_type, target_id in self._outgoing.pop(node_id, ()):
+            self.relationships.pop((rel_type, node_id, target_id), None)
+            self._incoming[target_id].discard((rel_type, node_id))
+        for rel_type, source_id in self._incoming.pop(node_id, ()):
+            self.relationships.pop((rel_type, source_id, node_id), None)
+            self._outgoing[source_id].discard((rel_type, node_id))
+
+    def _remove_sources(self, doc_id: str, keep: str | None = None) -> None:
+        """
+        Quita la procedencia del documento, salvo `keep`, de las relaciones
+        entre las entidades de sus fragmentos, y elimina las que se quedan sin
+        procedencia.
+        """
+        prefix = f"{doc_id}:"
+        entity_ids = {
+            entity_id
+            for chunk_id in self.neighbors(doc_id, "HAS_CHUNK")
+            for entity_id in self.neighbors(chunk_id, "CONTAINS")
+        }
+        for entity_id in entity_ids:
+            for rel_type, target_id in list(self._outgoing.get(entity_id, ())):
+                properties = self.relationships[(rel_type, entity_id, target_id)]
+                sources = properties.get("sources", [])
+                remaining = [
+                    source
+                    for source in sources
+                    if not source.startswith(prefix) or source == keep
+                ]
+                if len(remaining) == len(sources):
+                    continue
+                if remaining:
+                    properties["sources"] = remaining
+                else:
+                    self._remove_relationship(rel_type, entity_id, target_id)
+
+    def _delete_chunks(
+        self, doc_id: str, keep: str | None = None, document_hash: str | None = None
+    ) -> None:
+        self._remove_sources(doc_id, keep)
+        entity_ids = set()
+        for chunk_id in self.neighbors(doc_id, "HAS_CHUNK"):
+            chunk = self.nodes["TextChunk"].get(chunk_id, {})
+            if (
+                document_hash is not None
+                and chunk.get("document_hash") == document_hash
+            ):
+                continue
+            entity_ids.update(self.neighbors(chunk_id, "CONTAINS"))
+            self._remove_node("TextChunk", chunk_id)
+        for entity_id in entity_ids:
+            if not self.neighbors(entity_id, "CONTAINS", direction="in"):
+                self._remove_node("Entity", entity_id)
+
+    def delete_document_chunks(self, doc_ids: list[str]) -> None:
+        """
+        Elimina los fragmentos de los documentos dados, las relaciones entre
+        entidades que solo aportaban esos documentos y las entidades que dejan
+        de estar contenidas en algún fragmento, como
+        `KnowledgeGraphLoader.delete_document_chunks`.
+        """
+        for doc_id in doc_ids:
+            self._delete_chunks(doc_id)
+
+    def delete_stale_chunks(self, documents: list[Document]) -> None:
+        """
+        Elimina los datos de versiones anteriores de los documentos dados, como
+        `KnowledgeGraphLoader.delete_stale_chunks`.
+        """
+        for document in documents:
+            self._delete_chunks(
+                document.id, self.relationship_source(document), document.content_hash
+            )
+
+    def delete_documents(self, doc_ids: list[str]) -> None:
+        self.delete_document_chunks(doc_ids)
+        for doc_id in doc_ids:
+            self._remove_node("Document", doc_id)
+
+
+SINKS = {
+    "neo4j": KnowledgeGraphLoader,
+    "csv": CSVGraphExporter,
+    "jsonl": JSONLGraphSink,
+    "memory": InMemoryGraphSink,
+}
+
+
+def create_sink(config: ETLConfig) -> GraphSink:
+    """
+    Crea el destino de la carga indicado por `ETLConfig.sink`.
+
+    Raises:
+        ValueError: Si el destino no existe.
+    """
+    if config.sink not in SINKS:
+        raise ValueError(
+            f"Destino de carga desconocido: {config.sink}. "
+            f"Opciones: {', '.join(SINKS)}"
+        )
+    return SINKS[config.sink](config)
+
+
+class ThreadedGraphSink:
+    """
+    Adapta un `GraphSink` síncrono a la interfaz de `AsyncKnowledgeGraphLoader`
+    para `AsyncDocumentAnalysisPipeline`: cada llamada se ejecuta en un hilo, de
+    una en una, sin bloquear el bucle de eventos.
+
+    Attributes:
+        sink (GraphSink): Destino adaptado.
+    """
+
+    def __init__(self, sink: GraphSink):
+        self.sink = sink
+        self._lock = asyncio.Lock()
+
+    async def _call(self, method, *args, **kwargs):
+        async with self._lock:
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+    async def ensure_schema(self, recreate_vector_index: bool = False) -> None:
+        await self._call(self.sink.ensure_schema, recreate_vector_index)
+
+    async def add_document(
+        self,
+        document: Document,
+        chunks: list[TextChunk],
+        extraction_results: list[ExtractionResult],
+        prev_chunk_id: str = None,
+        complete: bool = True,
+    ) -> list[Document]:
+        return await self._call(
+            self.sink.add_document,
+            document,
+            chunks,
+            extraction_results,
+            prev_chunk_id=prev_chunk_id,
+            complete=complete,
+        )
+
+    async def flush(self) -> list[Document]:
+        return await self._call(self.sink.flush)
+
+    async def close(self) -> None:
+        await self._call(self.sink.close)
+
+
+def create_async_sink(
+    config: ETLConfig,
+) -> AsyncKnowledgeGraphLoader | ThreadedGraphSink:
+    """
+    Crea el destino de la carga asíncrona indicado por `ETLConfig.sink`: el
+    driver asíncrono de Neo4j para "neo4j" y, para los demás, el destino de
+    `create_sink` ejecutado en un hilo.
+
+    Raises:
+        ValueError: Si el destino no existe.
+    """
+    if config.sink == "neo4j":
+        return AsyncKnowledgeGraphLoader(config)
+    return ThreadedGraphSink(create_sink(config))
@@ -0,0 +1,51 @@
+import functools
+from typing import Any
+
+import tiktoken
+
+# Encodings set with set_encoding, by model
+_encodings: dict[str, Any] = {}
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """
+    Devuelve el codificador del modelo: el registrado con `set_encoding` o, si
+    no hay ninguno, el de tiktoken, con `cl100k_base` si tiktoken no conoce el
+    modelo.
+    """
+    if model in _encodings:
+        return _encodings[model]
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def set_encoding(model: str, encoding: Any | None) -> None:
+    """
+    Usa `encoding` para contar y cortar los tokens de `model` en lugar del
+    codificador de tiktoken, que se descarga la primera vez que se usa. Basta
+    con que implemente `encode_ordinary`, `encode_ordinary_batch` y
+    `decode_with_offsets`. Con `None` se vuelve a usar tiktoken.
+    """
+    if encoding is None:
+        _encodings.pop(model, None)
+    else:
+        _encodings[model] = encoding
+    get_encoding.cache_clear()
+
+
+def registered_encodings() -> dict[str, Any]:
+    """
+    Devuelve los codificadores registrados con `set_encoding`, por modelo.
+    """
+    return dict(_encodings)
+
+
+def count_tokens(text: str, model: str) -> int:
+    return len(get_encoding(model).encode_ordinary(text))
+
+
+def count_tokens_batch(texts: list[str], model: str) -> list[int]:
+    return [len(tokens) for tokens in get_encoding(model).encode_ordinary_batch(texts)]
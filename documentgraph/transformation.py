@@ -1,27 +1,243 @@
+import asyncio
+import collections
+import contextlib
 import json
+import logging
+import multiprocessing
 import re
+import threading
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
-from typing import Tuple
+from typing import Any, AsyncIterator, Iterable, Iterator
 
+import numpy as np
+from pydantic import ValidationError
 from langchain_core.runnables import RunnableLambda
 from langchain_text_splitters import (
     RecursiveCharacterTextSplitter,
     CharacterTextSplitter,
 )
-from langchain_experimental.text_splitter import SemanticChunker
 from langchain_openai import ChatOpenAI
 from langchain_openai.embeddings import OpenAIEmbeddings
 from langchain.output_parsers import PydanticOutputParser
 from langchain.prompts import ChatPromptTemplate
 
+from documentgraph.cache import EmbeddingCache, ExtractionCache, content_hash
+from documentgraph.columnar import ChunkBatch
 from documentgraph.config import ETLConfig
-from documentgraph.models import Document, TextChunk, Entity, Relationship, ExtractionResult
+from documentgraph.extraction import iter_text_windows
+from documentgraph.models import (
+    Document,
+    TextChunk,
+    Entity,
+    Relationship,
+    ExtractionResult,
+    stable_id,
+)
+from documentgraph.ratelimit import RateLimiter
+from documentgraph.tokens import (
+    count_tokens,
+    count_tokens_batch,
+    get_encoding,
+    registered_encodings,
+    set_encoding,
+)
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_PROMPT = """
+    You are tasked with extracting entities and relationships from a given text. Here is the text you will analyze:
+    
+    <text>
+    {text}
+    </text>
+    
+    Your goal is to identify entities and their relationships within this text, and then present them in a specific JSON format. Follow these steps:
+    
+    1. Carefully read and analyze the text.
+    
+    2. In a <reasoning> section, think through the entities you've identified. Consider which mentions might refer to the same entity and how you can consolidate them.
+    
+    3. Identify and categorize entities:
+       - Look for proper nouns, important concepts, or recurring themes.
+       - Determine a suitable type for each entity (e.g., Person, Organization, Location, Concept).
+       - Note any relevant properties for each entity.
+    
+    4. Identify relationships between entities:
+       - Look for verbs or phrases that connect entities.
+       - Determine the type of relationship (e.g., "works for", "located in", "part of").
+       - Note any relevant properties for each relationship.
+       - Relationships should have a verbal phrase as an example (nacio) + prepositional phrase (EnCiudad) -> nacioenCiudad
+    
+    5. After your analysis, provide your output in the following JSON format, enclosed in triple backticks ():
+    
+    json
+    {{
+      "entities": [
+        {{
+          "name": "Entity Name",
+          "type": "Entity Type",
+          "properties": {{}}
+        }}
+      ],
+      "relationships": [
+        {{
+          "source_name": "Source Entity Name",
+          "target_name": "Target Entity Name",
+          "type": "Relationship Type",
+          "properties": {{}}
+        }}
+      ]
+    }}
+    ```
+    
+    Remember:
+    - Entity names should be consistent throughout the JSON.
+    - Include all relevant entities and relationships you've identified.
+    - If there are no properties for an entity or relationship, leave the "properties" object empty.
+    - Ensure your JSON is properly formatted and valid.
+    
+    Begin your analysis now, starting with the <reasoning> section, followed by your JSON output.
+    """
+
+PACKED_EXTRACTION_PROMPT = """
+    You are tasked with extracting entities and relationships from several independent text chunks. Each chunk is enclosed in a <chunk> tag with an id:
+
+    {chunks}
+
+    For each chunk separately:
+
+    1. Identify and categorize entities:
+       - Look for proper nouns, important concepts, or recurring themes.
+       - Determine a suitable type for each entity (e.g., Person, Organization, Location, Concept).
+       - Note any relevant properties for each entity.
+
+    2. Identify relationships between entities of that chunk:
+       - Look for verbs or phrases that connect entities.
+       - Determine the type of relationship (e.g., "works for", "located in", "part of").
+       - Note any relevant properties for each relationship.
+       - Relationships should have a verbal phrase as an example (nacio) + prepositional phrase (EnCiudad) -> nacioenCiudad
+
+    Respond only with a JSON object with one entry per chunk id, in this format:
+
+    {{
+      "chunks": {{
+        "1": {{
+          "entities": [
+            {{
+              "name": "Entity Name",
+              "type": "Entity Type",
+              "properties": {{}}
+            }}
+          ],
+          "relationships": [
+            {{
+              "source_name": "Source Entity Name",
+              "target_name": "Target Entity Name",
+              "type": "Relationship Type",
+              "properties": {{}}
+            }}
+          ]
+        }}
+      }}
+    }}
+
+    Remember:
+    - Include every chunk id, with empty lists if a chunk has no entities.
+    - Only use information from the chunk itself; relationships never connect entities of different chunks.
+    - Entity names should be consistent within each chunk.
+    - If there are no properties for an entity or relationship, leave the "properties" object empty.
+    """
+
+
+# Chunk start offset in the text, chunk text and, if already known, its embedding
+_Piece = tuple[int | None, str, list[float] | None]
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.?!])\s+")
+
+_JSON_BLOCK = re.compile(r"```(?:json)?\s*([\s\S]*?)```", re.IGNORECASE)
+_JSON_DECODER = json.JSONDecoder()
+
+_worker_processor = None
+
+
+def _init_chunk_worker(config: ETLConfig, encodings: dict[str, Any]) -> None:
+    global _worker_processor
+    # Spawned processes do not inherit the encodings set in the parent
+    for model, encoding in encodings.items():
+        set_encoding(model, encoding)
+    _worker_processor = TextProcessor(config)
+
+
+def _chunk_in_worker(document: Document) -> ChunkBatch:
+    # Sent back as NumPy arrays instead of pickling one model per chunk
+    return ChunkBatch.from_chunks(list(_worker_processor.iter_chunks(document)))
 
 
 class TextProcessor:
-    def __init__(self, config: ETLConfig):
+    """
+    Divide los documentos en chunks según `ChunkConfig`.
+
+    El splitter se construye una sola vez. La estrategia "token" codifica cada
+    documento una vez con el tokenizador del modelo de embeddings y corta la
+    secuencia de tokens en ventanas de `size` tokens solapadas `overlap`
+    tokens. Cada chunk guarda su posición en el documento (`start_index` y
+    `end_index`, en caracteres).
+
+    Con `ChunkConfig.processes` mayor que 1, `create_chunks` y
+    `create_chunks_many` trocean los documentos en un pool de procesos, de
+    modo que el chunking escala con los núcleos disponibles.
+    """
+
+    def __init__(
+        self, config: ETLConfig, embedding_generator: "EmbeddingGenerator" = None
+    ):
         self.config = config
+        if (
+            config.chunk_config.strategy != "semantic"
+            and config.chunk_config.overlap >= config.chunk_config.size
+        ):
+            raise ValueError("ChunkConfig.overlap debe ser menor que ChunkConfig.size")
+        self.splitter = self._build_splitter()
+        self.embedding_generator = (
+            embedding_generator or EmbeddingGenerator(config)
+            if config.chunk_config.strategy == "semantic"
+            else embedding_generator
+        )
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _build_splitter(self):
+        chunk_config = self.config.chunk_config
+        if chunk_config.strategy == "recursive":
+            return RecursiveCharacterTextSplitter(
+                chunk_size=chunk_config.size,
+                chunk_overlap=chunk_config.overlap,
+                length_function=len,
+                is_separator_regex=False,
+            )
+        if chunk_config.strategy == "character":
+            return CharacterTextSplitter(
+                separator="\n\n",
+                chunk_size=chunk_config.size,
+                chunk_overlap=chunk_config.overlap,
+                length_function=len,
+                is_separator_regex=False,
+            )
+        if chunk_config.strategy == "semantic":
+            # Only cuts the sentences longer than `size`; see _split_semantic
+            return RecursiveCharacterTextSplitter(
+                chunk_size=chunk_config.size,
+                chunk_overlap=0,
+                length_function=len,
+                is_separator_regex=False,
+            )
+        if chunk_config.strategy in ("token", "tiktoken"):
+            # This strategy is implemented in _split
+            return None
+        raise ValueError(f"Estrategia de chunking desconocida: {chunk_config.strategy}")
 
     @staticmethod
     def process(document: Document) -> Document:
@@ -29,160 +245,848 @@ class TextProcessor:
         return document
 
     def create_chunks(self, document: Document) -> list[TextChunk]:
-        text = document.content
-        chunks = []
+        executor = self._get_executor()
+        if executor is None or document.streamed:
+            return list(self.iter_chunks(document))
+        return executor.submit(_chunk_in_worker, document).result().to_chunks()
 
-        if self.config.chunk_config.strategy == "recursive":
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=self.config.chunk_config.size,
-                chunk_overlap=self.config.chunk_config.overlap,
-                length_function=len,
-                is_separator_regex=False,
-            )
-            chunks = text_splitter.create_documents([text])
+    def create_chunks_many(
+        self, documents: Iterable[Document]
+    ) -> Iterator[list[TextChunk]]:
+        """
+        Divide varios documentos en chunks y devuelve sus listas en el mismo
+        orden. Con un pool de procesos mantiene como mucho 4 documentos por
+        proceso en curso, para no cargar toda la entrada en memoria.
+        """
+        executor = self._get_executor()
+        if executor is None:
+            for document in documents:
+                yield list(self.iter_chunks(document))
+            return
 
-        elif self.config.chunk_config.strategy == "character":
-            text_splitter = CharacterTextSplitter(
-                separator="\n\n",
-                chunk_size=self.config.chunk_config.size,
-                chunk_overlap=self.config.chunk_config.overlap,
-                length_function=len,
-                is_separator_regex=False,
+        pending = collections.deque()
+        for document in documents:
+            pending.append(executor.submit(_chunk_in_worker, document))
+            if len(pending) >= 4 * self.config.chunk_config.processes:
+                yield pending.popleft().result().to_chunks()
+        while pending:
+            yield pending.popleft().result().to_chunks()
+
+    def _get_executor(self) -> ProcessPoolExecutor | None:
+        if self.config.chunk_config.processes <= 1:
+            return None
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.config.chunk_config.processes,
+                    # Forking a process that already runs pipeline threads is unsafe
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_chunk_worker,
+                    initargs=(self.config, registered_encodings()),
+                )
+            return self._executor
+
+    def close(self) -> None:
+        """
+        Detiene el pool de procesos de chunking, si se creó.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def iter_chunks(self, document: Document) -> Iterator[TextChunk]:
+        """
+        Genera los chunks de un documento en orden.
+
+        Los documentos `streamed` se leen del fichero por ventanas: cada ventana
+        se trocea junto con el último chunk de la anterior, que se retiene por si
+        continúa en la ventana siguiente.
+        """
+        if document.streamed:
+            windows = iter_text_windows(
+                Path(document.path), self.config.source_config.window_size
             )
-            chunks = text_splitter.create_documents([text])
+            pieces = self._split_windows(windows)
+        else:
+            pieces = self._split(document.content)
 
-        elif self.config.chunk_config.strategy == "semantic":
-            text_splitter = SemanticChunker(
-                OpenAIEmbeddings(model=self.config.embedding_config.model)
+        for index, (start, text, embedding) in enumerate(pieces):
+            chunk = TextChunk(
+                content=text,
+                document_id=document.id,
+                embedding=embedding,
+                start_index=start,
+                end_index=None if start is None else start + len(text),
             )
-            chunks = text_splitter.create_documents([text])
+            # Deterministic ids let incremental and resumed runs address the
+            # chunks already loaded
+            chunk.id = stable_id(document.id, str(index), text)
+            yield chunk
+
+    def _split_windows(self, windows: Iterator[str]) -> Iterator[_Piece]:
+        # `base` is the offset in the file of the text being split
+        carry, base = "", 0
+        for window in windows:
+            text = carry + window
+            pieces = self._split(text)
+            carry, carry_start = "", len(text)
+            if pieces:
+                start, piece, _ = pieces.pop()
+                carry = piece if start is None else text[start:]
+                carry_start = len(text) - len(carry) if start is None else start
+            for start, piece, embedding in pieces:
+                yield None if start is None else base + start, piece, embedding
+            base += carry_start
+        for start, piece, embedding in self._split(carry):
+            yield None if start is None else base + start, piece, embedding
+
+    def split_text(self, text: str) -> list[str]:
+        return [piece for _, piece, _ in self._split(text)]
+
+    def split_with_offsets(self, text: str) -> list[tuple[int | None, str]]:
+        """
+        Divide el texto y devuelve cada chunk junto con su posición inicial en
+        caracteres, o None si el splitter alteró el texto y no se puede
+        localizar.
+        """
+        return [(start, piece) for start, piece, _ in self._split(text)]
+
+    def _split(self, text: str) -> list[_Piece]:
+        strategy = self.config.chunk_config.strategy
+        if strategy == "semantic":
+            return self._split_semantic(text)
+        if strategy in ("token", "tiktoken"):
+            return self._split_tokens(text)
+
+        located, search_from = [], 0
+        for piece in self.splitter.split_text(text):
+            # A chunk overlaps the previous one by at most `overlap` characters,
+            # so the search starts there instead of rescanning the text
+            start = text.find(piece, search_from)
+            if start >= 0:
+                search_from = max(
+                    start + 1, start + len(piece) - self.config.chunk_config.overlap
+                )
+            located.append((start if start >= 0 else None, piece, None))
+        return located
 
-        elif self.config.chunk_config.strategy == "tiktoken":
-            text_splitter = CharacterTextSplitter.from_tiktoken_encoder(
-                encoding_name="cl100k_base",
-                chunk_size=self.config.chunk_size,
-                chunk_overlap=self.config.chunk_overlap,
+    def _split_semantic(self, text: str) -> list[_Piece]:
+        """
+        Agrupa frases consecutivas y corta donde cambia el tema: donde la
+        distancia coseno entre el contexto de una frase y el de la siguiente
+        supera el percentil `breakpoint_percentile`, o donde el chunk superaría
+        `size` caracteres. Una frase de más de `size` caracteres se corta antes
+        con el splitter recursivo, así que ningún chunk supera `size`.
+
+        Las frases se embeben una sola vez; el contexto de cada frase es la
+        media de sus embeddings vecinos (`sentence_buffer` a cada lado). Con
+        `chunk_embeddings="pooled"` el embedding de cada chunk es la media de
+        los de sus frases, ponderada por longitud, y la etapa de embeddings no
+        vuelve a enviar su texto a la API.
+        """
+        chunk_config = self.config.chunk_config
+        breaks = [match.span() for match in _SENTENCE_BREAK.finditer(text)]
+        bounds = []
+        for start, end in zip(
+            [0] + [end for _, end in breaks],
+            [start for start, _ in breaks] + [len(text)],
+        ):
+            if not text[start:end].strip():
+                continue
+            if end - start > chunk_config.size:
+                bounds.extend(self._split_sentence(text, start, end))
+            else:
+                bounds.append((start, end))
+        if not bounds:
+            return []
+
+        vectors = np.asarray(
+            self.embedding_generator.embed_texts(
+                [text[start:end] for start, end in bounds]
+            ),
+            dtype=np.float32,
+        )
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        breakpoints = np.zeros(len(bounds), dtype=bool)
+        if len(bounds) > 1:
+            # Sliding-window mean of the sentence vectors via cumulative sums
+            buffer = chunk_config.sentence_buffer
+            cumulative = np.vstack(
+                [np.zeros((1, vectors.shape[1]), np.float32), vectors.cumsum(axis=0)]
             )
-            chunks = text_splitter.split_text(text)
+            index = np.arange(len(bounds))
+            lower = np.maximum(index - buffer, 0)
+            upper = np.minimum(index + buffer + 1, len(bounds))
+            context = (cumulative[upper] - cumulative[lower]) / (upper - lower)[:, None]
+            context /= np.maximum(np.linalg.norm(context, axis=1, keepdims=True), 1e-12)
+            distances = 1.0 - np.einsum("ij,ij->i", context[:-1], context[1:])
+            threshold = np.percentile(distances, chunk_config.breakpoint_percentile)
+            breakpoints[:-1] = distances > threshold
 
-        return [
-            TextChunk(
-                content=chunk.page_content,
-                metadata=chunk.metadata,
-                document_id=document.id,
+        lengths = np.array([end - start for start, end in bounds], dtype=np.float32)
+        pieces, first = [], 0
+        for last in range(len(bounds)):
+            at_end = last + 1 == len(bounds)
+            too_long = (
+                not at_end
+                and bounds[last + 1][1] - bounds[first][0] > chunk_config.size
             )
-            for chunk in chunks
-        ]
+            if not (at_end or breakpoints[last] or too_long):
+                continue
+            start, end = bounds[first][0], bounds[last][1]
+            embedding = None
+            if chunk_config.chunk_embeddings == "pooled":
+                pooled = lengths[first : last + 1] @ vectors[first : last + 1]
+                embedding = (pooled / max(np.linalg.norm(pooled), 1e-12)).tolist()
+            pieces.append((start, text[start:end], embedding))
+            first = last + 1
+        return pieces
+
+    def _split_sentence(self, text: str, start: int, end: int) -> list[tuple[int, int]]:
+        """
+        Corta la frase `text[start:end]` en trozos de como mucho `size`
+        caracteres y devuelve sus posiciones en `text`.
+        """
+        bounds, search_from = [], start
+        for piece in self.splitter.split_text(text[start:end]):
+            # Without overlap the pieces appear in order and do not overlap
+            piece_start = text.find(piece, search_from, end)
+            bounds.append((piece_start, piece_start + len(piece)))
+            search_from = piece_start + len(piece)
+        return bounds
+
+    def _split_tokens(self, text: str) -> list[_Piece]:
+        chunk_config = self.config.chunk_config
+        encoding = get_encoding(self.config.embedding_config.model)
+        tokens = encoding.encode_ordinary(text)
+        if not tokens:
+            return []
+        # Character offset of every token, so chunks are sliced from the
+        # original text instead of decoding each token window
+        _, offsets = encoding.decode_with_offsets(tokens)
+
+        pieces = []
+        step = chunk_config.size - chunk_config.overlap
+        for start in range(0, len(tokens), step):
+            end = start + chunk_config.size
+            char_start = offsets[start]
+            char_end = offsets[end] if end < len(tokens) else len(text)
+            pieces.append((char_start, text[char_start:char_end], None))
+            if end >= len(tokens):
+                break
+        return pieces
 
 
 class EmbeddingGenerator:
     def __init__(self, config: ETLConfig):
         self.config = config
-        self.model = OpenAIEmbeddings(model=self.config.embedding_config.model)
+        self.model = OpenAIEmbeddings(
+            model=self.config.embedding_config.model,
+            chunk_size=self.config.embedding_config.batch_size,
+            # Retries are handled by the rate limiter
+            max_retries=0,
+        )
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=config.embedding_config.requests_per_minute,
+            tokens_per_minute=config.embedding_config.tokens_per_minute,
+            max_retries=config.embedding_config.max_retries,
+        )
+        self.cache = (
+            EmbeddingCache(
+                config.embedding_config.cache_path,
+                max_entries=config.embedding_config.cache_max_entries,
+            )
+            if config.embedding_config.cache_path
+            else None
+        )
 
     def generate(self, chunk: TextChunk) -> list[float]:
-        return self.model.embed_query(chunk.content)
+        return self.generate_batch([chunk])[0]
+
+    def generate_batch(self, chunks: list[TextChunk]) -> list[list[float]]:
+        """
+        Genera los embeddings de varios chunks con `embed_documents`, una petición
+        por lote de `iter_batches`.
+
+        Si hay caché configurada solo se envían a la API los textos que no están
+        en ella, y los embeddings nuevos se guardan en la caché.
+
+        Returns:
+            list[list[float]]: Un embedding por chunk, en el mismo orden de entrada.
+        """
+        return self.embed_texts([chunk.content for chunk in chunks])
+
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        """
+        Igual que `generate_batch`, pero a partir de los textos.
+        """
+        keys, embeddings = self._from_cache(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            new_embeddings = self._embed_texts([texts[i] for i in missing])
+            self._fill(embeddings, keys, missing, new_embeddings)
+        return embeddings
+
+    async def agenerate_batch(
+        self, chunks: list[TextChunk], semaphore: asyncio.Semaphore | None = None
+    ) -> list[list[float]]:
+        """
+        Versión asíncrona de `generate_batch`: los lotes se envían a la vez con
+        `aembed_documents`, limitados por `semaphore` si se indica.
+        """
+        return await self.aembed_texts([chunk.content for chunk in chunks], semaphore)
+
+    async def aembed_texts(
+        self, texts: list[str], semaphore: asyncio.Semaphore | None = None
+    ) -> list[list[float]]:
+        keys, embeddings = self._from_cache(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            new_embeddings = await self._aembed_texts(
+                [texts[i] for i in missing], semaphore
+            )
+            self._fill(embeddings, keys, missing, new_embeddings)
+        return embeddings
+
+    def _from_cache(
+        self, texts: list[str]
+    ) -> tuple[list[str] | None, list[list[float] | None]]:
+        if self.cache is None:
+            return None, [None] * len(texts)
+
+        embedding_config = self.config.embedding_config
+        keys = [
+            EmbeddingCache.make_key(
+                text, embedding_config.model, embedding_config.dimension
+            )
+            for text in texts
+        ]
+        cached = self.cache.get_many(keys)
+        return keys, [cached.get(key) for key in keys]
+
+    def _fill(
+        self,
+        embeddings: list[list[float] | None],
+        keys: list[str] | None,
+        missing: list[int],
+        new_embeddings: list[list[float]],
+    ) -> None:
+        for i, embedding in zip(missing, new_embeddings):
+            embeddings[i] = embedding
+        if self.cache is not None:
+            self.cache.put_many({keys[i]: embeddings[i] for i in missing})
+
+    def _embed_texts(self, texts: list[str]) -> list[list[float]]:
+        embeddings = []
+        for batch, n_tokens in self._iter_token_batches(texts):
+            embeddings.extend(
+                self.rate_limiter.call(
+                    self.model.embed_documents,
+                    batch,
+                    chunk_size=self.config.embedding_config.batch_size,
+                    tokens=n_tokens,
+                )
+            )
+        return embeddings
+
+    async def _aembed_texts(
+        self, texts: list[str], semaphore: asyncio.Semaphore | None
+    ) -> list[list[float]]:
+        async def embed(batch: list[str], n_tokens: int) -> list[list[float]]:
+            async with semaphore or contextlib.nullcontext():
+                return await self.rate_limiter.acall(
+                    self.model.aembed_documents,
+                    batch,
+                    chunk_size=self.config.embedding_config.batch_size,
+                    tokens=n_tokens,
+                )
+
+        batches = await asyncio.gather(
+            *(embed(batch, n) for batch, n in self._iter_token_batches(texts))
+        )
+        return [embedding for batch in batches for embedding in batch]
+
+    def iter_batches(self, texts: list[str]) -> Iterator[list[str]]:
+        """
+        Agrupa los textos en lotes consecutivos que respetan los límites por
+        petición de `EmbeddingConfig` (`batch_size` entradas y
+        `max_tokens_per_request` tokens). Un texto que supera por sí solo el
+        presupuesto de tokens se envía en un lote propio.
+        """
+        for batch, _ in self._iter_token_batches(texts):
+            yield batch
+
+    def _iter_token_batches(self, texts: list[str]) -> Iterator[tuple[list[str], int]]:
+        embedding_config = self.config.embedding_config
+        token_counts = count_tokens_batch(texts, embedding_config.model)
+
+        batch, batch_tokens = [], 0
+        for text, n_tokens in zip(texts, token_counts):
+            if batch and (
+                len(batch) >= embedding_config.batch_size
+                or batch_tokens + n_tokens > embedding_config.max_tokens_per_request
+            ):
+                yield batch, batch_tokens
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += n_tokens
+        if batch:
+            yield batch, batch_tokens
 
 
 class EntityRelationExtractor:
+    """
+    Extrae entidades y relaciones de los chunks con el LLM de `OpenAIConfig`.
+
+    Por defecto envía una petición por chunk con `EXTRACTION_PROMPT`. Con
+    `OpenAIConfig.pack_tokens` mayor que cero empaqueta varios chunks por
+    petición con `PACKED_EXTRACTION_PROMPT`, hasta ese presupuesto de tokens de
+    texto y `pack_max_chunks` chunks, de modo que las instrucciones se envían
+    una vez por paquete y no una vez por chunk. La respuesta es un objeto JSON
+    con un resultado por id de chunk, pedido en el modo JSON de OpenAI si
+    `json_mode` está activo; los chunks cuyo resultado falta o no es válido se
+    extraen de nuevo uno a uno.
+
+    Un fallo solo afecta a su chunk: las llamadas que fallan o cuya respuesta
+    no se puede leer se reintentan, solas, hasta `extraction_retries` veces, y
+    después el chunk queda sin entidades y con el error en
+    `ExtractionResult.error`, sin perder los demás resultados del lote.
+    """
+
     def __init__(self, config: ETLConfig):
         self.config = config
-        self.llm = ChatOpenAI(model_name=config.llm_config.model)
-        self.parser = RunnableLambda(
-            lambda x: ExtractionResult(
-                **json.loads(
-                    re.search(
-                        r"```\s*json\s*([\s\S]*?)```", x.content, re.DOTALL
-                    ).group(1)
+        self.llm = ChatOpenAI(
+            model_name=config.llm_config.model,
+            # Retries are handled by the rate limiter, which also reads the
+            # x-ratelimit-* headers of each response
+            max_retries=0,
+            include_response_headers=True,
+        )
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=config.llm_config.requests_per_minute,
+            tokens_per_minute=config.llm_config.tokens_per_minute,
+            max_retries=config.llm_config.max_retries,
+        )
+        self.parser = RunnableLambda(self.parse_result)
+        self.packed = config.llm_config.pack_tokens > 0
+        self.prompt_hash = content_hash(
+            config.llm_config.prompt_version,
+            PACKED_EXTRACTION_PROMPT if self.packed else EXTRACTION_PROMPT,
+        )
+        self.cache = (
+            ExtractionCache(config.llm_config.cache_path)
+            if config.llm_config.cache_path
+            else None
+        )
+
+    @staticmethod
+    def link_relationships(result: ExtractionResult) -> ExtractionResult:
+        """
+        Completa los ids de origen y destino de las relaciones a partir de los
+        nombres de las entidades del mismo resultado.
+        """
+        # First entity with each name, as the relationships refer to names
+        entity_ids = {}
+        for entity in result.entities:
+            entity_ids.setdefault(entity.name, entity.id)
+        updated_relationships = []
+        for relationship in result.relationships:
+            source_id = entity_ids.get(relationship.source_name)
+            target_id = entity_ids.get(relationship.target_name)
+            if source_id and target_id:
+                updated_relationship = relationship.model_copy(
+                    update={"source_id": source_id, "target_id": target_id}
                 )
-            )
+            else:
+                updated_relationship = relationship
+            updated_relationships.append(updated_relationship)
+        return ExtractionResult(
+            entities=result.entities, relationships=updated_relationships
         )
 
-    def extract_chain(self):
-        prompt = ChatPromptTemplate.from_template(
-            """
-            You are tasked with extracting entities and relationships from a given text. Here is the text you will analyze:
-            
-            <text>
-            {text}
-            </text>
-            
-            Your goal is to identify entities and their relationships within this text, and then present them in a specific JSON format. Follow these steps:
-            
-            1. Carefully read and analyze the text.
-            
-            2. In a <reasoning> section, think through the entities you've identified. Consider which mentions might refer to the same entity and how you can consolidate them.
-            
-            3. Identify and categorize entities:
-               - Look for proper nouns, important concepts, or recurring themes.
-               - Determine a suitable type for each entity (e.g., Person, Organization, Location, Concept).
-               - Note any relevant properties for each entity.
-            
-            4. Identify relationships between entities:
-               - Look for verbs or phrases that connect entities.
-               - Determine the type of relationship (e.g., "works for", "located in", "part of").
-               - Note any relevant properties for each relationship.
-               - Relationships should have a verbal phrase as an example (nacio) + prepositional phrase (EnCiudad) -> nacioenCiudad
-            
-            5. After your analysis, provide your output in the following JSON format, enclosed in triple backticks ():
-            
-            json
-            {{
-              "entities": [
-                {{
-                  "name": "Entity Name",
-                  "type": "Entity Type",
-                  "properties": {{}}
-                }}
-              ],
-              "relationships": [
-                {{
-                  "source_name": "Source Entity Name",
-                  "target_name": "Target Entity Name",
-                  "type": "Relationship Type",
-                  "properties": {{}}
-                }}
-              ]
-            }}
-            ```
-            
-            Remember:
-            - Entity names should be consistent throughout the JSON.
-            - Include all relevant entities and relationships you've identified.
-            - If there are no properties for an entity or relationship, leave the "properties" object empty.
-            - Ensure your JSON is properly formatted and valid.
-            
-            Begin your analysis now, starting with the <reasoning> section, followed by your JSON output.
-            """
-        )
-
-        def update_relationships(result: ExtractionResult):
-            updated_relationships = []
-            for relationship in result.relationships:
-                source_entity = next(
-                    (e for e in result.entities if e.name == relationship.source_name),
-                    None,
+    @staticmethod
+    def load_json(content: str) -> Any:
+        """
+        Lee el objeto JSON de una respuesta: el del bloque ```json``` si lo hay
+        o, si no, el primero del contenido. Se ignora el texto que el modelo
+        añada antes o después del objeto.
+
+        Raises:
+            ValueError: Si la respuesta no contiene un objeto JSON válido.
+        """
+        match = _JSON_BLOCK.search(content)
+        text = match.group(1) if match else content
+        start = text.find("{")
+        if start < 0:
+            raise ValueError("La respuesta no contiene un objeto JSON")
+        return _JSON_DECODER.raw_decode(text, start)[0]
+
+    def parse_result(self, message) -> ExtractionResult:
+        return self.link_relationships(
+            ExtractionResult(**self.load_json(message.content))
+        )
+
+    def parse_packed(self, message) -> dict[str, ExtractionResult]:
+        """
+        Lee la respuesta de un paquete de chunks. Devuelve los resultados
+        válidos por id de chunk; los que faltan o no son válidos se omiten.
+        """
+        try:
+            chunks = self.load_json(message.content)["chunks"]
+            chunks.items()
+        except (ValueError, KeyError, AttributeError) as e:
+            logger.warning(f"Respuesta de extracción empaquetada no válida: {e}")
+            return {}
+        results = {}
+        for chunk_id, chunk_data in chunks.items():
+            try:
+                results[str(chunk_id)] = self.link_relationships(
+                    ExtractionResult(**chunk_data)
                 )
-                target_entity = next(
-                    (e for e in result.entities if e.name == relationship.target_name),
-                    None,
+            except (ValidationError, TypeError) as e:
+                logger.warning(f"Resultado no válido para el chunk {chunk_id}: {e}")
+        return results
+
+    def _chain(
+        self,
+        template: str,
+        parser: RunnableLambda,
+        semaphore: asyncio.Semaphore | None = None,
+        json_mode: bool = False,
+    ):
+        prompt = ChatPromptTemplate.from_template(template)
+        llm = (
+            self.llm.bind(response_format={"type": "json_object"})
+            if json_mode
+            else self.llm
+        )
+
+        def call_llm(inputs: dict):
+            prompt_value = prompt.invoke(inputs)
+            tokens = self._estimate_tokens(prompt_value, inputs.get("n_chunks", 1))
+            response = self.rate_limiter.call(llm.invoke, prompt_value, tokens=tokens)
+            self._observe_response(response, tokens)
+            return response
+
+        async def acall_llm(inputs: dict):
+            prompt_value = prompt.invoke(inputs)
+            tokens = self._estimate_tokens(prompt_value, inputs.get("n_chunks", 1))
+            async with semaphore or contextlib.nullcontext():
+                response = await self.rate_limiter.acall(
+                    llm.ainvoke, prompt_value, tokens=tokens
                 )
-                if source_entity and target_entity:
-                    updated_relationship = relationship.model_copy(
-                        update={
-                            "source_id": source_entity.id,
-                            "target_id": target_entity.id,
-                        }
-                    )
+            self._observe_response(response, tokens)
+            return response
+
+        return RunnableLambda(call_llm, afunc=acall_llm) | parser
+
+    def extract_chain(self, semaphore: asyncio.Semaphore | None = None):
+        return self._chain(EXTRACTION_PROMPT, self.parser, semaphore)
+
+    def packed_chain(self, semaphore: asyncio.Semaphore | None = None):
+        return self._chain(
+            PACKED_EXTRACTION_PROMPT,
+            RunnableLambda(self.parse_packed),
+            semaphore,
+            json_mode=self.config.llm_config.json_mode,
+        )
+
+    def _estimate_tokens(self, prompt_value, n_chunks: int = 1) -> int:
+        return (
+            count_tokens(prompt_value.to_string(), self.config.llm_config.model)
+            + self.config.llm_config.expected_output_tokens * n_chunks
+        )
+
+    def _observe_response(self, response, estimated_tokens: int) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            self.rate_limiter.settle(estimated_tokens, usage["total_tokens"])
+        headers = response.response_metadata.get("headers")
+        if headers:
+            self.rate_limiter.update_from_headers(headers)
+
+    def pack_texts(self, texts: list[str]) -> list[list[int]]:
+        """
+        Agrupa los textos, en orden, en paquetes de hasta
+        `OpenAIConfig.pack_tokens` tokens y `pack_max_chunks` textos. Un texto
+        que supera por sí solo el presupuesto forma su propio paquete.
+
+        Returns:
+            list[list[int]]: Índices de los textos de cada paquete.
+        """
+        llm_config = self.config.llm_config
+        token_counts = count_tokens_batch(texts, llm_config.model)
+        packs, pack, pack_tokens = [], [], 0
+        for index, n_tokens in enumerate(token_counts):
+            if pack and (
+                len(pack) >= llm_config.pack_max_chunks
+                or pack_tokens + n_tokens > llm_config.pack_tokens
+            ):
+                packs.append(pack)
+                pack, pack_tokens = [], 0
+            pack.append(index)
+            pack_tokens += n_tokens
+        if pack:
+            packs.append(pack)
+        return packs
+
+    @staticmethod
+    def _pack_input(texts: list[str], pack: list[int]) -> dict:
+        # Short positional ids keep the response small; they map back by order
+        chunks = "\n".join(
+            f'<chunk id="{position}">\n{texts[index]}\n</chunk>'
+            for position, index in enumerate(pack, start=1)
+        )
+        return {"chunks": chunks, "n_chunks": len(pack)}
+
+    @staticmethod
+    def _unpack(
+        pack: list[int], output: dict[str, ExtractionResult] | Exception
+    ) -> tuple[list[tuple[int, ExtractionResult]], list[int]]:
+        """
+        Separa la respuesta de un paquete en los resultados válidos, con el
+        índice de su texto, y los índices de los textos sin resultado.
+        """
+        if isinstance(output, Exception):
+            logger.warning(f"Error en la extracción empaquetada: {output}")
+            return [], list(pack)
+        done, missing = [], []
+        for position, index in enumerate(pack, start=1):
+            result = output.get(str(position))
+            if result is None:
+                missing.append(index)
+            else:
+                done.append((index, result))
+        return done, missing
+
+    def _failed_result(self, error: Exception) -> ExtractionResult:
+        attempts = self.config.llm_config.extraction_retries + 1
+        logger.error(
+            f"Extracción de un chunk fallida tras {attempts} intentos: {error}"
+        )
+        return ExtractionResult.from_error(error)
+
+    def _iter_extract_texts(
+        self, texts: list[str]
+    ) -> Iterator[tuple[int, ExtractionResult]]:
+        """
+        Extrae los textos y entrega cada resultado, con el índice de su texto,
+        en cuanto termina su llamada al LLM.
+        """
+        batch_config = {"max_concurrency": self.config.max_concurrency}
+        failed = list(range(len(texts)))
+        if self.packed:
+            packs = self.pack_texts(texts)
+            failed = []
+            for pack_index, output in self.packed_chain().batch_as_completed(
+                [self._pack_input(texts, pack) for pack in packs],
+                config=batch_config,
+                return_exceptions=True,
+            ):
+                done, missing = self._unpack(packs[pack_index], output)
+                yield from done
+                failed.extend(missing)
+            self._log_unpacked(failed, len(texts))
+
+        errors = {}
+        for attempt in range(self.config.llm_config.extraction_retries + 1):
+            if not failed:
+                return
+            self._log_retry(attempt, failed)
+            indices, failed = failed, []
+            for position, output in self.extract_chain().batch_as_completed(
+                [{"text": texts[index]} for index in indices],
+                config=batch_config,
+                return_exceptions=True,
+            ):
+                if isinstance(output, Exception):
+                    errors[indices[position]] = output
+                    failed.append(indices[position])
+                else:
+                    yield indices[position], output
+        for index in failed:
+            yield index, self._failed_result(errors[index])
+
+    async def _aiter_extract_texts(
+        self, texts: list[str], semaphore: asyncio.Semaphore | None
+    ) -> AsyncIterator[tuple[int, ExtractionResult]]:
+        """
+        Versión asíncrona de `_iter_extract_texts`.
+        """
+        failed = list(range(len(texts)))
+        if self.packed:
+            packs = self.pack_texts(texts)
+            failed = []
+            async for pack_index, output in self.packed_chain(
+                semaphore
+            ).abatch_as_completed(
+                [self._pack_input(texts, pack) for pack in packs],
+                return_exceptions=True,
+            ):
+                done, missing = self._unpack(packs[pack_index], output)
+                for item in done:
+                    yield item
+                failed.extend(missing)
+            self._log_unpacked(failed, len(texts))
+
+        errors = {}
+        for attempt in range(self.config.llm_config.extraction_retries + 1):
+            if not failed:
+                return
+            self._log_retry(attempt, failed)
+            indices, failed = failed, []
+            async for position, output in self.extract_chain(
+                semaphore
+            ).abatch_as_completed(
+                [{"text": texts[index]} for index in indices], return_exceptions=True
+            ):
+                if isinstance(output, Exception):
+                    errors[indices[position]] = output
+                    failed.append(indices[position])
                 else:
-                    updated_relationship = relationship
-                updated_relationships.append(updated_relationship)
-            return ExtractionResult(
-                entities=result.entities, relationships=updated_relationships
+                    yield indices[position], output
+        for index in failed:
+            yield index, self._failed_result(errors[index])
+
+    @staticmethod
+    def _log_unpacked(failed: list[int], n_texts: int) -> None:
+        if failed:
+            logger.warning(
+                f"{len(failed)} de {n_texts} chunks sin resultado válido en la "
+                "extracción empaquetada; se extraen de uno en uno"
+            )
+
+    @staticmethod
+    def _log_retry(attempt: int, failed: list[int]) -> None:
+        if attempt:
+            logger.warning(
+                f"Reintentando la extracción de {len(failed)} chunks "
+                f"(intento {attempt + 1})"
             )
 
-        return prompt | self.llm | self.parser | RunnableLambda(update_relationships)
+    def iter_extract(
+        self, chunks: list[TextChunk]
+    ) -> Iterator[tuple[int, ExtractionResult]]:
+        """
+        Extrae entidades y relaciones de los chunks y entrega cada resultado,
+        con la posición de su chunk, en cuanto está listo: primero los de la
+        caché y después los del LLM según terminan sus llamadas, de modo que
+        se pueden procesar sin esperar al lote completo.
+
+        Los chunks con texto idéntico se extraen una sola vez. Los chunks cuya
+        extracción falla tras los reintentos se entregan con
+        `ExtractionResult.error`.
+        """
+        text_hashes, results, missing = self._from_cache(chunks)
+        positions = self._positions(text_hashes)
+        for text_hash, result in results.items():
+            for position in positions[text_hash]:
+                yield position, result
+
+        missing_hashes = list(missing)
+        new_results = {}
+        try:
+            for index, result in self._iter_extract_texts(
+                [chunk.content for chunk in missing.values()]
+            ):
+                new_results[missing_hashes[index]] = result
+                for position in positions[missing_hashes[index]]:
+                    yield position, result
+        finally:
+            self._store(new_results)
+
+    async def aiter_extract(
+        self, chunks: list[TextChunk], semaphore: asyncio.Semaphore | None = None
+    ) -> AsyncIterator[tuple[int, ExtractionResult]]:
+        """
+        Versión asíncrona de `iter_extract`. Si se indica `semaphore`, limita el
+        número de llamadas al LLM en curso.
+        """
+        text_hashes, results, missing = self._from_cache(chunks)
+        positions = self._positions(text_hashes)
+        for text_hash, result in results.items():
+            for position in positions[text_hash]:
+                yield position, result
+
+        missing_hashes = list(missing)
+        new_results = {}
+        try:
+            async for index, result in self._aiter_extract_texts(
+                [chunk.content for chunk in missing.values()], semaphore
+            ):
+                new_results[missing_hashes[index]] = result
+                for position in positions[missing_hashes[index]]:
+                    yield position, result
+        finally:
+            self._store(new_results)
+
+    @staticmethod
+    def _positions(text_hashes: list[str]) -> dict[str, list[int]]:
+        positions = collections.defaultdict(list)
+        for position, text_hash in enumerate(text_hashes):
+            positions[text_hash].append(position)
+        return positions
 
     def extract(self, chunks: list[TextChunk]) -> list[ExtractionResult]:
-        chain = self.extract_chain()
-        return chain.batch([{"text": chunk.content} for chunk in chunks])
+        """
+        Extrae entidades y relaciones de los chunks, un resultado por chunk.
+
+        Los chunks con texto idéntico se extraen una sola vez. Si hay caché
+        configurada, los chunks cuyo texto ya se extrajo con el mismo modelo y
+        versión del prompt no se envían al LLM. Ver `iter_extract`.
+        """
+        results = [None] * len(chunks)
+        for position, result in self.iter_extract(chunks):
+            results[position] = result
+        return results
+
+    async def aextract(
+        self, chunks: list[TextChunk], semaphore: asyncio.Semaphore | None = None
+    ) -> list[ExtractionResult]:
+        """
+        Versión asíncrona de `extract` basada en `aiter_extract`. Si se indica
+        `semaphore`, limita el número de llamadas al LLM en curso.
+        """
+        results = [None] * len(chunks)
+        async for position, result in self.aiter_extract(chunks, semaphore):
+            results[position] = result
+        return results
+
+    def _from_cache(
+        self, chunks: list[TextChunk]
+    ) -> tuple[list[str], dict[str, ExtractionResult], dict[str, TextChunk]]:
+        text_hashes = [content_hash(chunk.content) for chunk in chunks]
+        results = (
+            self.cache.get_many(
+                text_hashes, self.config.llm_config.model, self.prompt_hash
+            )
+            if self.cache is not None
+            else {}
+        )
+        missing = {}
+        for text_hash, chunk in zip(text_hashes, chunks):
+            if text_hash not in results:
+                missing.setdefault(text_hash, chunk)
+        return text_hashes, results, missing
+
+    def _store(self, new_results: dict[str, ExtractionResult]) -> None:
+        # Failed results are not cached, so the next run extracts them again
+        if self.cache is not None:
+            self.cache.put_many(
+                {
+                    text_hash: result
+                    for text_hash, result in new_results.items()
+                    if result.error is None
+                },
+                self.config.llm_config.model,
+                self.prompt_hash,
+            )
+
+    def invalidate_cache(self) -> int:
+        """
+        Elimina de la caché los resultados de otras versiones del prompt.
+        """
+        if self.cache is None:
+            return 0
+        return self.cache.invalidate(keep_prompt_hash=self.prompt_hash)
@@ -0,0 +1,513 @@
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from documentgraph.cache import SQLiteCache
+from documentgraph.config import ETLConfig
+from documentgraph.extraction import DocumentExtractor, file_hash
+from documentgraph.main import DocumentAnalysisPipeline
+from documentgraph.models import Document, stable_id
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Task:
+    """
+    Documento reclamado de la cola por un worker.
+    """
+
+    path: str
+    content_hash: str
+    attempts: int
+    # Hash del contenido la última vez que se cargó, si se cargó alguna vez
+    loaded_hash: str | None = None
+
+
+class WorkQueue(SQLiteCache):
+    """
+    Cola persistente de documentos por procesar, compartida por varios
+    procesos o máquinas a través de un fichero SQLite.
+
+    Cada documento, identificado por su ruta, está `pending`, `leased` (un
+    worker lo está procesando), `done` o `failed`. Un worker lo reclama con un
+    arriendo de `lease_seconds` que renueva mientras lo procesa; si el worker
+    muere, el arriendo caduca y otro worker lo reclama de nuevo. Tras
+    `max_attempts` intentos el documento queda `failed`.
+
+    Las transacciones `BEGIN IMMEDIATE` serializan a los workers mediante el
+    bloqueo de SQLite, así que dos workers nunca reclaman el mismo documento.
+    La base usa el journal clásico en lugar de WAL porque WAL necesita memoria
+    compartida y no funciona entre máquinas; el sistema de ficheros compartido
+    debe soportar los bloqueos de ficheros (NFSv4, SMB, Lustre...).
+
+    Attributes:
+        max_attempts (int): Intentos por documento antes de marcarlo fallido.
+    """
+
+    journal_mode = "DELETE"
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS tasks (
+        path TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        loaded_hash TEXT,
+        status TEXT NOT NULL,
+        worker TEXT,
+        lease_expires REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        updated REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires);
+    """
+
+    def __init__(self, path: str | Path, max_attempts: int = 3):
+        super().__init__(path)
+        self.max_attempts = max_attempts
+
+    def enqueue(self, items: list[tuple[str, str]]) -> int:
+        """
+        Añade documentos como pares `(ruta, hash del contenido)`. Un documento
+        ya encolado solo vuelve a `pending` si su contenido cambió.
+
+        Returns:
+            int: Número de documentos añadidos o reencolados.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO tasks (path, content_hash, status, updated) "
+                "VALUES (?, ?, 'pending', ?) "
+                "ON CONFLICT (path) DO UPDATE SET content_hash = excluded.content_hash, "
+                "status = 'pending', worker = NULL, lease_expires = NULL, "
+                "attempts = 0, error = NULL, updated = excluded.updated "
+                "WHERE tasks.content_hash != excluded.content_hash",
+                [(path, content_hash, now) for path, content_hash in items],
+            )
+            return conn.total_changes - before
+
+    def claim(self, worker: str, lease_seconds: float, limit: int = 1) -> list[Task]:
+        """
+        Reclama hasta `limit` documentos pendientes o con el arriendo caducado.
+        Un documento con el arriendo caducado que ya agotó sus intentos se
+        marca como fallido en lugar de reclamarse.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            expired = conn.execute(
+                "UPDATE tasks SET status = 'failed', worker = NULL, "
+                "lease_expires = NULL, error = 'Arriendo caducado', updated = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            ).rowcount
+            if expired:
+                logger.warning(
+                    f"{expired} documentos fallidos tras {self.max_attempts} "
+                    "arriendos caducados"
+                )
+            rows = conn.execute(
+                "SELECT path, content_hash, attempts, loaded_hash, status FROM tasks "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY path LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? WHERE path = ?",
+                [(worker, now + lease_seconds, now, row[0]) for row in rows],
+            )
+        for path, _, _, _, status in rows:
+            if status == "leased":
+                logger.warning(f"Arriendo caducado, se reclama de nuevo: {path}")
+        return [
+            Task(path, content_hash, attempts + 1, loaded_hash)
+            for path, content_hash, attempts, loaded_hash, _ in rows
+        ]
+
+    def renew(self, worker: str, paths: list[str], lease_seconds: float) -> set[str]:
+        """
+        Prolonga el arriendo de los documentos que el worker aún tiene.
+
+        Returns:
+            set[str]: Las rutas cuyo arriendo se renovó.
+        """
+        if not paths:
+            return set()
+        now = time.time()
+        placeholders = ",".join("?" * len(paths))
+        with self.transaction() as conn:
+            conn.execute(
+                f"UPDATE tasks SET lease_expires = ?, updated = ? "
+                f"WHERE worker = ? AND status = 'leased' AND path IN ({placeholders})",
+                [now + lease_seconds, now, worker, *paths],
+            )
+            rows = conn.execute(
+                "SELECT path FROM tasks "
+                f"WHERE worker = ? AND status = 'leased' AND path IN ({placeholders})",
+                [worker, *paths],
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def complete(self, worker: str, tasks: list[Task]) -> int:
+        """
+        Marca como hechos los documentos que el worker aún tiene arrendados,
+        con el hash del contenido que se cargó (`Task.content_hash`).
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE tasks SET status = 'done', content_hash = ?, loaded_hash = ?, "
+                "worker = NULL, lease_expires = NULL, error = NULL, updated = ? "
+                "WHERE path = ? AND worker = ? AND status = 'leased'",
+                [
+                    (task.content_hash, task.content_hash, now, task.path, worker)
+                    for task in tasks
+                ],
+            )
+            return conn.total_changes - before
+
+    def fail(self, worker: str, task: Task, error: str) -> None:
+        """
+        Devuelve el documento a la cola para otro intento, o lo marca como
+        fallido si agotó sus intentos.
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' "
+                "ELSE 'pending' END, worker = NULL, lease_expires = NULL, "
+                "error = ?, updated = ? "
+                "WHERE path = ? AND worker = ? AND status = 'leased'",
+                (self.max_attempts, error, time.time(), task.path, worker),
+            )
+
+    def release(self, worker: str) -> None:
+        """
+        Devuelve a la cola, sin contar el intento, los documentos que el worker
+        tiene arrendados, por ejemplo al detenerlo.
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'pending', worker = NULL, "
+                "lease_expires = NULL, attempts = MAX(attempts - 1, 0), updated = ? "
+                "WHERE worker = ? AND status = 'leased'",
+                (time.time(), worker),
+            )
+
+    def retry_failed(self) -> int:
+        """
+        Devuelve a la cola los documentos fallidos, con los intentos a cero.
+        """
+        with self.transaction() as conn:
+            return conn.execute(
+                "UPDATE tasks SET status = 'pending', attempts = 0, updated = ? "
+                "WHERE status = 'failed'",
+                (time.time(),),
+            ).rowcount
+
+    def stats(self) -> dict[str, int]:
+        """
+        Devuelve el número de documentos por estado.
+        """
+        rows = (
+            self.connection()
+            .execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")
+            .fetchall()
+        )
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def failed_documents(self) -> list[dict]:
+        rows = (
+            self.connection()
+            .execute(
+                "SELECT path, error, attempts FROM tasks "
+                "WHERE status = 'failed' ORDER BY path"
+            )
+            .fetchall()
+        )
+        return [dict(zip(("path", "error", "attempts"), row)) for row in rows]
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class QueueCoordinator:
+    """
+    Encola los documentos de una carpeta en una `WorkQueue` y espera a que
+    los workers la vacíen. Solo lee los metadatos y el hash de cada fichero,
+    no su contenido.
+
+    Attributes:
+        config (ETLConfig): Configuración del pipeline.
+        queue (WorkQueue): Cola compartida con los workers.
+    """
+
+    def __init__(self, config: ETLConfig, queue: WorkQueue | None = None):
+        self.config = config
+        self.queue = queue or WorkQueue(
+            config.queue_config.path, max_attempts=config.queue_config.max_attempts
+        )
+        self.extractor = DocumentExtractor(config)
+
+    def enqueue(self, input_folder: str) -> int:
+        """
+        Encola los ficheros de la carpeta que cumplen los patrones de
+        `SourceConfig`, con su ruta absoluta.
+
+        Returns:
+            int: Número de documentos añadidos o reencolados por haber cambiado.
+        """
+        input_path = self.extractor.resolve_input(input_folder)
+        if not input_path.exists():
+            raise FileNotFoundError(f"No existe la ruta de entrada: {input_path}")
+        items, added = [], 0
+        for file_path in self.extractor.iter_files(input_path):
+            items.append((str(file_path), file_hash(file_path)))
+            if len(items) == 1000:
+                added += self.queue.enqueue(items)
+                items = []
+        added += self.queue.enqueue(items)
+        logger.info(f"{added} documentos encolados desde {input_path}")
+        return added
+
+    def wait(self, poll_interval: float | None = None) -> dict[str, int]:
+        """
+        Espera hasta que no quedan documentos pendientes ni arrendados,
+        registrando el progreso.
+
+        Returns:
+            dict[str, int]: Documentos por estado al terminar.
+        """
+        poll_interval = poll_interval or self.config.queue_config.poll_interval
+        while True:
+            stats = self.queue.stats()
+            logger.info(f"Estado de la cola: {stats}")
+            if not stats["pending"] and not stats["leased"]:
+                return stats
+            time.sleep(poll_interval)
+
+
+class QueueWorker:
+    """
+    Worker que reclama documentos de una `WorkQueue`, los procesa con un
+    `DocumentAnalysisPipeline` y los marca como hechos cuando quedan cargados
+    en el grafo.
+
+    Mientras procesa un lote, un hilo renueva sus arriendos cada tercio de
+    `lease_seconds`. Un documento que falla vuelve a la cola para otro intento.
+    Con `batch_size` mayor que uno y `n_jobs` mayor que uno los documentos de
+    un lote se procesan en paralelo; configurar `ETLConfig.journal_path`, local
+    a cada worker, aísla entonces los fallos por documento en lugar de por
+    lote. En modo incremental la cola, y no el manifiesto, registra qué versión
+    de cada documento está cargada.
+
+    En modo incremental, antes de cargar un documento que ya se cargó con otro
+    contenido se eliminan sus fragmentos anteriores, como hace el manifiesto
+    en una ejecución normal.
+
+    Attributes:
+        pipeline (DocumentAnalysisPipeline): Pipeline que procesa los documentos.
+        queue (WorkQueue): Cola compartida.
+        worker_id (str): Identificador del worker en la cola, `host:pid` por
+            defecto.
+    """
+
+    def __init__(
+        self,
+        pipeline: DocumentAnalysisPipeline,
+        queue: WorkQueue | None = None,
+        worker_id: str | None = None,
+    ):
+        self.pipeline = pipeline
+        self.config: ETLConfig = pipeline.config
+        # The queue records what each worker loaded; workers saving the
+        # manifest would overwrite each other's entries
+        pipeline.manifest = None
+        self.queue = queue or WorkQueue(
+            self.config.queue_config.path,
+            max_attempts=self.config.queue_config.max_attempts,
+        )
+        self.worker_id = worker_id or _worker_id()
+        self._leased: list[str] = []
+        self._leased_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _heartbeat(self) -> None:
+        lease_seconds = self.config.queue_config.lease_seconds
+        while not self._stop.wait(lease_seconds / 3):
+            with self._leased_lock:
+                paths = list(self._leased)
+            try:
+                renewed = self.queue.renew(self.worker_id, paths, lease_seconds)
+            except Exception as e:
+                logger.error(f"Error al renovar los arriendos: {str(e)}")
+                continue
+            for path in set(paths) - renewed:
+                logger.warning(f"Arriendo perdido, otro worker puede tomarlo: {path}")
+
+    def _load_documents(self, tasks: list[Task]) -> list[tuple[Task, Document]]:
+        documents = []
+        for task in tasks:
+            try:
+                (document,) = self.pipeline.extractor.extract(task.path)
+            except Exception as e:
+                self.queue.fail(self.worker_id, task, f"{type(e).__name__}: {e}")
+                continue
+            # A worker may die after loading a document but before completing
+            # it; with a stable id the worker that reclaims it merges the same
+            # nodes instead of loading a second copy
+            document.id = stable_id(document.path)
+            if self.config.incremental and task.loaded_hash not in (
+                None,
+                document.content_hash,
+            ):
+                # The document changed since it was loaded: its old chunks and
+                # relationships are removed once the new version is loaded
+                self.pipeline.replaced_paths.add(document.path)
+            # The file may have changed since it was enqueued
+            task.content_hash = document.content_hash
+            documents.append((task, document))
+        return documents
+
+    def process(self, tasks: list[Task]) -> int:
+        """
+        Procesa un lote de documentos reclamados y los marca en la cola.
+
+        Returns:
+            int: Número de documentos cargados.
+        """
+        journal = self.pipeline.journal
+        pairs, loaded = [], set()
+        for task, document in self._load_documents(tasks):
+            if journal is None or journal.begin(document):
+                pairs.append((task, document))
+            elif journal.status(document) == "done":
+                # Loaded by a previous attempt that died before completing it
+                loaded.add(document.path)
+                pairs.append((task, document))
+            else:
+                self.queue.fail(self.worker_id, task, "Omitido por el diario")
+        try:
+            loaded.update(
+                document.path
+                for document in self.pipeline.process_documents(
+                    document for _, document in pairs if document.path not in loaded
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error al procesar el lote: {str(e)}", exc_info=True)
+            for task, _ in pairs:
+                self.queue.fail(self.worker_id, task, f"{type(e).__name__}: {e}")
+            return 0
+
+        done = [task for task, document in pairs if document.path in loaded]
+        self.queue.complete(self.worker_id, done)
+        for task, document in pairs:
+            if document.path not in loaded:
+                self.queue.fail(
+                    self.worker_id, task, "El documento no se cargó en el grafo"
+                )
+        return len(done)
+
+    def run(self, exit_when_empty: bool = True) -> dict:
+        """
+        Reclama y procesa lotes hasta que la cola queda vacía o, con
+        `exit_when_empty=False`, indefinidamente.
+
+        Returns:
+            dict: Informe de métricas del worker, como el de
+            `DocumentAnalysisPipeline.execute_pipeline`.
+        """
+        queue_config = self.config.queue_config
+        pipeline = self.pipeline
+        pipeline.metrics.reset()
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+        logger.info(f"Worker {self.worker_id} iniciado sobre {self.queue.path}")
+        try:
+            pipeline.serve_metrics()
+            pipeline.graph_loader.ensure_schema()
+            while True:
+                tasks = self.queue.claim(
+                    self.worker_id, queue_config.lease_seconds, queue_config.batch_size
+                )
+                if not tasks:
+                    stats = self.queue.stats()
+                    if exit_when_empty and not stats["pending"] and not stats["leased"]:
+                        break
+                    # Other workers hold the remaining leases; one may expire
+                    time.sleep(queue_config.poll_interval)
+                    continue
+                with self._leased_lock:
+                    self._leased = [task.path for task in tasks]
+                loaded = self.process(tasks)
+                pipeline.metrics.inc("documents_total", len(tasks))
+                pipeline.metrics.inc("queue_documents_done_total", loaded)
+                with self._leased_lock:
+                    self._leased = []
+        finally:
+            self._stop.set()
+            self.queue.release(self.worker_id)
+            pipeline.close()
+            pipeline.last_report = pipeline.finish_metrics()
+        logger.info(f"Worker {self.worker_id} terminado: {self.queue.stats()}")
+        return pipeline.last_report
+
+
+def run_worker(config: ETLConfig, exit_when_empty: bool = True) -> dict:
+    """
+    Crea un pipeline con la configuración dada y ejecuta un `QueueWorker`
+    sobre `QueueConfig.path`. Es el punto de entrada de cada proceso worker.
+    """
+    return QueueWorker(DocumentAnalysisPipeline(config)).run(exit_when_empty)
+
+
+def _worker_config(config: ETLConfig, index: int) -> ETLConfig:
+    """
+    Configuración del worker local número `index`: cada uno expone sus
+    métricas en `MetricsConfig.port` más su índice, ya que no pueden
+    compartir el puerto.
+    """
+    port = config.metrics_config.port
+    if port is None:
+        return config
+    metrics_config = config.metrics_config.model_copy(update={"port": port + index})
+    return config.model_copy(update={"metrics_config": metrics_config})
+
+
+def run_sharded(config: ETLConfig, input_folder: str, n_workers: int) -> dict[str, int]:
+    """
+    Encola la carpeta y la procesa con `n_workers` procesos worker locales.
+    Se pueden lanzar más workers en otras máquinas con acceso a la misma cola
+    y a los mismos ficheros.
+
+    Returns:
+        dict[str, int]: Documentos por estado al terminar.
+    """
+    coordinator = QueueCoordinator(config)
+    coordinator.enqueue(input_folder)
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=run_worker, args=(_worker_config(config, index),), daemon=False
+        )
+        for index in range(n_workers)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    stats = coordinator.queue.stats()
+    if stats["failed"]:
+        logger.warning(f"{stats['failed']} documentos fallidos en la cola")
+    return stats
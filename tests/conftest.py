@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import pytest
+
+from documentgraph.bench import FakeEncoding, build_pipeline
+from documentgraph.config import EmbeddingConfig, ETLConfig, OpenAIConfig
+from documentgraph.main import DocumentAnalysisPipeline
+from documentgraph.sinks import InMemoryGraphSink
+from documentgraph.tokens import set_encoding
+
+ENTITIES = {
+    "Alice": "Person",
+    "Bob": "Person",
+    "Carol": "Person",
+    "Acme": "Organization",
+}
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    # The OpenAI clients need a key to be created and tiktoken downloads its
+    # encodings on first use; tests run with the benchmark fakes instead
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    models = (EmbeddingConfig().model, OpenAIConfig().model)
+    encoding = FakeEncoding()
+    for model in models:
+        set_encoding(model, encoding)
+    yield
+    for model in models:
+        set_encoding(model, None)
+
+
+@pytest.fixture
+def make_config(tmp_path):
+    def make_config(**overrides) -> ETLConfig:
+        values = {
+            "n_jobs": 1,
+            "sink": "memory",
+            "manifest_path": str(tmp_path / "manifest.json"),
+            "export_config": {"path": str(tmp_path / "export")},
+        }
+        values.update(overrides)
+        return ETLConfig(**values)
+
+    return make_config
+
+
+@pytest.fixture
+def make_pipeline():
+    def make_pipeline(
+        config: ETLConfig, sink: InMemoryGraphSink | None = None
+    ) -> DocumentAnalysisPipeline:
+        pipeline = build_pipeline(config, ENTITIES)
+        if sink is not None:
+            pipeline.graph_loader = sink
+            pipeline.owns_graph_loader = False
+        return pipeline
+
+    return make_pipeline
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    directory = tmp_path / "docs"
+    directory.mkdir()
+
+    def write(name: str, text: str) -> Path:
+        path = directory / name
+        path.write_text(text, encoding="utf-8")
+        return path
+
+    write.directory = directory
+    return write
+
+
+def entity_names(sink: InMemoryGraphSink) -> list[str]:
+    return sorted(entity["name"] for entity in sink.nodes["Entity"].values())
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from conftest import ENTITIES, entity_names
+
+from documentgraph.async_pipeline import AsyncDocumentAnalysisPipeline
+from documentgraph.bench import FakeEmbeddings, FakeExtractionModel
+from documentgraph.sinks import InMemoryGraphSink, ThreadedGraphSink
+
+
+def make_async_pipeline(config, sink: InMemoryGraphSink):
+    pipeline = AsyncDocumentAnalysisPipeline(config, ThreadedGraphSink(sink))
+    pipeline.embedding_generator.model = FakeEmbeddings(
+        config.embedding_config.dimension
+    )
+    pipeline.entity_relation_extractor.llm = FakeExtractionModel(entities=ENTITIES)
+    return pipeline
+
+
+def test_async_pipeline_streams_large_files(make_config, corpus):
+    config = make_config(
+        n_jobs=2,
+        source_config={
+            "stream_threshold": 100,
+            "window_size": 300,
+            "stream_batch_chunks": 2,
+        },
+        chunk_config={"size": 60, "overlap": 0},
+    )
+    sink = InMemoryGraphSink(config)
+    corpus("big.txt", " ".join(["Alice met Bob near the old river bank."] * 20))
+    corpus("small.txt", "Carol met Acme.")
+
+    asyncio.run(
+        make_async_pipeline(config, sink).execute_pipeline(str(corpus.directory))
+    )
+
+    counts = sink.counts()
+    assert counts["Document"] == 2
+    # Chunks of the streamed file stay linked across its parts
+    assert counts["NEXT"] == counts["TextChunk"] - 2
+    assert entity_names(sink) == ["Acme", "Alice", "Bob", "Carol"]
+
+
+def test_first_failure_cancels_the_other_documents(make_config, corpus):
+    config = make_config(n_jobs=3)
+    sink = InMemoryGraphSink(config)
+    corpus("a.txt", "Alice met Bob.")
+    corpus("b.txt", "Carol met Acme.")
+    corpus("c.txt", "Bob met Carol.")
+    pipeline = make_async_pipeline(config, sink)
+    process_document = pipeline.process_document
+    finished = []
+
+    async def process(document, requests):
+        if document.filename == "b.txt":
+            raise RuntimeError("Error en b.txt")
+        await asyncio.sleep(0.2)
+        await process_document(document, requests)
+        finished.append(document.filename)
+
+    pipeline.process_document = process
+
+    async def run():
+        with pytest.raises(RuntimeError, match="Error en b.txt"):
+            await pipeline.execute_pipeline(str(corpus.directory))
+        # Cancelled documents do not keep writing after the run fails
+        await asyncio.sleep(0.3)
+
+    asyncio.run(run())
+    assert finished == []
+    assert sink.counts().get("Document", 0) == 0
+
+
+def test_cancelled_document_does_not_abort_the_run(make_config, corpus):
+    config = make_config(n_jobs=1)
+    sink = InMemoryGraphSink(config)
+    corpus("a.txt", "Alice met Bob.")
+    corpus("b.txt", "Carol met Acme.")
+    pipeline = make_async_pipeline(config, sink)
+    process_document = pipeline.process_document
+
+    async def process(document, requests):
+        if document.filename == "a.txt":
+            asyncio.current_task().cancel()
+            await asyncio.sleep(0)
+        await process_document(document, requests)
+
+    pipeline.process_document = process
+    asyncio.run(pipeline.execute_pipeline(str(corpus.directory)))
+
+    assert entity_names(sink) == ["Acme", "Carol"]
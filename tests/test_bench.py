@@ -0,0 +1,28 @@
+import tempfile
+
+from documentgraph.bench import main
+
+FAST = ["--words", "300", "--embedding-latency", "0", "--llm-latency", "0"]
+
+
+def test_bench_runs_offline(tmp_path):
+    reports = main(
+        ["--documents", "2", "--n-jobs", "1,2", "--in-process", "--corpus"]
+        + [str(tmp_path)]
+        + FAST
+    )
+
+    assert [report["n_jobs"] for report in reports] == [1, 2]
+    for report in reports:
+        assert report["counters"]["documents_total"] == 2
+        assert report["stages"]["load"]["items"] > 0
+    # A corpus passed with --corpus is kept for the next run
+    assert len(list(tmp_path.glob("*.txt"))) == 2
+
+
+def test_bench_removes_the_generated_corpus(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+    main(["--documents", "1", "--n-jobs", "1", "--in-process"] + FAST)
+
+    assert list(tmp_path.iterdir()) == []
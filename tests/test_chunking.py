@@ -0,0 +1,123 @@
+import re
+
+import numpy as np
+import pytest
+
+from documentgraph.bench import FakeEmbeddings
+from documentgraph.models import Document
+from documentgraph.sinks import InMemoryGraphSink
+from documentgraph.transformation import TextProcessor
+
+TEXT = " ".join(f"word{index}" for index in range(50))
+
+
+def chunk(config, text: str = TEXT) -> list:
+    processor = TextProcessor(config)
+    try:
+        return processor.create_chunks(
+            Document(id="doc", filename="a.txt", content=text)
+        )
+    finally:
+        processor.close()
+
+
+def test_token_windows_overlap_and_keep_their_offsets(make_config):
+    # FakeEncoding counts one token per word
+    chunks = chunk(
+        make_config(chunk_config={"strategy": "token", "size": 20, "overlap": 5})
+    )
+
+    assert [len(c.content.split()) for c in chunks] == [20, 20, 20]
+    words = [c.content.split() for c in chunks]
+    assert words[0][-5:] == words[1][:5]
+    assert words[2][-1] == "word49"
+    for c in chunks:
+        assert TEXT[c.start_index : c.end_index] == c.content
+
+
+def test_character_offsets_locate_every_chunk(make_config):
+    chunks = chunk(make_config(chunk_config={"size": 60, "overlap": 15}))
+
+    assert len(chunks) > 3
+    for c in chunks:
+        assert TEXT[c.start_index : c.end_index] == c.content
+
+
+def test_invalid_chunk_config_is_rejected(make_config):
+    with pytest.raises(ValueError, match="overlap"):
+        TextProcessor(make_config(chunk_config={"size": 10, "overlap": 10}))
+    with pytest.raises(ValueError, match="desconocida"):
+        TextProcessor(make_config(chunk_config={"strategy": "sentences"}))
+
+
+def test_process_pool_gives_the_same_chunks(make_config):
+    chunk_config = {"strategy": "token", "size": 8, "overlap": 2}
+    serial = chunk(make_config(chunk_config=chunk_config))
+
+    # The pool's workers are spawned and get the registered FakeEncoding
+    pooled = chunk(make_config(chunk_config=chunk_config | {"processes": 2}))
+
+    assert [(c.id, c.content, c.start_index) for c in pooled] == [
+        (c.id, c.content, c.start_index) for c in serial
+    ]
+
+
+SENTENCES = [f"Alice met Bob on day {day}." for day in range(12)] + [
+    f"Carol visited Acme in week {week}." for week in range(12)
+]
+
+
+class RecordingEmbeddings(FakeEmbeddings):
+    def __init__(self, dimension: int):
+        super().__init__(dimension)
+        self.texts: list[str] = []
+
+    def embed_documents(self, texts, **kwargs):
+        self.texts.extend(texts)
+        return super().embed_documents(texts)
+
+
+def run(make_config, make_pipeline, corpus, chunk_embeddings: str):
+    config = make_config(
+        chunk_config={
+            "strategy": "semantic",
+            "size": 200,
+            "breakpoint_percentile": 80,
+            "chunk_embeddings": chunk_embeddings,
+        },
+        embedding_config={"dimension": 16},
+    )
+    sink = InMemoryGraphSink(config)
+    pipeline = make_pipeline(config, sink)
+    model = RecordingEmbeddings(16)
+    pipeline.embedding_generator.model = model
+    corpus("a.txt", " ".join(SENTENCES))
+    pipeline.execute_pipeline(str(corpus.directory))
+    return sink, model
+
+
+def test_pooled_chunks_reuse_the_sentence_embeddings(
+    make_config, make_pipeline, corpus
+):
+    sink, model = run(make_config, make_pipeline, corpus, "pooled")
+
+    # Only the sentences are sent to the model, once each
+    assert model.texts == SENTENCES
+    chunks = list(sink.nodes["TextChunk"].values())
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk["text"]) <= 200
+        sentences = re.split(r"(?<=[.?!])\s+", chunk["text"])
+        vectors = np.array([model._embed(sentence) for sentence in sentences])
+        pooled = np.array([len(sentence) for sentence in sentences]) @ vectors
+        np.testing.assert_allclose(
+            chunk["embedding"], pooled / np.linalg.norm(pooled), atol=1e-5
+        )
+
+
+def test_reembed_sends_the_chunk_texts_again(make_config, make_pipeline, corpus):
+    sink, model = run(make_config, make_pipeline, corpus, "reembed")
+
+    chunks = [chunk["text"] for chunk in sink.nodes["TextChunk"].values()]
+    assert model.texts[: len(SENTENCES)] == SENTENCES
+    assert sorted(model.texts[len(SENTENCES) :]) == sorted(chunks)
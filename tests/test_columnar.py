@@ -0,0 +1,63 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from documentgraph.columnar import ChunkBatch
+from documentgraph.models import TextChunk
+
+
+def make_chunks(embedded: bool = True) -> list[TextChunk]:
+    return [
+        TextChunk(
+            id=f"c{index}",
+            content=f"chunk {index}",
+            document_id="doc",
+            embedding=[float(index), 0.5, -1.0] if embedded or index else None,
+            start_index=None if index == 2 else index * 10,
+            end_index=None if index == 2 else index * 10 + 7,
+        )
+        for index in range(3)
+    ]
+
+
+def test_round_trip_keeps_the_chunks_as_float32_views():
+    batch = ChunkBatch.from_chunks(make_chunks())
+
+    assert batch.embeddings.dtype == np.float32
+    assert batch.embeddings.shape == (3, 3)
+    chunks = batch.to_chunks()
+    assert [chunk.id for chunk in chunks] == ["c0", "c1", "c2"]
+    assert (chunks[1].start_index, chunks[1].end_index) == (10, 17)
+    assert (chunks[2].start_index, chunks[2].end_index) == (None, None)
+    # Each embedding is a row of the batch matrix, not a copy
+    assert np.shares_memory(chunks[1].embedding, batch.embeddings)
+    np.testing.assert_array_equal(chunks[1].embedding, [1.0, 0.5, -1.0])
+
+
+def test_batch_without_every_embedding_has_none():
+    batch = ChunkBatch.from_chunks(make_chunks(embedded=False))
+
+    assert batch.embeddings is None
+    assert all(chunk.embedding is None for chunk in batch.to_chunks())
+
+
+def test_batch_pickles_as_arrays():
+    batch = pickle.loads(pickle.dumps(ChunkBatch.from_chunks(make_chunks())))
+
+    assert batch.texts == ["chunk 0", "chunk 1", "chunk 2"]
+    np.testing.assert_array_equal(batch.start_index, [0, 10, -1])
+    assert batch.embeddings.dtype == np.float32
+
+
+def test_arrow_file_is_read_back_memory_mapped(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "chunks.arrow"
+    ChunkBatch.from_chunks(make_chunks()).write_ipc(path)
+
+    batch = ChunkBatch.read_ipc(path)
+
+    assert batch.ids == ["c0", "c1", "c2"]
+    np.testing.assert_array_equal(batch.end_index, [7, 17, -1])
+    np.testing.assert_array_equal(batch.embeddings[2], [2.0, 0.5, -1.0])
+    assert not batch.embeddings.flags.owndata
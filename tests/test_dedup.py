@@ -0,0 +1,142 @@
+import random
+
+import numpy as np
+import pytest
+from conftest import ENTITIES
+
+from documentgraph.bench import FakeExtractionModel
+from documentgraph.dedup import ChunkDeduplicator, MinHasher
+from documentgraph.models import ExtractionResult, TextChunk
+
+BOILERPLATE = (
+    "Acme is a registered trademark. All rights reserved by the authors of "
+    "this very document."
+)
+
+
+class RecordingModel(FakeExtractionModel):
+    prompts: list = []
+
+    def _respond(self, messages):
+        self.prompts.append(messages[-1].content)
+        return super()._respond(messages)
+
+
+def words(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(6))
+        for _ in range(count)
+    ]
+
+
+def chunks(*texts: str) -> list[TextChunk]:
+    return [
+        TextChunk(content=text, document_id="doc", embedding=[float(index)] * 4)
+        for index, text in enumerate(texts)
+    ]
+
+
+@pytest.fixture
+def deduplicator(make_config, tmp_path):
+    config = make_config(
+        dedup_config={"enabled": True, "index_path": str(tmp_path / "dedup.sqlite")}
+    )
+    return ChunkDeduplicator(config)
+
+
+def test_minhash_estimates_jaccard_similarity():
+    hasher = MinHasher()
+    text = words(200)
+    near = list(text)
+    near[100] = "changed"
+
+    signature = hasher.signature(" ".join(text))
+    others = np.stack(
+        [
+            hasher.signature(" ".join(text)),
+            hasher.signature(" ".join(near)),
+            hasher.signature(" ".join(words(200, seed=1))),
+        ]
+    )
+    exact, similar, different = hasher.similarity(signature, others)
+
+    assert exact == 1.0
+    # 191 of 201 distinct shingles are shared
+    assert 0.9 <= similar < 1.0
+    assert different < 0.1
+
+
+def test_find_groups_duplicates_in_the_same_list(deduplicator):
+    text = words(200)
+    near = list(text)
+    near[100] = "changed"
+
+    duplicates = deduplicator.find(
+        chunks(" ".join(text), " ".join(words(200, 1)), " ".join(text), " ".join(near))
+    )
+
+    assert duplicates.canonical == {2: 0, 3: 0}
+    assert duplicates.unique() == [0, 1]
+
+
+def test_index_reuses_results_across_runs(deduplicator):
+    text = " ".join(words(200))
+    first = chunks(text, "Bob met Carol.")
+    results = [
+        ExtractionResult(entities=[], relationships=[]),
+        ExtractionResult.from_error(RuntimeError("fallo")),
+    ]
+    deduplicator.add(first, deduplicator.find(first), results)
+
+    second = chunks("Bob met Carol.", text)
+    duplicates = deduplicator.find(second)
+
+    # The failed extraction was not stored, so only the first text is reused
+    assert list(duplicates.stored) == [1]
+    assert duplicates.unique() == [0]
+    np.testing.assert_array_equal(duplicates.stored[1].embedding, [0.0] * 4)
+
+
+def test_pipeline_skips_duplicate_chunks(make_config, make_pipeline, corpus, tmp_path):
+    config = make_config(
+        chunk_config={"size": 100, "overlap": 0},
+        dedup_config={"enabled": True, "index_path": str(tmp_path / "dedup.sqlite")},
+    )
+    pipeline = make_pipeline(config)
+    model = RecordingModel(entities=ENTITIES, prompts=[])
+    pipeline.entity_relation_extractor.llm = model
+    embedded = []
+    embed_documents = pipeline.embedding_generator.model.embed_documents
+
+    def record_embeddings(texts, **kwargs):
+        embedded.extend(texts)
+        return embed_documents(texts, **kwargs)
+
+    pipeline.embedding_generator.model.embed_documents = record_embeddings
+    sink = pipeline.graph_loader
+    corpus("a.txt", f"Alice met Bob near the river.\n\n{BOILERPLATE}")
+    corpus("b.txt", f"Carol met Bob in the city.\n\n{BOILERPLATE}")
+
+    report = pipeline.execute_pipeline(str(corpus.directory))
+
+    assert report["counters"]["duplicate_chunks_total"] == 1
+    assert embedded.count(BOILERPLATE) == 1
+    assert sum(BOILERPLATE in prompt for prompt in model.prompts) == 1
+    # The duplicate is still its own chunk, with the canonical's embedding
+    boilerplate = [
+        chunk
+        for chunk in sink.nodes["TextChunk"].values()
+        if chunk["text"] == BOILERPLATE
+    ]
+    assert len(boilerplate) == 2
+    np.testing.assert_array_equal(
+        boilerplate[0]["embedding"], boilerplate[1]["embedding"]
+    )
+    acme = next(
+        entity_id
+        for entity_id, entity in sink.nodes["Entity"].items()
+        if entity["name"] == "Acme"
+    )
+    for chunk in boilerplate:
+        assert acme in sink.neighbors(chunk["id"], "CONTAINS")
@@ -0,0 +1,130 @@
+import numpy as np
+
+from documentgraph.bench import FakeEmbeddings
+from documentgraph.cache import EmbeddingCache
+from documentgraph.models import TextChunk
+from documentgraph.sinks import InMemoryGraphSink
+from documentgraph.transformation import EmbeddingGenerator
+
+
+class RecordingEmbeddings(FakeEmbeddings):
+    def __init__(self, dimension: int):
+        super().__init__(dimension)
+        self.batches: list[list[str]] = []
+
+    def embed_documents(self, texts, **kwargs):
+        self.batches.append(list(texts))
+        return super().embed_documents(texts)
+
+
+def generator(config) -> EmbeddingGenerator:
+    generator = EmbeddingGenerator(config)
+    generator.model = RecordingEmbeddings(config.embedding_config.dimension)
+    return generator
+
+
+def test_batches_respect_the_entry_and_token_limits(make_config):
+    config = make_config(
+        embedding_config={"dimension": 8, "batch_size": 3, "max_tokens_per_request": 5}
+    )
+    texts = ["one", "two words", "three more words", "a", "b", "c", "d"]
+
+    batches = list(generator(config).iter_batches(texts))
+
+    # One token per word: the third text would take the first batch to 6 tokens,
+    # and the second batch stops at 3 entries
+    assert batches == [
+        ["one", "two words"],
+        ["three more words", "a", "b"],
+        ["c", "d"],
+    ]
+
+
+def test_text_over_the_token_budget_gets_its_own_batch(make_config):
+    config = make_config(embedding_config={"dimension": 8, "max_tokens_per_request": 2})
+
+    batches = list(generator(config).iter_batches(["a", "far too many words", "b"]))
+
+    assert batches == [["a"], ["far too many words"], ["b"]]
+
+
+def test_generate_batch_sends_one_request_per_batch(make_config):
+    config = make_config(embedding_config={"dimension": 8, "batch_size": 2})
+    embeddings = generator(config)
+    chunks = [TextChunk(content=f"chunk {i}", document_id="doc") for i in range(5)]
+
+    vectors = embeddings.generate_batch(chunks)
+
+    assert embeddings.model.batches == [
+        ["chunk 0", "chunk 1"],
+        ["chunk 2", "chunk 3"],
+        ["chunk 4"],
+    ]
+    assert vectors == [embeddings.model._embed(chunk.content) for chunk in chunks]
+
+
+def test_pipeline_stores_one_embedding_per_chunk(make_config, make_pipeline, corpus):
+    config = make_config(
+        chunk_config={"size": 60, "overlap": 0},
+        embedding_config={"dimension": 8, "batch_size": 4},
+    )
+    sink = InMemoryGraphSink(config)
+    pipeline = make_pipeline(config, sink)
+    model = RecordingEmbeddings(8)
+    pipeline.embedding_generator.model = model
+    corpus("a.txt", " ".join(f"Alice met Bob on day {day}." for day in range(20)))
+
+    pipeline.execute_pipeline(str(corpus.directory))
+
+    chunks = sink.nodes["TextChunk"].values()
+    assert len(chunks) > 4
+    assert [len(batch) for batch in model.batches][:-1] == [4] * (
+        len(model.batches) - 1
+    )
+    for chunk in chunks:
+        np.testing.assert_allclose(chunk["embedding"], model._embed(chunk["text"]))
+
+
+def test_cached_texts_are_not_sent_again(make_config, tmp_path):
+    config = make_config(
+        embedding_config={
+            "dimension": 8,
+            "cache_path": str(tmp_path / "embeddings.sqlite"),
+        }
+    )
+    first = generator(config)
+    vectors = first.embed_texts(["a", "b"])
+    first.cache.close()
+
+    # A new generator reads the same file, as the next run would
+    second = generator(config)
+    again = second.embed_texts(["b", "c", "a"])
+
+    assert second.model.batches == [["c"]]
+    np.testing.assert_allclose(again[0], vectors[1])
+    np.testing.assert_allclose(again[2], vectors[0])
+    assert (second.cache.hits, second.cache.misses) == (2, 1)
+
+
+def test_cache_key_depends_on_model_and_dimension():
+    key = EmbeddingCache.make_key("text", "model", 8)
+
+    assert key == EmbeddingCache.make_key("text", "model", 8)
+    assert key != EmbeddingCache.make_key("text", "other-model", 8)
+    assert key != EmbeddingCache.make_key("text", "model", 16)
+
+
+def test_cache_evicts_the_least_recently_used_entries(tmp_path):
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite", max_entries=10)
+    cache.put_many({f"old{i}": [float(i)] for i in range(5)})
+    cache.put_many({f"new{i}": [float(i)] for i in range(5)})
+    cache.get_many([f"old{i}" for i in range(5)])
+
+    cache.put_many({"last": [1.0]})
+
+    # Eviction leaves 90% of max_entries, dropping two of the entries read
+    # longest ago
+    old = [f"old{i}" for i in range(5)]
+    new = [f"new{i}" for i in range(5)]
+    assert len(cache.get_many(old + ["last"])) == 6
+    assert len(cache.get_many(new)) == 3
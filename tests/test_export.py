@@ -0,0 +1,148 @@
+import csv
+import shlex
+
+from documentgraph.export import CSVGraphExporter
+from documentgraph.models import (
+    Document,
+    Entity,
+    ExtractionResult,
+    Relationship,
+    TextChunk,
+)
+
+
+def export(make_config, tmp_path, chunks: int = 3, **export_config):
+    config = make_config(
+        sink="csv", export_config={"path": str(tmp_path / "csv"), **export_config}
+    )
+    exporter = CSVGraphExporter(config)
+    document = Document(filename="a.txt", content="", content_hash="h1")
+    alice = Entity(name="Alice", type="Person")
+    acme = Entity(name="Acme", type="Organization")
+    works = Relationship(
+        source_id=alice.id,
+        target_id=acme.id,
+        type="works for",
+        properties={"since": 2020},
+    )
+    text_chunks = [
+        TextChunk(
+            content=f"Alice works for Acme, part {index}.",
+            document_id=document.id,
+            embedding=[0.5, -1.25, float(index)],
+            start_index=index * 40,
+            end_index=index * 40 + 32,
+        )
+        for index in range(chunks)
+    ]
+    results = [
+        ExtractionResult(entities=[alice, acme], relationships=[works])
+        for _ in text_chunks
+    ]
+    exporter.add_document(document, text_chunks, results)
+    exporter.close()
+    return exporter, document, text_chunks, (alice, acme)
+
+
+def read_rows(path) -> list[list[str]]:
+    with path.open(newline="", encoding="utf-8") as file:
+        return list(csv.reader(file))
+
+
+def test_headers_declare_ids_and_types(make_config, tmp_path):
+    exporter, document, chunks, (alice, acme) = export(make_config, tmp_path)
+    directory = exporter.directory
+
+    assert read_rows(directory / "nodes.TextChunk.0.header.csv") == [
+        [
+            "id:ID(TextChunk)",
+            "text",
+            "embedding:float[]",
+            "start_index:long",
+            "end_index:long",
+        ]
+    ]
+    assert read_rows(directory / "nodes.Entity.0.header.csv") == [
+        ["id:ID(Entity)", "name", "type"]
+    ]
+    assert read_rows(directory / "relationships.WORKS_FOR.0.header.csv") == [
+        [":START_ID(Entity)", ":END_ID(Entity)", "since:long"]
+    ]
+    assert read_rows(directory / "relationships.WORKS_FOR.0.00000.csv") == [
+        [alice.id, acme.id, "2020"]
+    ]
+    assert read_rows(directory / "relationships.HAS_CHUNK.0.header.csv") == [
+        [":START_ID(Document)", ":END_ID(TextChunk)"]
+    ]
+    # Entities and relationships repeated in every chunk are written once
+    entities = read_rows(directory / "nodes.Entity.0.00000.csv")
+    assert sorted(entities) == sorted(
+        [[alice.id, "Alice", "Person"], [acme.id, "Acme", "Organization"]]
+    )
+
+
+def test_arrays_use_the_configured_delimiter(make_config, tmp_path):
+    exporter, _, chunks, _ = export(make_config, tmp_path, array_delimiter="|")
+
+    rows = read_rows(exporter.directory / "nodes.TextChunk.0.00000.csv")
+    assert rows[0] == [chunks[0].id, chunks[0].content, "0.5|-1.25|0", "0", "32"]
+    assert "--array-delimiter=|" in exporter.import_command()
+
+
+def test_data_files_rotate_at_rows_per_file(make_config, tmp_path):
+    exporter, _, chunks, _ = export(make_config, tmp_path, chunks=5, rows_per_file=2)
+
+    files = sorted(exporter.directory.glob("nodes.TextChunk.0.0*.csv"))
+    assert [path.name for path in files] == [
+        "nodes.TextChunk.0.00000.csv",
+        "nodes.TextChunk.0.00001.csv",
+        "nodes.TextChunk.0.00002.csv",
+    ]
+    assert [len(read_rows(path)) for path in files] == [2, 2, 1]
+    ids = [row[0] for path in files for row in read_rows(path)]
+    assert ids == [chunk.id for chunk in chunks]
+
+
+def test_import_script_lists_every_file(make_config, tmp_path):
+    exporter, _, _, _ = export(make_config, tmp_path, rows_per_file=2)
+    script = (exporter.directory / "import.sh").read_text(encoding="utf-8")
+
+    assert script.startswith('#!/bin/sh\ncd "$(dirname "$0")"\n')
+    command = shlex.split(script.split("\n", 2)[2].replace("\\\n", ""))
+    assert command[:5] == ["neo4j-admin", "database", "import", "full", "neo4j"]
+
+    listed = {}
+    for option in command[5:]:
+        if option.startswith(("--nodes=", "--relationships=")):
+            label, files = option.split("=", 1)[1].split("=", 1)
+            listed[label] = files.split(",")
+    assert set(listed) == {
+        "Document",
+        "Entity",
+        "TextChunk",
+        "WORKS_FOR",
+        "HAS_CHUNK",
+        "CONTAINS",
+        "NEXT",
+    }
+    assert listed["TextChunk"] == [
+        "nodes.TextChunk.0.header.csv",
+        "nodes.TextChunk.0.00000.csv",
+        "nodes.TextChunk.0.00001.csv",
+    ]
+    written = {path.name for path in exporter.directory.glob("*.csv")}
+    assert {name for files in listed.values() for name in files} == written
+    assert (exporter.directory / "schema.cypher").exists()
+
+
+def test_pipeline_exports_to_csv(make_config, make_pipeline, corpus, tmp_path):
+    config = make_config(sink="csv", export_config={"path": str(tmp_path / "out")})
+    corpus("a.txt", "Alice met Bob.")
+
+    pipeline = make_pipeline(config)
+    pipeline.execute_pipeline(str(corpus.directory))
+
+    assert len(pipeline.loaded_documents) == 1
+    assert (tmp_path / "out" / "import.sh").exists()
+    (entities,) = (tmp_path / "out").glob("nodes.Entity.0.0*.csv")
+    assert sorted(row[1] for row in read_rows(entities)) == ["Alice", "Bob"]
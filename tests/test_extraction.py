@@ -0,0 +1,260 @@
+import json
+
+from conftest import ENTITIES
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from documentgraph.bench import FakeExtractionModel
+from documentgraph.models import TextChunk
+from documentgraph.transformation import EntityRelationExtractor
+
+
+class DroppingModel(FakeExtractionModel):
+    """
+    Modelo falso que omite de las respuestas empaquetadas los chunks cuyo texto
+    contiene `drop`, y anota los prompts recibidos.
+    """
+
+    drop: str = "Carol"
+    prompts: list = []
+
+    def _respond(self, messages):
+        prompt = messages[-1].content
+        self.prompts.append(prompt)
+        result = super()._respond(messages)
+        message = result.generations[0].message
+        if '<chunk id="' in prompt:
+            reply = json.loads(message.content)
+            reply["chunks"] = {
+                chunk_id: data
+                for chunk_id, data in reply["chunks"].items()
+                if not any(entity["name"] == self.drop for entity in data["entities"])
+            }
+            message.content = json.dumps(reply)
+        return result
+
+
+def make_extractor(make_config, model=None, **llm_config) -> EntityRelationExtractor:
+    extractor = EntityRelationExtractor(make_config(llm_config=llm_config))
+    extractor.llm = model or FakeExtractionModel(entities=ENTITIES)
+    return extractor
+
+
+def chunks(*texts: str) -> list[TextChunk]:
+    return [TextChunk(content=text, document_id="doc") for text in texts]
+
+
+def test_parse_packed_reads_results_by_chunk_id(make_config):
+    extractor = make_extractor(make_config, pack_tokens=100)
+    reply = {
+        "chunks": {
+            "1": {
+                "entities": [
+                    {"name": "Alice", "type": "Person"},
+                    {"name": "Bob", "type": "Person"},
+                ],
+                "relationships": [
+                    {"source_name": "Alice", "target_name": "Bob", "type": "KNOWS"}
+                ],
+            },
+            "2": {"entities": [], "relationships": []},
+        }
+    }
+    message = AIMessage(
+        content=f"Aquí está:\n```json\n{json.dumps(reply)}\n```\nEspero que sirva."
+    )
+
+    results = extractor.parse_packed(message)
+
+    assert set(results) == {"1", "2"}
+    alice, bob = results["1"].entities
+    (knows,) = results["1"].relationships
+    assert (knows.source_id, knows.target_id) == (alice.id, bob.id)
+    assert results["2"].entities == []
+
+
+def test_parse_packed_skips_invalid_entries(make_config):
+    extractor = make_extractor(make_config, pack_tokens=100)
+    reply = {
+        "chunks": {
+            "1": {"entities": [], "relationships": []},
+            "2": {"entities": "Alice"},
+            "3": "sin resultado",
+        }
+    }
+
+    assert set(extractor.parse_packed(AIMessage(content=json.dumps(reply)))) == {"1"}
+    assert extractor.parse_packed(AIMessage(content="No puedo responder")) == {}
+    assert extractor.parse_packed(AIMessage(content='{"results": []}')) == {}
+    assert extractor.parse_packed(AIMessage(content='{"chunks": [1, 2]}')) == {}
+
+
+def test_pack_texts_respects_token_and_chunk_limits(make_config):
+    extractor = make_extractor(make_config, pack_tokens=6, pack_max_chunks=2)
+    # One token per word with the test encoding
+    texts = ["a b", "c d", "e f", "g h i j k l m n", "o"]
+
+    assert extractor.pack_texts(texts) == [[0, 1], [2], [3], [4]]
+
+
+def test_packed_extraction_retries_missing_chunks_alone(make_config):
+    model = DroppingModel(entities=ENTITIES, prompts=[])
+    extractor = make_extractor(make_config, model, pack_tokens=1000)
+
+    results = extractor.extract(
+        chunks("Alice met Bob.", "Carol met Acme.", "Bob met Acme.")
+    )
+
+    assert [[entity.name for entity in result.entities] for result in results] == [
+        ["Alice", "Bob"],
+        ["Carol", "Acme"],
+        ["Bob", "Acme"],
+    ]
+    # One packed request, then the missing chunk on its own
+    packed, single = model.prompts
+    assert packed.count('<chunk id="') == 3
+    assert '<chunk id="' not in single
+    assert "Carol met Acme." in single
+    assert "Alice met Bob." not in single
+
+
+class FailingModel(FakeExtractionModel):
+    """
+    Modelo falso que falla las primeras `failures` veces que recibe un texto
+    con `fail_on`, con una excepción o, con `malformed`, con una respuesta que
+    no es JSON.
+    """
+
+    fail_on: str = "Carol"
+    failures: int = 1
+    malformed: bool = False
+    calls: dict = {}
+
+    def _respond(self, messages):
+        prompt = messages[-1].content
+        if self.fail_on in prompt:
+            self.calls[self.fail_on] = self.calls.get(self.fail_on, 0) + 1
+            if self.calls[self.fail_on] <= self.failures:
+                if self.malformed:
+                    message = AIMessage(content="Lo siento, no puedo ayudar.")
+                    return ChatResult(generations=[ChatGeneration(message=message)])
+                raise RuntimeError("Error del servidor")
+        return super()._respond(messages)
+
+
+def test_failed_chunk_is_retried_alone(make_config):
+    model = FailingModel(entities=ENTITIES, failures=2, calls={})
+    extractor = make_extractor(make_config, model, extraction_retries=2)
+
+    results = extractor.extract(chunks("Alice met Bob.", "Carol met Acme."))
+
+    assert [result.error for result in results] == [None, None]
+    assert [entity.name for entity in results[1].entities] == ["Carol", "Acme"]
+    assert model.calls == {"Carol": 3}
+
+
+def test_persistent_failure_only_affects_its_chunk(make_config):
+    model = FailingModel(entities=ENTITIES, failures=10, calls={})
+    extractor = make_extractor(make_config, model, extraction_retries=1)
+
+    results = extractor.extract(
+        chunks("Alice met Bob.", "Carol met Acme.", "Bob met Acme.")
+    )
+
+    assert results[1].entities == []
+    assert results[1].error == "RuntimeError: Error del servidor"
+    assert [entity.name for entity in results[0].entities] == ["Alice", "Bob"]
+    assert [entity.name for entity in results[2].entities] == ["Bob", "Acme"]
+    assert model.calls == {"Carol": 2}
+
+
+def test_malformed_reply_is_retried(make_config):
+    model = FailingModel(entities=ENTITIES, malformed=True, calls={})
+    extractor = make_extractor(make_config, model, extraction_retries=1)
+
+    (result,) = extractor.extract(chunks("Carol met Acme."))
+
+    assert result.error is None
+    assert [entity.name for entity in result.entities] == ["Carol", "Acme"]
+    assert model.calls == {"Carol": 2}
+
+
+def test_failed_chunks_are_not_cached(make_config, tmp_path):
+    model = FailingModel(entities=ENTITIES, failures=1, calls={})
+    extractor = make_extractor(
+        make_config,
+        model,
+        extraction_retries=0,
+        cache_path=str(tmp_path / "extraction.sqlite"),
+    )
+    texts = chunks("Alice met Bob.", "Carol met Acme.")
+
+    assert [result.error is None for result in extractor.extract(texts)] == [
+        True,
+        False,
+    ]
+    # Only the failed chunk goes back to the model
+    second = extractor.extract(texts)
+    assert [result.error for result in second] == [None, None]
+    assert model.calls == {"Carol": 2}
+
+
+def test_pipeline_loads_a_document_with_a_failed_chunk(
+    make_config, make_pipeline, corpus
+):
+    config = make_config(
+        chunk_config={"size": 20, "overlap": 0},
+        llm_config={"extraction_retries": 0},
+    )
+    pipeline = make_pipeline(config)
+    pipeline.entity_relation_extractor.llm = FailingModel(
+        entities=ENTITIES, failures=10, calls={}
+    )
+    sink = pipeline.graph_loader
+    corpus("a.txt", "Alice met Bob.\n\nCarol met Acme.")
+
+    report = pipeline.execute_pipeline(str(corpus.directory))
+
+    assert len(pipeline.loaded_documents) == 1
+    assert report["counters"]["extraction_errors_total"] == 1
+    assert sink.counts()["TextChunk"] == 2
+    assert sorted(entity["name"] for entity in sink.nodes["Entity"].values()) == [
+        "Alice",
+        "Bob",
+    ]
+
+
+def test_cached_extractions_skip_the_model(make_config, tmp_path):
+    cache_path = str(tmp_path / "extraction.sqlite")
+    texts = chunks("Alice met Bob.", "Carol met Acme.", "Alice met Bob.")
+    first = make_extractor(
+        make_config, DroppingModel(entities=ENTITIES, prompts=[]), cache_path=cache_path
+    )
+    expected = first.extract(texts)
+
+    model = DroppingModel(entities=ENTITIES, prompts=[])
+    second = make_extractor(make_config, model, cache_path=cache_path)
+
+    # Repeated texts are extracted once, and not at all on the next run
+    assert len(first.llm.prompts) == 2
+    assert second.extract(texts) == expected
+    assert model.prompts == []
+    assert (second.cache.hits, second.cache.misses) == (3, 0)
+
+
+def test_new_prompt_version_invalidates_the_cache(make_config, tmp_path):
+    cache_path = str(tmp_path / "extraction.sqlite")
+    texts = chunks("Alice met Bob.")
+    make_extractor(make_config, cache_path=cache_path).extract(texts)
+
+    model = DroppingModel(entities=ENTITIES, prompts=[])
+    extractor = make_extractor(
+        make_config, model, cache_path=cache_path, prompt_version="2"
+    )
+    extractor.extract(texts)
+
+    assert len(model.prompts) == 1
+    # Only the result of the previous version is removed
+    assert extractor.invalidate_cache() == 1
+    extractor.extract(texts)
+    assert len(model.prompts) == 1
@@ -0,0 +1,92 @@
+import pytest
+from conftest import entity_names
+
+from documentgraph.sinks import InMemoryGraphSink
+
+
+def related(sink: InMemoryGraphSink) -> set[tuple[str, str]]:
+    names = {
+        entity_id: entity["name"] for entity_id, entity in sink.nodes["Entity"].items()
+    }
+    return {
+        (names[source], names[target])
+        for rel_type, source, target in sink.relationships
+        if rel_type == "RELATED_TO"
+    }
+
+
+def run(make_pipeline, config, sink, folder):
+    pipeline = make_pipeline(config, sink)
+    pipeline.execute_pipeline(str(folder))
+    return pipeline
+
+
+def test_unchanged_documents_are_skipped(make_config, make_pipeline, corpus):
+    config = make_config(incremental=True)
+    sink = InMemoryGraphSink(config)
+    corpus("a.txt", "Alice met Bob.")
+
+    first = run(make_pipeline, config, sink, corpus.directory)
+    second = run(make_pipeline, config, sink, corpus.directory)
+
+    assert len(first.loaded_documents) == 1
+    assert second.loaded_documents == []
+    assert sink.counts()["Document"] == 1
+
+
+def test_changed_document_replaces_its_old_data(make_config, make_pipeline, corpus):
+    config = make_config(incremental=True)
+    sink = InMemoryGraphSink(config)
+    corpus("a.txt", "Alice met Bob and Acme.")
+    corpus("b.txt", "Alice met Bob.")
+    run(make_pipeline, config, sink, corpus.directory)
+    assert related(sink) == {("Alice", "Bob"), ("Bob", "Acme")}
+
+    corpus("a.txt", "Alice met Carol.")
+    run(make_pipeline, config, sink, corpus.directory)
+
+    # Bob -> Acme came only from the old version of a.txt; Alice -> Bob is
+    # still contributed by b.txt
+    assert related(sink) == {("Alice", "Bob"), ("Alice", "Carol")}
+    assert entity_names(sink) == ["Alice", "Bob", "Carol"]
+    texts = sorted(chunk["text"] for chunk in sink.nodes["TextChunk"].values())
+    assert texts == ["Alice met Bob.", "Alice met Carol."]
+
+
+def test_failed_reload_keeps_the_previous_version(make_config, make_pipeline, corpus):
+    config = make_config(incremental=True)
+    sink = InMemoryGraphSink(config)
+    corpus("a.txt", "Alice met Bob.")
+    run(make_pipeline, config, sink, corpus.directory)
+
+    corpus("a.txt", "Alice met Carol.")
+    pipeline = make_pipeline(config, sink)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("LLM caído")
+
+    pipeline.extract_entities_and_relationships = fail
+    with pytest.raises(RuntimeError):
+        pipeline.execute_pipeline(str(corpus.directory))
+    assert pipeline.loaded_documents == []
+    assert related(sink) == {("Alice", "Bob")}
+
+    # Without a manifest entry for the new version, the next run retries it
+    retry = run(make_pipeline, config, sink, corpus.directory)
+    assert len(retry.loaded_documents) == 1
+    assert related(sink) == {("Alice", "Carol")}
+
+
+def test_deleted_documents_are_removed(make_config, make_pipeline, corpus):
+    config = make_config(incremental=True)
+    sink = InMemoryGraphSink(config)
+    corpus("a.txt", "Alice met Bob.")
+    corpus("b.txt", "Carol met Acme.")
+    run(make_pipeline, config, sink, corpus.directory)
+
+    (corpus.directory / "b.txt").unlink()
+    run(make_pipeline, config, sink, corpus.directory)
+
+    assert sink.counts()["Document"] == 1
+    assert entity_names(sink) == ["Alice", "Bob"]
+    assert related(sink) == {("Alice", "Bob")}
@@ -0,0 +1,119 @@
+import pytest
+
+from documentgraph.journal import RunJournal
+from documentgraph.sinks import InMemoryGraphSink
+
+
+def fail_on(word: str):
+    def extract(chunks):
+        if any(word in chunk.content for chunk in chunks):
+            raise RuntimeError(f"Fallo con {word}")
+        return original(chunks)
+
+    original = None
+
+    def install(pipeline):
+        nonlocal original
+        original = pipeline.extract_entities_and_relationships
+        pipeline.extract_entities_and_relationships = extract
+
+    return install
+
+
+def must_not_run(*args, **kwargs):
+    raise AssertionError("La etapa debería reutilizar el artefacto guardado")
+
+
+@pytest.fixture
+def journal_config(make_config, tmp_path):
+    def journal_config(**overrides):
+        return make_config(journal_path=str(tmp_path / "journal.sqlite"), **overrides)
+
+    return journal_config
+
+
+def test_resume_reuses_artifacts_and_skips_done(journal_config, make_pipeline, corpus):
+    config = journal_config()
+    sink = InMemoryGraphSink(config)
+    corpus("a.txt", "Alice met Bob.")
+    corpus("b.txt", "Carol met Acme.")
+
+    first = make_pipeline(config, sink)
+    fail_on("Carol")(first)
+    first.execute_pipeline(str(corpus.directory))
+
+    journal = RunJournal(config.journal_path)
+    (failed,) = journal.failed_documents()
+    assert failed["path"].endswith("b.txt")
+    assert failed["stage"] == "extract"
+    assert failed["attempts"] == 1
+    assert [document.filename for document in first.loaded_documents] == ["a.txt"]
+
+    # The embeddings of b.txt were saved before extraction failed
+    second = make_pipeline(config, sink)
+    second.generate_embeddings = must_not_run
+    second.execute_pipeline(str(corpus.directory))
+    assert [document.filename for document in second.loaded_documents] == ["b.txt"]
+    assert journal.failed_documents() == []
+    assert sink.counts()["Document"] == 2
+
+    third = make_pipeline(config, sink)
+    third.execute_pipeline(str(corpus.directory))
+    assert third.loaded_documents == []
+
+
+def test_resume_false_clears_the_journal(journal_config, make_pipeline, corpus):
+    config = journal_config()
+    corpus("a.txt", "Alice met Bob.")
+    make_pipeline(config).execute_pipeline(str(corpus.directory))
+
+    pipeline = make_pipeline(config)
+    pipeline.execute_pipeline(str(corpus.directory), resume=False)
+    assert len(pipeline.loaded_documents) == 1
+
+
+def test_documents_stop_after_max_attempts(journal_config, make_pipeline, corpus):
+    config = journal_config(max_document_attempts=2)
+    corpus("a.txt", "Alice met Carol.")
+
+    for _ in range(3):
+        pipeline = make_pipeline(config)
+        fail_on("Carol")(pipeline)
+        pipeline.execute_pipeline(str(corpus.directory))
+
+    (failed,) = RunJournal(config.journal_path).failed_documents()
+    assert failed["attempts"] == 2
+
+
+@pytest.mark.parametrize("n_jobs", [1, 4])
+def test_streamed_document_with_a_failed_part_stays_failed(
+    journal_config, make_pipeline, corpus, n_jobs
+):
+    config = journal_config(
+        n_jobs=n_jobs,
+        source_config={
+            "stream_threshold": 100,
+            "window_size": 300,
+            "stream_batch_chunks": 2,
+        },
+        chunk_config={"size": 60, "overlap": 0},
+    )
+    sink = InMemoryGraphSink(config)
+    sentences = ["Alice met Bob near the old river bank."] * 20
+    sentences[-1] = "Carol met Acme near the old river bank."
+    corpus("big.txt", " ".join(sentences))
+
+    pipeline = make_pipeline(config, sink)
+    fail_on("Carol")(pipeline)
+    pipeline.execute_pipeline(str(corpus.directory))
+
+    # Earlier parts reached the graph, but the document is not done
+    assert sink.counts()["TextChunk"] > 0
+    assert pipeline.loaded_documents == []
+    (failed,) = RunJournal(config.journal_path).failed_documents()
+    assert failed["path"].endswith("big.txt")
+
+    retry = make_pipeline(config, sink)
+    retry.execute_pipeline(str(corpus.directory))
+    assert [document.filename for document in retry.loaded_documents] == ["big.txt"]
+    assert RunJournal(config.journal_path).failed_documents() == []
@@ -0,0 +1,282 @@
+import pytest
+
+from documentgraph.loading import (
+    KnowledgeGraphLoader,
+    Neo4JQueryManager,
+    flatten_properties,
+    sanitize_relationship_type,
+)
+from documentgraph.models import (
+    Document,
+    Entity,
+    ExtractionResult,
+    Relationship,
+    TextChunk,
+)
+from documentgraph.sinks import InMemoryGraphSink
+
+
+def make_document(chunks: int = 2) -> tuple[Document, list, list]:
+    document = Document(filename="a.txt", content="", content_hash="h1")
+    alice = Entity(name="Alice", type="Person")
+    bob = Entity(name="Bob", type="Person")
+    knows = Relationship(source_id=alice.id, target_id=bob.id, type="knows")
+    text_chunks = [
+        TextChunk(content=f"chunk {index}", document_id=document.id)
+        for index in range(chunks)
+    ]
+    # Every chunk mentions the same entities and relationship
+    results = [
+        ExtractionResult(entities=[alice, bob], relationships=[knows])
+        for _ in text_chunks
+    ]
+    return document, text_chunks, results
+
+
+class FakeSession:
+    def __init__(self, writes):
+        self.writes = writes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, function, query, rows):
+        self.writes.append((query, list(rows)))
+
+
+class FakeRecord:
+    def __init__(self, data):
+        self._data = data
+
+    def data(self):
+        return self._data
+
+
+class FakeDriver:
+    def __init__(self, indexes=None):
+        self.writes = []
+        self.queries = []
+        # Records returned by SHOW INDEXES, e.g. the existing vector index
+        self.indexes = indexes or []
+
+    def session(self):
+        return FakeSession(self.writes)
+
+    def execute_query(self, query, parameters=None, **kwargs):
+        self.queries.append((query, parameters or kwargs))
+        records = self.indexes if query == Neo4JQueryManager.show_index() else []
+        return [FakeRecord(record) for record in records], None, None
+
+
+def test_buffer_merges_repeated_rows(make_config):
+    sink = InMemoryGraphSink(make_config())
+    document, chunks, results = make_document(chunks=3)
+
+    assert sink.add_document(document, chunks, results) == []
+
+    steps = dict(sink.flush_steps())
+    assert len(steps[Neo4JQueryManager.merge_entities()]) == 2
+    (relationship,) = steps[Neo4JQueryManager.merge_relationships("KNOWS")]
+    assert relationship["sources"] == [f"{document.id}:h1"]
+    assert len(steps[Neo4JQueryManager.merge_chunks()]) == 3
+    assert len(steps[Neo4JQueryManager.merge_next_links()]) == 2
+
+
+def test_add_document_flushes_at_load_batch_size(make_config):
+    # One document row, two entities, one relationship, two chunks and a link
+    sink = InMemoryGraphSink(make_config(load_batch_size=7))
+    first = make_document()
+    second = make_document()
+
+    assert sink.add_document(*first, complete=False) == []
+    assert sink.add_document(*second) == [second[0]]
+    assert sink.flush() == []
+    assert sink.counts()["Document"] == 2
+    assert sink.counts()["TextChunk"] == 4
+
+
+def test_partial_document_is_not_reported_as_loaded(make_config):
+    sink = InMemoryGraphSink(make_config())
+    document, chunks, results = make_document(chunks=4)
+
+    sink.add_document(document, chunks[:2], results[:2], complete=False)
+    assert sink.flush() == []
+    sink.add_document(document, chunks[2:], results[2:], prev_chunk_id=chunks[1].id)
+    assert sink.flush() == [document]
+    assert sink.neighbors(chunks[1].id, "NEXT") == [chunks[2].id]
+
+
+def test_flush_writes_nodes_before_relationships_in_batches(make_config):
+    loader = KnowledgeGraphLoader(make_config(load_batch_size=2))
+    loader._driver = FakeDriver()
+    document, chunks, results = make_document(chunks=5)
+
+    # The buffered rows exceed load_batch_size, so add_document flushes them
+    assert loader.add_document(document, chunks, results) == [document]
+
+    writes = loader._driver.writes
+    assert [len(rows) for query, rows in writes] == [1, 2, 1, 2, 2, 1, 2, 2]
+    queries = [query for query, _ in writes]
+    assert queries[0] == Neo4JQueryManager.merge_documents()
+    assert queries[1] == Neo4JQueryManager.merge_entities()
+    assert queries[2] == Neo4JQueryManager.merge_relationships("KNOWS")
+    assert queries[3:6] == [Neo4JQueryManager.merge_chunks()] * 3
+    assert queries[6:] == [Neo4JQueryManager.merge_next_links()] * 2
+    # A successful flush empties the buffers
+    assert loader.flush() == []
+
+
+def test_next_links_need_both_chunks(make_config):
+    sink = InMemoryGraphSink(make_config())
+    document, chunks, results = make_document(chunks=2)
+
+    # The previous part's last chunk is no longer in the graph
+    sink.add_document(document, chunks, results, prev_chunk_id="deleted")
+    sink.flush()
+
+    assert "deleted" not in sink.nodes["TextChunk"]
+    assert sink.neighbors("deleted", "NEXT") == []
+    assert sink.counts()["NEXT"] == 1
+    query = Neo4JQueryManager.merge_next_links()
+    assert "MATCH (prev:TextChunk {id: row.prev_id})" in query
+    assert "MERGE (prev:" not in query and "MERGE (c:" not in query
+
+
+def vector_index(dimension: int, similarity: str = "COSINE") -> dict:
+    return {
+        "type": "VECTOR",
+        "state": "ONLINE",
+        "options": {
+            "indexConfig": {
+                "vector.dimensions": dimension,
+                "vector.similarity_function": similarity,
+            }
+        },
+    }
+
+
+def loader_with_index(make_config, existing=None) -> KnowledgeGraphLoader:
+    loader = KnowledgeGraphLoader(
+        make_config(embedding_config={"dimension": 8, "similarity": "cosine"})
+    )
+    loader._driver = FakeDriver([existing] if existing else [])
+    return loader
+
+
+def test_vector_index_is_created_from_the_embedding_config(make_config):
+    loader = loader_with_index(make_config)
+
+    loader.ensure_vector_index()
+
+    _, (query, parameters) = loader._driver.queries
+    assert query == Neo4JQueryManager.create_vector_index("text_chunk_embeddings")
+    assert parameters == {"dimension": 8, "similarity": "cosine"}
+
+
+def test_matching_vector_index_is_kept(make_config):
+    loader = loader_with_index(make_config, vector_index(8))
+
+    loader.ensure_vector_index()
+
+    assert len(loader._driver.queries) == 1
+
+
+def test_vector_index_with_another_dimension_is_rebuilt_on_request(make_config):
+    loader = loader_with_index(make_config, vector_index(1536))
+
+    with pytest.raises(ValueError, match="otra configuración"):
+        loader.ensure_vector_index()
+    loader.ensure_vector_index(recreate=True)
+
+    queries = [query for query, _ in loader._driver.queries[2:]]
+    assert queries == [
+        Neo4JQueryManager.drop_index("text_chunk_embeddings"),
+        Neo4JQueryManager.create_vector_index("text_chunk_embeddings"),
+    ]
+
+
+def test_pipeline_creates_the_schema_before_loading(make_config, make_pipeline, corpus):
+    config = make_config(sink="neo4j", embedding_config={"dimension": 8})
+    loader = KnowledgeGraphLoader(config)
+    driver = loader._driver = FakeDriver()
+    # Record the writes in the same list as the schema queries to check the order
+    driver.writes = driver.queries
+    corpus("a.txt", "Alice met Bob.")
+
+    make_pipeline(config, loader).execute_pipeline(str(corpus.directory))
+
+    queries = [query for query, _ in driver.queries]
+    schema = Neo4JQueryManager.create_schema()
+    assert queries[: len(schema)] == schema
+    assert queries[len(schema) + 1] == Neo4JQueryManager.create_vector_index(
+        "text_chunk_embeddings"
+    )
+    assert Neo4JQueryManager.merge_documents() in queries[len(schema) + 2 :]
+    # Every label written by MERGE has a uniqueness constraint on its id
+    for label in ("Document", "TextChunk", "Entity"):
+        assert any(
+            f":{label}) REQUIRE" in query and ".id IS UNIQUE" in query
+            for query in schema
+        )
+
+
+def test_relationship_types_are_sanitized():
+    assert sanitize_relationship_type("works for") == "WORKS_FOR"
+    assert sanitize_relationship_type("nacióEnCiudad") == "NACIÓENCIUDAD"
+    assert sanitize_relationship_type("part-of (2020)") == "PART_OF_2020"
+    assert sanitize_relationship_type("1st owner") == "R_1ST_OWNER"
+    assert sanitize_relationship_type("`; DROP") == "DROP"
+    assert sanitize_relationship_type("!!") == "RELATED_TO"
+
+
+def test_properties_are_flattened_for_neo4j():
+    properties = {
+        "since": 2020,
+        "role": {"title": "CEO", "acting": False},
+        "tags": ["a"],
+        "history": [{"year": 2019}],
+        "missing": None,
+    }
+
+    assert flatten_properties(properties) == {
+        "since": 2020,
+        "role.title": "CEO",
+        "role.acting": False,
+        "tags": ["a"],
+        "history": '[{"year": 2019}]',
+    }
+
+
+def test_relationships_are_written_natively_one_query_per_type(make_config):
+    sink = InMemoryGraphSink(make_config())
+    document, chunks, results = make_document(chunks=2)
+    alice, bob = results[0].entities
+    results[1].relationships = [
+        Relationship(
+            source_id=bob.id, target_id=alice.id, type="works for", properties={}
+        ),
+        Relationship(
+            source_id=alice.id,
+            target_id=bob.id,
+            type="KNOWS",
+            properties={"since": 2020},
+        ),
+    ]
+
+    sink.add_document(document, chunks, results)
+    steps = dict(sink.flush_steps())
+
+    knows = Neo4JQueryManager.merge_relationships("KNOWS")
+    works_for = Neo4JQueryManager.merge_relationships("WORKS_FOR")
+    assert "[r:`WORKS_FOR`]" in works_for
+    # Repeated edges are merged into one row with their properties combined
+    assert [row["properties"] for row in steps[knows]] == [{"since": 2020}]
+    assert len(steps[works_for]) == 1
+    assert not any("apoc" in query.lower() for query in steps)
+
+    sink.flush()
+    assert sink.neighbors(alice.id, "KNOWS") == [bob.id]
+    assert sink.neighbors(bob.id, "WORKS_FOR") == [alice.id]
@@ -0,0 +1,123 @@
+import socket
+import urllib.request
+
+import pytest
+
+from documentgraph.metrics import MetricsRegistry
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def fetch(port: int) -> str:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as reply:
+        return reply.read().decode("utf-8")
+
+
+def test_report_summarises_stages_and_counters():
+    metrics = MetricsRegistry()
+    for seconds in (0.01, 0.02, 0.03, 0.5):
+        metrics.observe("embed", seconds, items=10)
+    metrics.inc("documents_total", 3)
+    metrics.gauge("llm_tokens", 1200)
+
+    report = metrics.report()
+
+    embed = report["stages"]["embed"]
+    assert (embed["calls"], embed["items"]) == (4, 40)
+    assert embed["busy_seconds"] == pytest.approx(0.56)
+    assert embed["max_seconds"] == 0.5
+    assert embed["p50_seconds"] <= embed["p95_seconds"] <= embed["max_seconds"]
+    assert report["counters"] == {"documents_total": 3}
+    assert report["gauges"] == {"llm_tokens": 1200}
+
+    metrics.reset()
+    assert metrics.report()["stages"] == {}
+
+
+def test_prometheus_text_format():
+    metrics = MetricsRegistry()
+    metrics.observe("load", 0.2, items=5)
+    metrics.inc("documents_total")
+
+    text = metrics.to_prometheus()
+
+    assert 'documentgraph_stage_seconds_bucket{stage="load",le="+Inf"} 1' in text
+    assert 'documentgraph_stage_items_total{stage="load"} 5' in text
+    assert "# TYPE documentgraph_documents_total counter" in text
+    assert "documentgraph_documents_total 1" in text
+
+
+def test_serve_listens_on_localhost_until_shutdown():
+    metrics = MetricsRegistry()
+    metrics.inc("documents_total", 2)
+    server = metrics.serve(0)
+    host, port = server.server_address
+    try:
+        assert host == "127.0.0.1"
+        assert "documentgraph_documents_total 2" in fetch(port)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_pipeline_serves_metrics_only_while_running(
+    make_config, make_pipeline, corpus, tmp_path
+):
+    port = free_port()
+    config = make_config(
+        metrics_config={
+            "port": port,
+            "prometheus_path": str(tmp_path / "documentgraph.prom"),
+        }
+    )
+    corpus("a.txt", "Alice met Bob.")
+    pages = []
+
+    for _ in range(2):
+        pipeline = make_pipeline(config)
+        ensure_schema = pipeline.graph_loader.ensure_schema
+
+        def scrape(*args, **kwargs):
+            pages.append(fetch(port))
+            return ensure_schema(*args, **kwargs)
+
+        pipeline.graph_loader.ensure_schema = scrape
+        pipeline.execute_pipeline(str(corpus.directory))
+        # The port is released, so the next pipeline can bind it again
+        assert pipeline.metrics_server is None
+
+    assert len(pages) == 2
+    assert (
+        "documentgraph_documents_total" in (tmp_path / "documentgraph.prom").read_text()
+    )
+
+
+def test_pipeline_report_covers_stages_tokens_and_caches(
+    make_config, make_pipeline, corpus, tmp_path
+):
+    config = make_config(
+        chunk_config={"size": 20, "overlap": 0},
+        llm_config={"cache_path": str(tmp_path / "extraction.sqlite")},
+    )
+    corpus("a.txt", "Alice met Bob.\n\nCarol met Acme.")
+
+    report = make_pipeline(config).execute_pipeline(str(corpus.directory))
+
+    for stage in ("extract", "chunk", "embed", "llm", "resolve", "load", "flush"):
+        assert report["stages"][stage]["calls"] >= 1
+    assert report["stages"]["embed"]["items"] == 2
+    assert report["counters"]["documents_total"] == 1
+    gauges = report["gauges"]
+    # One embeddings request for both chunks and one LLM request per chunk,
+    # with the tokens reported by the model
+    assert (gauges["embedding_requests"], gauges["llm_requests"]) == (1, 2)
+    assert gauges["llm_tokens"] > 0
+    assert gauges["llm_cache_hit_rate"] == 0.0
+
+    again = make_pipeline(config).execute_pipeline(str(corpus.directory))
+    assert again["gauges"]["llm_requests"] == 0
+    assert again["gauges"]["llm_cache_hit_rate"] == 1.0
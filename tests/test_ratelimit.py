@@ -0,0 +1,130 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from documentgraph.ratelimit import RateLimiter
+
+
+def rate_limit_error(**headers) -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+class Flaky:
+    """
+    Función que lanza los errores de `errors` en orden y después devuelve "ok".
+    """
+
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("documentgraph.ratelimit.time.sleep", sleeps.append)
+    return sleeps
+
+
+def test_retries_follow_the_retry_after_header(sleeps):
+    limiter = RateLimiter(max_retries=3)
+    func = Flaky(
+        rate_limit_error(**{"retry-after-ms": "250"}),
+        rate_limit_error(**{"retry-after": "2"}),
+    )
+
+    assert limiter.call(func) == "ok"
+
+    assert func.calls == 3
+    assert [wait for wait in sleeps if wait] == [0.25, 2.0]
+    metrics = limiter.metrics()
+    assert (metrics["retries"], metrics["rate_limited"]) == (2, 2)
+
+
+def test_rate_limited_calls_slow_the_limiter_down(sleeps):
+    limiter = RateLimiter(requests_per_minute=600)
+
+    limiter.call(Flaky(rate_limit_error(), rate_limit_error()))
+
+    # Each 429 cuts the rate by a quarter and empties the bucket, so the retry
+    # waits for a request to be refilled; each success recovers 1% of the limit
+    assert limiter.metrics()["requests_per_minute_limit"] == pytest.approx(
+        600 * 0.75 * 0.75 + 6
+    )
+    assert max(sleeps) > 0
+
+
+def test_gives_up_after_max_retries(sleeps):
+    limiter = RateLimiter(max_retries=2, base_delay=0.5)
+    func = Flaky(*(openai.APITimeoutError(httpx.Request("POST", "https://x")),) * 5)
+
+    with pytest.raises(openai.APITimeoutError):
+        limiter.call(func)
+
+    assert func.calls == 3
+    # Exponential backoff with full jitter
+    assert 0 <= sleeps[0] <= 0.5 and 0 <= sleeps[1] <= 1.0
+
+
+def test_other_errors_are_not_retried(sleeps):
+    func = Flaky(ValueError("entrada no válida"))
+
+    with pytest.raises(ValueError):
+        RateLimiter().call(func)
+    assert func.calls == 1
+
+
+def test_token_budget_makes_callers_wait(sleeps):
+    limiter = RateLimiter(tokens_per_minute=600)
+
+    limiter.call(Flaky(), tokens=500)
+    limiter.call(Flaky(), tokens=400)
+
+    # The second call goes 300 tokens over budget: 30 seconds at 10 tokens/s
+    assert sleeps[0] == 0
+    assert sleeps[1] == pytest.approx(30, abs=0.1)
+
+
+def test_limits_are_adopted_from_the_response_headers():
+    limiter = RateLimiter()
+
+    limiter.update_from_headers(
+        {
+            "x-ratelimit-limit-requests": "500",
+            "x-ratelimit-limit-tokens": "200000",
+            "x-ratelimit-remaining-tokens": "1000",
+        }
+    )
+
+    metrics = limiter.metrics()
+    assert metrics["requests_per_minute_limit"] == 500
+    assert metrics["tokens_per_minute_limit"] == 200000
+    # Only 1000 tokens are left in this minute
+    assert limiter._reserve(1500) == pytest.approx(0.15, abs=0.01)
+
+
+def test_async_calls_retry_too(monkeypatch):
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr("documentgraph.ratelimit.asyncio.sleep", sleep)
+    func = Flaky(rate_limit_error(**{"retry-after": "1"}))
+
+    async def call():
+        return func()
+
+    assert asyncio.run(RateLimiter().acall(call)) == "ok"
+    assert func.calls == 2
+    assert 1.0 in sleeps
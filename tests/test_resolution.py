@@ -0,0 +1,78 @@
+from conftest import entity_names
+
+from documentgraph.models import Entity, ExtractionResult, Relationship
+from documentgraph.resolution import EntityResolver, entity_key, normalize_name
+from documentgraph.sinks import InMemoryGraphSink
+
+
+def result(*names: str, relationships=()) -> ExtractionResult:
+    entities = [Entity(name=name, type="Organization") for name in names]
+    return ExtractionResult(
+        entities=entities,
+        relationships=[
+            Relationship(source_name=source, target_name=target, type="OWNS")
+            for source, target in relationships
+        ],
+    )
+
+
+def test_names_are_normalized():
+    assert normalize_name("  ACME   Corp. ") == "acme corp"
+    assert entity_key("Ａcme Corp", "Organization") == "organization:acme corp"
+    assert entity_key("Acme", "Person") != entity_key("Acme", "Organization")
+
+
+def test_mentions_resolve_to_one_canonical_entity(make_config):
+    resolver = EntityResolver(make_config())
+
+    first, second = resolver.resolve(
+        [
+            result("ACME Corp.", "Globex"),
+            result(
+                "acme corp",
+                "Acme Corp",
+                "globex",
+                relationships=[("Acme Corp", "Globex"), ("ACME CORP", "GLOBEX")],
+            ),
+        ]
+    )
+
+    # The first mention gives the canonical name; the other spellings, in any
+    # chunk, resolve to the same id
+    acme, globex = first.entities
+    assert acme.name == "ACME Corp."
+    assert acme.key == "organization:acme corp"
+    assert second.entities == [acme, globex]
+    # Both relationships are the same edge once the names are resolved
+    (relationship,) = second.relationships
+    assert (relationship.source_id, relationship.target_id) == (acme.id, globex.id)
+
+
+def test_canonical_entities_persist_across_runs(make_config, tmp_path):
+    config = make_config(
+        resolution_config={"index_path": str(tmp_path / "entities.sqlite")}
+    )
+    (first,) = EntityResolver(config).resolve([result("Acme Corp")])
+
+    # A new resolver, as in the next run, reuses the stored id and name
+    (second,) = EntityResolver(config).resolve([result("ACME CORP")])
+
+    assert second.entities == first.entities
+
+
+def test_entities_are_shared_across_documents(make_config, make_pipeline, corpus):
+    config = make_config()
+    sink = InMemoryGraphSink(config)
+    corpus("a.txt", "Alice met Bob.")
+    corpus("b.txt", "Bob met Acme.")
+
+    make_pipeline(config, sink).execute_pipeline(str(corpus.directory))
+
+    assert entity_names(sink) == ["Acme", "Alice", "Bob"]
+    bob = next(
+        entity_id
+        for entity_id, entity in sink.nodes["Entity"].items()
+        if entity["name"] == "Bob"
+    )
+    # Both documents' chunks point at the same Bob node
+    assert len(sink.neighbors(bob, "CONTAINS", direction="in")) == 2
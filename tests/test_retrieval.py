@@ -0,0 +1,66 @@
+from documentgraph.bench import FakeEmbeddings
+from documentgraph.loading import Neo4JQueryManager
+from documentgraph.retrieval import GraphRetriever
+
+ROW = {
+    "chunk_id": "c1",
+    "text": "Alice met Bob.",
+    "score": 0.92,
+    "document_id": "d1",
+    "filename": "a.txt",
+    "entities": [
+        {
+            "id": "e1",
+            "name": "Alice",
+            "type": "Person",
+            "neighbors": [
+                {
+                    "id": "e2",
+                    "name": "Bob",
+                    "type": "Person",
+                    "relationship": "KNOWS",
+                    "outgoing": True,
+                }
+            ],
+        }
+    ],
+}
+
+
+class Record:
+    def data(self):
+        return ROW
+
+
+class SearchDriver:
+    def __init__(self):
+        self.queries = []
+
+    def execute_query(self, query, parameters, **kwargs):
+        self.queries.append((query, parameters))
+        return [Record()], None, None
+
+    def close(self):
+        pass
+
+
+def test_search_embeds_the_query_and_reads_the_graph_context(make_config):
+    config = make_config(
+        graph_db_config={"uri": "bolt://localhost:7687", "user": "", "password": ""},
+        embedding_config={"dimension": 8},
+    )
+    retriever = GraphRetriever(config)
+    retriever.embedding_generator.model = FakeEmbeddings(8)
+    retriever.driver = SearchDriver()
+
+    (match,) = retriever.search("Who did Alice meet?", top_k=3)
+
+    query, parameters = retriever.driver.queries[0]
+    assert query == Neo4JQueryManager.vector_search()
+    assert parameters["index_name"] == "text_chunk_embeddings"
+    assert parameters["top_k"] == 3
+    assert parameters["embedding"] == FakeEmbeddings(8)._embed("Who did Alice meet?")
+    assert (match.chunk_id, match.filename, match.score) == ("c1", "a.txt", 0.92)
+    assert match.entities[0].name == "Alice"
+    assert match.entities[0].neighbors[0].relationship == "KNOWS"
+    retriever.close()
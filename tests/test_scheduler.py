@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+from conftest import entity_names
+
+from documentgraph.scheduler import PipelineScheduler
+from documentgraph.sinks import InMemoryGraphSink
+
+
+def test_stages_run_items_in_parallel_threads():
+    # Each of the three workers waits for the other two, so the stage only
+    # finishes if the items are processed at the same time
+    barrier = threading.Barrier(3, timeout=5)
+    results = []
+
+    def wait(item):
+        barrier.wait()
+        return item
+
+    def split(item):
+        return iter([item, item * 10])
+
+    scheduler = PipelineScheduler(
+        [("wait", wait, 3), ("split", split, 2), ("collect", results.append, 1)]
+    )
+    scheduler.run([1, 2, 3])
+
+    assert sorted(results) == [1, 2, 3, 10, 20, 30]
+
+
+def test_none_drops_the_item():
+    results = []
+
+    def keep_odd(item):
+        return item if item % 2 else None
+
+    PipelineScheduler([("odd", keep_odd, 2), ("collect", results.append, 1)]).run(
+        range(6)
+    )
+    assert sorted(results) == [1, 3, 5]
+
+
+def test_first_stage_error_stops_the_run():
+    seen = []
+
+    def fail(item):
+        if item == 3:
+            raise ValueError("fallo")
+        return item
+
+    scheduler = PipelineScheduler(
+        [("fail", fail, 2), ("collect", seen.append, 1)], queue_size=2
+    )
+
+    with pytest.raises(ValueError, match="fallo"):
+        scheduler.run(range(1000))
+    assert len(seen) < 1000
+
+
+def test_concurrent_run_loads_the_same_graph(make_config, make_pipeline, corpus):
+    for index in range(6):
+        corpus(f"doc{index}.txt", f"Alice met Bob {index} times.\n\nCarol met Acme.")
+    sinks = []
+    for n_jobs in (1, 4):
+        config = make_config(n_jobs=n_jobs, chunk_config={"size": 20, "overlap": 0})
+        sink = InMemoryGraphSink(config)
+        make_pipeline(config, sink).execute_pipeline(str(corpus.directory))
+        sinks.append(sink)
+
+    serial, concurrent = sinks
+    assert concurrent.counts() == serial.counts()
+    assert entity_names(concurrent) == ["Acme", "Alice", "Bob", "Carol"]
+    assert sorted(
+        chunk["text"] for chunk in concurrent.nodes["TextChunk"].values()
+    ) == sorted(chunk["text"] for chunk in serial.nodes["TextChunk"].values())
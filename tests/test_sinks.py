@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+
+from documentgraph.export import JSONLGraphSink
+from documentgraph.models import Document, Entity, ExtractionResult, TextChunk
+from documentgraph.sinks import (
+    InMemoryGraphSink,
+    ThreadedGraphSink,
+    create_async_sink,
+    create_sink,
+)
+
+
+def read_lines(path) -> list[dict]:
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_sinks_are_created_by_name(make_config):
+    assert isinstance(create_sink(make_config(sink="memory")), InMemoryGraphSink)
+    assert isinstance(create_sink(make_config(sink="jsonl")), JSONLGraphSink)
+    async_sink = create_async_sink(make_config(sink="memory"))
+    assert isinstance(async_sink, ThreadedGraphSink)
+    assert isinstance(async_sink.sink, InMemoryGraphSink)
+    with pytest.raises(ValueError, match="Destino de carga desconocido"):
+        create_sink(make_config(sink="sqlite"))
+
+
+def test_jsonl_run_writes_the_graph_once(make_config, make_pipeline, corpus, tmp_path):
+    config = make_config(sink="jsonl")
+    corpus("a.txt", "Alice met Bob.")
+    corpus("b.txt", "Carol met Acme.")
+
+    for _ in range(2):
+        make_pipeline(config).execute_pipeline(str(corpus.directory))
+
+    # The second run overwrites the files instead of appending to them
+    nodes = read_lines(tmp_path / "export" / "nodes.jsonl")
+    labels = sorted(node["labels"][0] for node in nodes)
+    assert labels == ["Document"] * 2 + ["Entity"] * 4 + ["TextChunk"] * 2
+    relationships = read_lines(tmp_path / "export" / "relationships.jsonl")
+    assert sorted(rel["label"] for rel in relationships) == (
+        ["CONTAINS"] * 4 + ["HAS_CHUNK"] * 2 + ["RELATED_TO"] * 2
+    )
+
+
+def test_memory_sink_deletes_a_document_and_its_entities(
+    make_config, make_pipeline, corpus
+):
+    config = make_config()
+    sink = InMemoryGraphSink(config)
+    corpus("a.txt", "Alice met Bob.")
+    corpus("b.txt", "Bob met Acme.")
+    pipeline = make_pipeline(config, sink)
+    pipeline.execute_pipeline(str(corpus.directory))
+    first = next(
+        document
+        for document in pipeline.loaded_documents
+        if document.filename == "a.txt"
+    )
+
+    sink.delete_documents([first.id])
+
+    # Bob is still contained in b.txt; Alice only came from a.txt
+    counts = sink.counts()
+    assert (counts["Document"], counts["TextChunk"], counts["Entity"]) == (1, 1, 2)
+    assert counts["RELATED_TO"] == 1
+
+
+def test_threaded_sink_loads_through_the_wrapped_sink(make_config):
+    sink = InMemoryGraphSink(make_config())
+    threaded = ThreadedGraphSink(sink)
+    document = Document(filename="a.txt", content="Alice met Bob.")
+    chunk = TextChunk(content="Alice met Bob.", document_id=document.id)
+    result = ExtractionResult(
+        entities=[Entity(name="Alice", type="Person")], relationships=[]
+    )
+
+    async def load():
+        await threaded.ensure_schema()
+        assert await threaded.add_document(document, [chunk], [result]) == []
+        return await threaded.flush()
+
+    assert asyncio.run(load()) == [document]
+    assert sink.neighbors(document.id, "HAS_CHUNK") == [chunk.id]
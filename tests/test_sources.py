@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import pytest
+
+from documentgraph.extraction import DocumentExtractor
+from documentgraph.sinks import InMemoryGraphSink
+
+TEXT = "\n\n".join(
+    f"Alice met Bob on day {day}. Carol visited Acme the day after."
+    for day in range(40)
+)
+
+
+def names(extractor: DocumentExtractor, folder: Path) -> list[str]:
+    return [
+        Path(document.path).relative_to(folder).as_posix()
+        for document in extractor.extract(str(folder))
+    ]
+
+
+@pytest.fixture
+def tree(corpus):
+    for name in ("a.txt", "b.md", "notes/c.txt", "notes/old/d.txt", "tmp/e.txt"):
+        path = corpus.directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name, encoding="utf-8")
+    return corpus.directory
+
+
+def test_only_the_top_folder_is_read_by_default(make_config, tree):
+    assert names(DocumentExtractor(make_config()), tree) == ["a.txt"]
+
+
+def test_recursive_walk_applies_include_and_exclude(make_config, tree):
+    config = make_config(
+        source_config={
+            "recursive": True,
+            "include": ["*.txt", "*.md"],
+            "exclude": ["tmp", "notes/old/*"],
+        }
+    )
+
+    assert names(DocumentExtractor(config), tree) == ["a.txt", "b.md", "notes/c.txt"]
+
+
+def test_missing_input_raises(make_config, tmp_path):
+    extractor = DocumentExtractor(make_config())
+
+    with pytest.raises(FileNotFoundError):
+        list(extractor.extract(str(tmp_path / "missing")))
+
+
+def chunk_rows(sink: InMemoryGraphSink) -> list[tuple[int, int, str]]:
+    return sorted(
+        (chunk["start_index"], chunk["end_index"], chunk["text"])
+        for chunk in sink.nodes["TextChunk"].values()
+    )
+
+
+def test_streamed_file_gives_the_same_chunks(make_config, make_pipeline, corpus):
+    corpus("big.txt", TEXT)
+    sinks = []
+    for source_config in (
+        {},
+        {"stream_threshold": 100, "window_size": 300, "stream_batch_chunks": 3},
+    ):
+        config = make_config(
+            source_config=source_config, chunk_config={"size": 120, "overlap": 20}
+        )
+        sink = InMemoryGraphSink(config)
+        pipeline = make_pipeline(config, sink)
+        pipeline.execute_pipeline(str(corpus.directory))
+        assert len(pipeline.loaded_documents) == 1
+        sinks.append(sink)
+
+    whole, streamed = sinks
+    assert chunk_rows(streamed) == chunk_rows(whole)
+    # The parts are linked into a single NEXT chain
+    assert streamed.counts()["NEXT"] == streamed.counts()["TextChunk"] - 1
+    for start, end, text in chunk_rows(streamed):
+        assert TEXT[start:end] == text
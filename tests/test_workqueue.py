@@ -0,0 +1,212 @@
+import socket
+import time
+from pathlib import Path
+
+import pytest
+from conftest import entity_names
+
+from documentgraph.sinks import InMemoryGraphSink
+from documentgraph.workqueue import (
+    QueueCoordinator,
+    QueueWorker,
+    WorkQueue,
+    _worker_config,
+)
+
+LEASE = 0.05
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return WorkQueue(tmp_path / "queue.sqlite", max_attempts=2)
+
+
+def expire_leases():
+    time.sleep(LEASE * 2)
+
+
+def test_leased_documents_are_not_claimed_twice(queue):
+    queue.enqueue([("a.txt", "h1"), ("b.txt", "h2")])
+
+    (first,) = queue.claim("w1", 600)
+    (second,) = queue.claim("w2", 600)
+
+    assert (first.path, second.path) == ("a.txt", "b.txt")
+    assert queue.claim("w3", 600) == []
+    assert queue.stats()["leased"] == 2
+
+
+def test_expired_lease_is_reclaimed(queue):
+    queue.enqueue([("a.txt", "h1")])
+    (task,) = queue.claim("w1", LEASE)
+    assert queue.claim("w2", LEASE) == []
+
+    expire_leases()
+    (reclaimed,) = queue.claim("w2", 600)
+
+    assert reclaimed.path == task.path
+    assert reclaimed.attempts == 2
+    # The first worker lost the lease: it can neither renew nor complete it
+    assert queue.renew("w1", [task.path], 600) == set()
+    assert queue.complete("w1", [task]) == 0
+    assert queue.renew("w2", [task.path], 600) == {task.path}
+    assert queue.complete("w2", [reclaimed]) == 1
+    assert queue.stats()["done"] == 1
+
+
+def test_expired_lease_fails_after_max_attempts(queue):
+    queue.enqueue([("a.txt", "h1")])
+    for _ in range(2):
+        assert len(queue.claim("w1", LEASE)) == 1
+        expire_leases()
+
+    assert queue.claim("w2", 600) == []
+    (failed,) = queue.failed_documents()
+    assert failed == {"path": "a.txt", "error": "Arriendo caducado", "attempts": 2}
+
+
+def test_fail_requeues_until_max_attempts(queue):
+    queue.enqueue([("a.txt", "h1")])
+    (task,) = queue.claim("w1", 600)
+    queue.fail("w1", task, "Error")
+    assert queue.stats()["pending"] == 1
+
+    (task,) = queue.claim("w1", 600)
+    queue.fail("w1", task, "Error")
+    assert queue.stats()["failed"] == 1
+
+    assert queue.retry_failed() == 1
+    assert queue.claim("w1", 600)[0].attempts == 1
+
+
+def test_release_does_not_count_the_attempt(queue):
+    queue.enqueue([("a.txt", "h1")])
+    queue.claim("w1", 600)
+    queue.release("w1")
+
+    (task,) = queue.claim("w2", 600)
+    assert task.attempts == 1
+
+
+def test_enqueue_only_requeues_changed_documents(queue):
+    assert queue.enqueue([("a.txt", "h1")]) == 1
+    (task,) = queue.claim("w1", 600)
+    queue.complete("w1", [task])
+
+    assert queue.enqueue([("a.txt", "h1")]) == 0
+    assert queue.enqueue([("a.txt", "h2")]) == 1
+    (task,) = queue.claim("w1", 600)
+    assert task.loaded_hash == "h1"
+
+
+def run_worker(make_pipeline, config, sink) -> dict:
+    return QueueWorker(make_pipeline(config, sink), worker_id="test").run()
+
+
+def test_worker_reclaims_a_crashed_worker_document(
+    make_config, make_pipeline, corpus, tmp_path
+):
+    config = make_config(
+        queue_config={"path": str(tmp_path / "queue.sqlite"), "lease_seconds": 600}
+    )
+    sink = InMemoryGraphSink(config)
+    corpus("a.txt", "Alice met Bob.")
+    corpus("b.txt", "Carol met Acme.")
+    coordinator = QueueCoordinator(config)
+    assert coordinator.enqueue(str(corpus.directory)) == 2
+    # A worker that claims a document and dies without completing it
+    assert len(coordinator.queue.claim("crashed", LEASE)) == 1
+    expire_leases()
+
+    report = run_worker(make_pipeline, config, sink)
+
+    assert coordinator.queue.stats() == {
+        "pending": 0,
+        "leased": 0,
+        "done": 2,
+        "failed": 0,
+    }
+    assert report["counters"]["queue_documents_done_total"] == 2
+    assert entity_names(sink) == ["Acme", "Alice", "Bob", "Carol"]
+
+
+def test_worker_replaces_changed_documents_without_a_manifest(
+    make_config, make_pipeline, corpus, tmp_path
+):
+    config = make_config(
+        incremental=True,
+        queue_config={"path": str(tmp_path / "queue.sqlite")},
+    )
+    sink = InMemoryGraphSink(config)
+    corpus("a.txt", "Alice met Bob.")
+    QueueCoordinator(config).enqueue(str(corpus.directory))
+    run_worker(make_pipeline, config, sink)
+
+    corpus("a.txt", "Alice met Carol.")
+    assert QueueCoordinator(config).enqueue(str(corpus.directory)) == 1
+    run_worker(make_pipeline, config, sink)
+
+    assert entity_names(sink) == ["Alice", "Carol"]
+    assert sink.counts()["TextChunk"] == 1
+    # The queue is the record of what each worker loaded
+    assert not Path(config.manifest_path).exists()
+
+
+class WorkerCrash(Exception):
+    pass
+
+
+def test_reclaimed_document_is_not_loaded_twice(
+    make_config, make_pipeline, corpus, tmp_path
+):
+    config = make_config(
+        queue_config={"path": str(tmp_path / "queue.sqlite"), "lease_seconds": LEASE}
+    )
+    sink = InMemoryGraphSink(config)
+    corpus("a.txt", "Alice met Bob.")
+    QueueCoordinator(config).enqueue(str(corpus.directory))
+
+    # The worker dies after writing to the graph but before completing the task,
+    # without releasing its lease
+    crashed = QueueWorker(make_pipeline(config, sink), worker_id="crashed")
+
+    def crash(*args, **kwargs):
+        raise WorkerCrash()
+
+    crashed.queue.complete = crash
+    crashed.queue.release = lambda worker: None
+    with pytest.raises(WorkerCrash):
+        crashed.run()
+    loaded = sink.counts()
+    assert loaded["Document"] == 1
+    expire_leases()
+
+    run_worker(make_pipeline, config, sink)
+
+    assert sink.counts() == loaded
+    sources = [
+        properties["sources"]
+        for (rel_type, _, _), properties in sink.relationships.items()
+        if rel_type == "RELATED_TO"
+    ]
+    assert [len(document_sources) for document_sources in sources] == [1]
+    assert QueueCoordinator(config).queue.stats()["done"] == 1
+
+
+def test_local_workers_serve_metrics_on_separate_ports(make_config, make_pipeline):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    config = make_config(metrics_config={"port": port})
+
+    pipelines = [make_pipeline(_worker_config(config, index)) for index in range(2)]
+    try:
+        for pipeline in pipelines:
+            pipeline.serve_metrics()
+        ports = [pipeline.metrics_server.server_address[1] for pipeline in pipelines]
+    finally:
+        for pipeline in pipelines:
+            pipeline.close()
+
+    assert ports == [port, port + 1]
+    assert config.metrics_config.port == port